@@ -75,8 +75,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.RequestProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    #WhiteNoise, async capable so the ASGI stack stays async (see core.middleware)
+    "core.middleware.StaticFilesMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -86,6 +88,14 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Request profiling (core.middleware.RequestProfilingMiddleware), off unless enabled
+REQUEST_PROFILING_ENABLED = env.bool("REQUEST_PROFILING_ENABLED", default=False)
+REQUEST_PROFILING_SAMPLE_RATE = env.float("REQUEST_PROFILING_SAMPLE_RATE", default=1.0)
+REQUEST_PROFILING_DUPLICATE_THRESHOLD = env.int("REQUEST_PROFILING_DUPLICATE_THRESHOLD", default=3)
+#max queries per request (int, or dict of view name -> int), None to disable
+REQUEST_PROFILING_QUERY_BUDGET = env.int("REQUEST_PROFILING_QUERY_BUDGET", default=None)
+REQUEST_PROFILING_FAIL_ON_BUDGET = env.bool("REQUEST_PROFILING_FAIL_ON_BUDGET", default=False)
+
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
@@ -109,18 +119,53 @@ WSGI_APPLICATION = "config.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.postgresql",
-        "NAME": env("DB_NAME"),
-        "USER": env("DB_USER"),
-        "PASSWORD": env("DB_PASSWORD"),
-        "HOST": env("DB_HOST"),
-        "PORT": env("DB_PORT"),
+#DB_ENGINE picks another backend, e.g. django.db.backends.sqlite3 with DB_NAME as the file path
+#(the benchmark command on SQLite); DB_SSLMODE=disable for a local postgres without TLS
+DB_ENGINE = env("DB_ENGINE", default="django.db.backends.postgresql")
+
+if DB_ENGINE == "django.db.backends.postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": DB_ENGINE,
+            "NAME": env("DB_NAME"),
+            "USER": env("DB_USER"),
+            "PASSWORD": env("DB_PASSWORD"),
+            "HOST": env("DB_HOST"),
+            "PORT": env("DB_PORT"),
+            "OPTIONS": {"sslmode": env("DB_SSLMODE", default="require")},
+        }
     }
-}
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": DB_ENGINE,
+            "NAME": env("DB_NAME", default=str(BASE_DIR / "db.sqlite3")),
+        }
+    }
+
 
-DATABASES["default"]["OPTIONS"] = {"sslmode": "require"}
+# Caches
+#"responses" holds serialized dashboard/lecture responses (core.utils.response_cache), locmem is
+#bounded by MAX_ENTRIES; point RESPONSE_CACHE_BACKEND/LOCATION at redis to share it between workers
+RESPONSE_CACHE_BACKEND = env("RESPONSE_CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache")
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "responses": {
+        "BACKEND": RESPONSE_CACHE_BACKEND,
+        "LOCATION": env("RESPONSE_CACHE_LOCATION", default="responses"),
+        "TIMEOUT": env.int("RESPONSE_CACHE_TIMEOUT", default=60 * 60),
+        "OPTIONS": (
+            {"MAX_ENTRIES": env.int("RESPONSE_CACHE_MAX_ENTRIES", default=2000)}
+            if RESPONSE_CACHE_BACKEND.endswith("LocMemCache") else {}
+        ),
+    },
+}
+RESPONSE_CACHE_ENABLED = env.bool("RESPONSE_CACHE_ENABLED", default=True)
+RESPONSE_CACHE_ALIAS = "responses"
+#responses larger than this are served but not cached
+RESPONSE_CACHE_MAX_BYTES = env.int("RESPONSE_CACHE_MAX_BYTES", default=1024 * 1024)
 
 
 # Password validation
@@ -188,6 +233,79 @@ REST_FRAMEWORK = {
     ],
 }
 
+#page sizes for the opt-in cursor pagination of lectures and attendances (core.pagination)
+API_PAGE_SIZE = env.int("API_PAGE_SIZE", default=100)
+API_MAX_PAGE_SIZE = env.int("API_MAX_PAGE_SIZE", default=1000)
+
+#serve the async variants of the dashboard, lecture list, summarize and ping views (core.async_views),
+#only worth it under an ASGI server
+ASYNC_VIEWS = env.bool("ASYNC_VIEWS", default=False)
+
+#push channel for change events (core.utils.events, served at /api/events/ under ASGI);
+#InMemoryBroker only reaches streams of the same process, PostgresBroker goes through LISTEN/NOTIFY
+EVENT_BROKER_BACKEND = env("EVENT_BROKER_BACKEND", default="core.utils.events.InMemoryBroker")
+EVENT_QUEUE_SIZE = env.int("EVENT_QUEUE_SIZE", default=100)
+EVENT_STREAM_HEARTBEAT = env.float("EVENT_STREAM_HEARTBEAT", default=15.0)
+
+#direct-to-storage note uploads (core.utils.uploads): presigned S3 urls, or a signed
+#local endpoint when notes are stored on disk
+NOTE_UPLOAD_BACKEND = env(
+    "NOTE_UPLOAD_BACKEND",
+    default="core.utils.uploads.S3DirectUpload" if os.getenv("USE_S3") == "TRUE" else "core.utils.uploads.LocalDirectUpload",
+)
+NOTE_UPLOAD_MAX_BYTES = env.int("NOTE_UPLOAD_MAX_BYTES", default=20 * 1024 * 1024)
+NOTE_UPLOAD_URL_EXPIRY = env.int("NOTE_UPLOAD_URL_EXPIRY", default=900)
+
+#how /api/attendances/<id>/note/ serves files (core.utils.downloads): "stream" from storage,
+#"x-accel" (nginx internal location at NOTE_DOWNLOAD_ACCEL_PREFIX), "x-sendfile", or "s3-redirect"
+NOTE_DOWNLOAD_MODE = env(
+    "NOTE_DOWNLOAD_MODE", default="s3-redirect" if os.getenv("USE_S3") == "TRUE" else "stream"
+)
+NOTE_DOWNLOAD_ACCEL_PREFIX = env("NOTE_DOWNLOAD_ACCEL_PREFIX", default="/protected-notes/")
+NOTE_DOWNLOAD_URL_EXPIRY = env.int("NOTE_DOWNLOAD_URL_EXPIRY", default=300)
+
+#timetable file imports (core.utils.timetable_files): most row errors listed in the report,
+#how far open ended ics recurrences are expanded, and the most lectures one recurring event may create
+TIMETABLE_IMPORT_MAX_ERRORS = env.int("TIMETABLE_IMPORT_MAX_ERRORS", default=500)
+TIMETABLE_IMPORT_HORIZON_DAYS = env.int("TIMETABLE_IMPORT_HORIZON_DAYS", default=366)
+TIMETABLE_IMPORT_MAX_OCCURRENCES = env.int("TIMETABLE_IMPORT_MAX_OCCURRENCES", default=1000)
+
+#poll interval the calendar feed suggests to calendar apps
+CALENDAR_FEED_REFRESH_MINUTES = env.int("CALENDAR_FEED_REFRESH_MINUTES", default=15)
+
+#most lectures one bulk attendance toggle may touch
+ATTENDANCE_BULK_MAX = env.int("ATTENDANCE_BULK_MAX", default=1000)
+
+# Note summarization jobs (core.utils.jobs)
+#ThreadPoolJobBackend runs jobs in-process, DatabaseQueueJobBackend leaves them for `manage.py run_summary_jobs`
+SUMMARY_JOB_BACKEND = env("SUMMARY_JOB_BACKEND", default="core.utils.jobs.ThreadPoolJobBackend")
+SUMMARY_JOB_WORKERS = env.int("SUMMARY_JOB_WORKERS", default=4)
+#seconds a job may stay queued or running before it's failed as stale (lost on a restart, crashed worker)
+SUMMARY_JOB_TIMEOUT = env.int("SUMMARY_JOB_TIMEOUT", default=600)
+
+# Max utf-8 bytes of note text extracted for summarization, later pages are never parsed
+NOTE_TEXT_MAX_BYTES = env.int("NOTE_TEXT_MAX_BYTES", default=2 * 1024 * 1024)
+
+# Map-reduce summarization for long notes (core.utils.summarization.summarize_long_text)
+SUMMARY_CHUNK_TOKENS = env.int("SUMMARY_CHUNK_TOKENS", default=3000)
+SUMMARY_MAP_WORKERS = env.int("SUMMARY_MAP_WORKERS", default=4)
+
+# LLM client (core.utils.llm), built lazily once per process
+LLM_TIMEOUT = env.float("LLM_TIMEOUT", default=30.0)
+LLM_MAX_RETRIES = env.int("LLM_MAX_RETRIES", default=3)
+LLM_RETRY_BACKOFF = env.float("LLM_RETRY_BACKOFF", default=1.0)
+#requests per second shared by all threads of a process, unset to disable the limiter
+LLM_RATE_LIMIT = env.float("LLM_RATE_LIMIT", default=None)
+LLM_RATE_BURST = env.int("LLM_RATE_BURST", default=None)
+LLM_CIRCUIT_FAILURES = env.int("LLM_CIRCUIT_FAILURES", default=5)
+LLM_CIRCUIT_RESET = env.float("LLM_CIRCUIT_RESET", default=30.0)
+
+# Summary cache (core.utils.summary_cache), keyed by note text hash + model/prompt
+SUMMARY_CACHE_MAX_ENTRIES = env.int("SUMMARY_CACHE_MAX_ENTRIES", default=1024)
+SUMMARY_CACHE_TTL = env.int("SUMMARY_CACHE_TTL", default=60 * 60 * 24 * 30)
+#django cache alias shared between processes, empty to keep the cache in-process only
+SUMMARY_CACHE_ALIAS = env("SUMMARY_CACHE_ALIAS", default="default") or None
+
 from datetime import timedelta
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
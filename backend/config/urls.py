@@ -15,28 +15,56 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from core.views import CourseViewSet, LectureViewSet, AttendanceViewSet, ImportTimetable, SummarizeNotes, DashboardView, LectureAttendanceToggle, RegisterView, PingView
+from core.views import CourseViewSet, LectureViewSet, LectureSeriesViewSet, AttendanceViewSet, ImportTimetable, SummarizeNotes, SummarizeNotesJob, SummaryJobDetail, DashboardView, AttendanceAnalytics, LectureAttendanceToggle, BulkAttendanceToggle, NoteUploadStart, NoteUploadConfirm, NoteUploadTarget, NoteDownload, CalendarFeedLink, CalendarFeed, RegisterView, EventStream, ServiceMetrics, PingView
+from core.async_views import AsyncDashboardView, AsyncLectureList, AsyncPingView, AsyncSummarizeNotes
 
 router = DefaultRouter() #creates a router object that can auto generate REST urls for a viewset
 
 #register viewsets and define url patterns for them so we can access as a link
 router.register(r"courses", CourseViewSet, basename="course")
 router.register(r"lectures", LectureViewSet, basename="lecture")
+router.register(r"series", LectureSeriesViewSet, basename="lecture-series")
 router.register(r"attendances", AttendanceViewSet, basename="attendance")
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    #before the router, which would otherwise treat "bulk" as an attendance id
+    path("api/attendances/bulk/", BulkAttendanceToggle.as_view(), name="attendance-bulk"),
     path("api/", include(router.urls)),
     path("api/schedule/import/", ImportTimetable.as_view(), name="import-timetable"),
     path("api/summarize/", SummarizeNotes.as_view(), name="summarize-notes"),
+    path("api/summarize/jobs/", SummarizeNotesJob.as_view(), name="summarize-notes-job"),
+    path("api/summarize/jobs/<uuid:pk>/", SummaryJobDetail.as_view(), name="summary-job-detail"),
     path("api/dashboard/", DashboardView.as_view(), name="dashboard-view"),
+    path("api/analytics/", AttendanceAnalytics.as_view(), name="attendance-analytics"),
+    path("api/attendances/<uuid:pk>/note/", NoteDownload.as_view(), name="note-download"),
+    path("api/attendances/<uuid:pk>/note/upload/", NoteUploadStart.as_view(), name="note-upload"),
+    path("api/attendances/<uuid:pk>/note/confirm/", NoteUploadConfirm.as_view(), name="note-upload-confirm"),
+    path("api/uploads/<str:upload_id>/", NoteUploadTarget.as_view(), name="note-upload-target"),
     path("api/lectures/<uuid:pk>/attendance/", LectureAttendanceToggle.as_view(), name="lecture-attendance"),
+    path("api/calendar/", CalendarFeedLink.as_view(), name="calendar-feed-link"),
+    path("api/calendar/<str:token>.ics", CalendarFeed.as_view(), name="calendar-feed"),
     path("api/register/", RegisterView.as_view(), name="register"),
+    path("api/events/", EventStream.as_view(), name="event-stream"),
+    path("api/metrics/", ServiceMetrics.as_view(), name="service-metrics"),
     path("api/ping/", PingView.as_view()), #testing, remove
 ]
+
+#async-native variants of the read endpoints for ASGI deployments, listed first so they
+#take over the same paths (the lecture detail route stays on the router)
+async_urlpatterns = [
+    path("api/lectures/", AsyncLectureList.as_view(), name="lecture-list-async"),
+    path("api/dashboard/", AsyncDashboardView.as_view(), name="dashboard-view-async"),
+    path("api/summarize/", AsyncSummarizeNotes.as_view(), name="summarize-notes-async"),
+    path("api/ping/", AsyncPingView.as_view()),
+]
+
+if settings.ASYNC_VIEWS:
+    urlpatterns = async_urlpatterns + urlpatterns
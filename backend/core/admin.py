@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Course, Lecture, Attendance
+from .models import Course, Lecture, Attendance, SummaryJob
 
 # Register your models here.
 
@@ -19,4 +19,9 @@ class LectureAdmin(admin.ModelAdmin):
 class AttendanceAdmin(admin.ModelAdmin):
     list_display = ("user", "lecture", "attended", "note_upload", "created_at", "updated_at")
     list_filter = ("user", "lecture", "attended")
-    search_fields = ("user__username", "lecture__course__name", "lecture__start_dt")
\ No newline at end of file
+    search_fields = ("user__username", "lecture__course__name", "lecture__start_dt")
+
+@admin.register(SummaryJob)
+class SummaryJobAdmin(admin.ModelAdmin):
+    list_display = ("attendance", "user", "status", "note_name", "created_at", "started_at", "updated_at")
+    list_filter = ("status",)
\ No newline at end of file
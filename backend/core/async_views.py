@@ -0,0 +1,180 @@
+"""
+Async-native variants of the read-heavy endpoints, served instead of the sync DRF views
+when ASYNC_VIEWS is set (see config/urls.py).
+
+Under ASGI a sync view holds a thread for the whole request; these stay on the event loop
+and only hand the sync-only bits (token authentication, the data version lookup, reading
+note files) to a thread, so one worker can keep many slow requests, like summarization
+waiting on the LLM, in flight. Responses are the same as the sync views'.
+"""
+from asgiref.sync import sync_to_async
+from django.utils.cache import patch_vary_headers
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, permissions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from .models import Attendance, Course
+from .pagination import LecturePagination
+from .serializers import CourseDashboardSerializer, LectureSerializer
+from .views import lecture_filters, lecture_queryset, listed_series_lectures, merge_lectures, paged_series_lectures
+
+from core.utils.response_cache import cache_user_response
+from core.utils.series import add_series_lectures
+from core.utils.stats import attach_stats
+from core.utils.summarization import extract_text_from_file
+from core.utils.summary_cache import acached_summarize_text
+from core.utils.versioning import conditional_on_user_version
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of DRF's APIView.
+
+    Wraps the request in a DRF Request with the configured parsers and authenticators,
+    checks permission_classes, turns APIExceptions into DRF's error responses and renders
+    DRF Responses as JSON. Handlers are async methods returning a Response.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        #token authenticated like the DRF views, so no csrf check
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(
+            request,
+            parsers=[parser() for parser in self.parser_classes],
+            authenticators=[auth() for auth in self.authentication_classes],
+            parser_context={"view": self, "args": args, "kwargs": kwargs},
+        )
+        self.request = request
+        try:
+            await sync_to_async(self.initial)(request)
+            response = await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            response = self.handle_exception(exc)
+        return self.finalize_response(request, response)
+
+    def initial(self, request):
+        #authenticates (a query for the token's user) and checks permissions, runs in a thread
+        request.user
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if request.authenticators and not request.successful_authenticator:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, "message", None))
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            authenticators = self.request.authenticators
+            header = authenticators[0].authenticate_header(self.request) if authenticators else None
+            if header:
+                exc.auth_header = header
+            else:
+                exc.status_code = 403
+        response = exception_handler(exc, {"view": self, "request": self.request})
+        if response is None:
+            raise exc
+        return response
+
+    def finalize_response(self, request, response):
+        if isinstance(response, Response):
+            response.accepted_renderer = JSONRenderer()
+            response.accepted_media_type = JSONRenderer.media_type
+            response.renderer_context = {"view": self, "request": request, "response": response}
+        response.headers.setdefault("Allow", ", ".join(self._allowed_methods()))
+        patch_vary_headers(response, ["Accept"])
+        return response
+
+    def serializer_context(self):
+        return {"request": self.request, "format": None, "view": self}
+
+
+class AsyncDashboardView(AsyncAPIView):
+    """
+    Async variant of DashboardView
+    """
+
+    @conditional_on_user_version
+    @cache_user_response
+    async def get(self, request):
+        filters = lecture_filters(request)
+        start, end = filters.get("from"), filters.get("to")
+        queryset = Course.objects.filter(user=request.user).for_dashboard(request.user, start, end)
+        courses = [course async for course in queryset]
+        await sync_to_async(add_series_lectures)(courses, request.user, start, end)
+        await sync_to_async(attach_stats)(courses, request.user)
+        serializer = CourseDashboardSerializer(courses, many=True, context=self.serializer_context())
+        return Response({"courses": serializer.data})
+
+
+class AsyncLectureList(AsyncAPIView):
+    """
+    Async variant of the lecture list (LectureViewSet.list), with the same filters and pagination
+    """
+
+    @conditional_on_user_version
+    @cache_user_response
+    async def get(self, request):
+        queryset = lecture_queryset(request)
+        paginator = LecturePagination()
+        if paginator.is_requested(request):
+            page = await paginator.apaginate_queryset(queryset, request, view=self, extra=paged_series_lectures(request))
+            serializer = LectureSerializer(page, many=True, context=self.serializer_context())
+            return paginator.get_paginated_response(serializer.data)
+
+        lectures = [lecture async for lecture in queryset]
+        lectures = merge_lectures(lectures, await sync_to_async(listed_series_lectures)(request, stored=lectures))
+        return Response(LectureSerializer(lectures, many=True, context=self.serializer_context()).data)
+
+
+class AsyncSummarizeNotes(AsyncAPIView):
+    """
+    Async variant of SummarizeNotes, waits on the LLM through the async client
+    """
+
+    async def post(self, request):
+        attendance_id = request.data.get("attendance_id")
+
+        try:
+            attendance_obj = await Attendance.objects.aget(id=attendance_id, user=request.user)
+        except Attendance.DoesNotExist:
+            return Response({'error': f"Attendance not found: {attendance_id}"}, status=404)
+
+        if attendance_obj.summary:
+            return Response({'summary': attendance_obj.summary}, status=200)
+
+        if not attendance_obj.note_upload:
+            return Response({"error": "No note uploaded for this attendance."}, status=404)
+
+        #storage reads are blocking (s3 in production)
+        try:
+            note_text = await sync_to_async(extract_text_from_file)(attendance_obj.note_upload)
+        except Exception:
+            return Response({"error": "Unable to read uploaded note. Please reupload."}, status=500)
+
+        summary = await acached_summarize_text(note_text)
+
+        attendance_obj.summary = summary
+        await attendance_obj.asave(update_fields=["summary", "updated_at"])
+
+        return Response({"summary": summary}, status=200)
+
+
+class AsyncPingView(AsyncAPIView):
+    """
+    Async variant of PingView
+    """
+    permission_classes = [permissions.AllowAny]
+
+    async def get(self, _request):
+        return Response({"ok": True})
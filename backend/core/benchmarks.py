@@ -0,0 +1,175 @@
+"""
+Synthetic data generator and benchmark suite for the hot API paths.
+
+Run through `python manage.py benchmark`, which builds a throwaway test database on the
+configured backend, seeds it and writes the results as JSON. The backend comes from DB_ENGINE
+(postgres by default, DB_ENGINE=django.db.backends.sqlite3 for SQLite) and DB_SSLMODE
+(require by default, disable for a local postgres without TLS).
+"""
+import datetime
+import itertools
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Attendance, Course, Lecture
+
+BATCH_SIZE = 1000
+
+BENCHMARKS = [
+    "dashboard",
+    "lecture_list",
+    "lecture_week",
+    "attendance_list_course_filter",
+    "timetable_import",
+    "attendance_toggle",
+]
+
+
+def generate_dataset(users=10, courses=5, weeks=14, lectures_per_week=2, attended_ratio=0.7, seed=0):
+    """
+    Creates `users` users, each with `courses` courses that meet `lectures_per_week` times a week
+    over a `weeks` long semester centred on today, with an attendance row per lecture.
+
+    Returns the created users. The same seed gives the same data.
+    """
+    rng = random.Random(seed)
+    semester_start = (timezone.now() - datetime.timedelta(weeks=weeks // 2)).replace(minute=0, second=0, microsecond=0)
+
+    created_users = []
+    for u in range(users):
+        user = User.objects.create_user(username=f"bench{u}-{seed}", password="bench")
+        created_users.append(user)
+
+        course_rows = [
+            Course(user=user, name=f"Course {c}", color_hex="#4F46E5") for c in range(courses)
+        ]
+        Course.objects.bulk_create(course_rows, batch_size=BATCH_SIZE)
+
+        lecture_rows = []
+        for c, course in enumerate(course_rows):
+            for week in range(weeks):
+                for slot in range(lectures_per_week):
+                    start = semester_start + datetime.timedelta(weeks=week, days=slot * 2, hours=c)
+                    lecture_rows.append(Lecture(
+                        course=course, start_dt=start, end_dt=start + datetime.timedelta(hours=1), location=f"Room {c}"
+                    ))
+        Lecture.objects.bulk_create(lecture_rows, batch_size=BATCH_SIZE)
+
+        Attendance.objects.bulk_create(
+            [Attendance(user=user, lecture=lecture, attended=rng.random() < attended_ratio) for lecture in lecture_rows],
+            batch_size=BATCH_SIZE,
+        )
+    return created_users
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(name, call, iterations=20, warmup=2):
+    """
+    Runs `call` warmup + iterations times and returns latency percentiles (ms), query counts
+    and the peak traced memory (KiB) of the measured iterations.
+    """
+    for _ in range(warmup):
+        call()
+
+    latencies = []
+    queries = []
+    tracemalloc.start()
+    try:
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = call()
+                latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name} returned {response.status_code}")
+            queries.append(len(ctx))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 3),
+            "p50": round(percentile(latencies, 50), 3),
+            "p90": round(percentile(latencies, 90), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3),
+        },
+        "queries": {"mean": round(statistics.mean(queries), 2), "max": max(queries)},
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def run_suite(user, iterations=20, warmup=2, only=None):
+    """
+    Benchmarks the API as `user` and returns {benchmark name: measurement}.
+    """
+    client = APIClient()
+    client.force_authenticate(user)
+
+    lectures = list(Lecture.objects.filter(course__user=user).order_by("start_dt").values_list("pk", "start_dt"))
+    mid_start = lectures[len(lectures) // 2][1]
+    week_from = (mid_start - datetime.timedelta(days=mid_start.weekday())).date()
+    week_to = week_from + datetime.timedelta(days=6)
+    toggle_pk = lectures[len(lectures) // 2][0]
+
+    import_counter = iter(range(10 ** 9))
+    toggle_state = itertools.cycle([True, False])
+
+    def import_timetable():
+        #a new course each call, so every iteration actually inserts a term of lectures
+        slot = {
+            "course": f"Imported {next(import_counter)}",
+            "weekday": "Mon",
+            "start_time": "09:00",
+            "end_time": "10:00",
+            "from_date": week_from.isoformat(),
+            "to_date": (week_from + datetime.timedelta(weeks=14)).isoformat(),
+            "location": "Hall",
+        }
+        return client.post("/api/schedule/import/", [slot], format="json")
+
+    benchmarks = {
+        "dashboard": lambda: client.get("/api/dashboard/"),
+        "lecture_list": lambda: client.get("/api/lectures/"),
+        "lecture_week": lambda: client.get("/api/lectures/", {"from": week_from.isoformat(), "to": week_to.isoformat()}),
+        "attendance_list_course_filter": lambda: client.get("/api/attendances/", {"course_name": "Course 1"}),
+        "timetable_import": import_timetable,
+        "attendance_toggle": lambda: client.post(
+            f"/api/lectures/{toggle_pk}/attendance/", {"attended": next(toggle_state)}, format="json"
+        ),
+    }
+
+    return {
+        name: measure(name, call, iterations=iterations, warmup=warmup)
+        for name, call in benchmarks.items()
+        if not only or name in only
+    }
+
+
+def compare(previous, current):
+    #relative change of p50 latency and mean queries against a previous results file
+    rows = {}
+    for name, result in current["results"].items():
+        before = previous.get("results", {}).get(name)
+        if not before:
+            continue
+        rows[name] = {
+            "p50_ms": (before["latency_ms"]["p50"], result["latency_ms"]["p50"]),
+            "queries": (before["queries"]["mean"], result["queries"]["mean"]),
+        }
+    return rows
@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import AttendanceStats, Course
+from core.utils.stats import COUNTS, count_lectures, refresh_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the AttendanceStats table from the lectures and attendances, "
+        "or with --verify checks the stored rows against fresh counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true",
+                            help="Only compare, exit with an error if a current row disagrees.")
+        parser.add_argument("--user", action="append", default=[], help="Username to limit to, repeatable.")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(courses__isnull=False).distinct().order_by("pk")
+        if options["user"]:
+            users = users.filter(username__in=options["user"])
+
+        checked = rebuilt = 0
+        mismatches = []
+        for user in users.iterator():
+            course_ids = list(Course.objects.filter(user=user).values_list("pk", flat=True))
+            rows = {row.course_id: row for row in AttendanceStats.objects.filter(user=user, course__in=course_ids)}
+            if not options["verify"]:
+                refresh_stats(user, course_ids, {course_id: row.version for course_id, row in rows.items()})
+                rebuilt += len(course_ids)
+                continue
+
+            now = timezone.now()
+            for course_id, fresh in count_lectures(user, course_ids, now).items():
+                row = rows.get(course_id)
+                #missing and stale rows are recomputed on their next read anyway
+                if row is None or row.stale_at is None or row.stale_at <= now:
+                    continue
+                checked += 1
+                wrong = {name: (getattr(row, name), fresh[name]) for name in COUNTS if getattr(row, name) != fresh[name]}
+                if wrong:
+                    mismatches.append((user.username, course_id, wrong))
+
+        if not options["verify"]:
+            self.stdout.write(f"rebuilt stats for {rebuilt} course(s)")
+            return
+
+        for username, course_id, wrong in mismatches:
+            details = ", ".join(f"{name} {stored} != {fresh}" for name, (stored, fresh) in wrong.items())
+            self.stdout.write(f"{username} / course {course_id}: {details}")
+        self.stdout.write(f"checked {checked} row(s), {len(mismatches)} mismatch(es)")
+        if mismatches:
+            raise CommandError("AttendanceStats is out of date, run the command without --verify to rebuild it.")
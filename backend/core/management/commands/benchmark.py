@@ -0,0 +1,91 @@
+import json
+import platform
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from core.benchmarks import BENCHMARKS, compare, generate_dataset, run_suite
+from core.utils.response_cache import stats as response_cache_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway test database with synthetic users, courses, lectures and attendances "
+        "and benchmarks the hot API paths (latency percentiles, query counts, peak memory)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--courses", type=int, default=5)
+        parser.add_argument("--weeks", type=int, default=14)
+        parser.add_argument("--lectures-per-week", type=int, default=2)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--only", nargs="*", choices=BENCHMARKS, help="Run only these benchmarks.")
+        parser.add_argument("--response-cache", action="store_true",
+                            help="Keep the per-user response cache on (off by default to measure the queries).")
+        parser.add_argument("--output", default="bench_output.json", help="Where to write the JSON results.")
+        parser.add_argument("--compare", help="Earlier results file to compare against.")
+        parser.add_argument("--keepdb", action="store_true", help="Keep the test database between runs.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, keepdb=options["keepdb"])
+        try:
+            with override_settings(RESPONSE_CACHE_ENABLED=options["response_cache"], REQUEST_PROFILING_ENABLED=False):
+                users = generate_dataset(
+                    users=options["users"],
+                    courses=options["courses"],
+                    weeks=options["weeks"],
+                    lectures_per_week=options["lectures_per_week"],
+                    seed=options["seed"],
+                )
+                response_cache_stats.reset()
+                results = run_suite(users[0], iterations=options["iterations"], warmup=options["warmup"],
+                                    only=options["only"])
+                cache_stats = response_cache_stats.snapshot()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+            teardown_test_environment()
+
+        report = {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "response_cache": options["response_cache"],
+                "dataset": {key: options[key] for key in ("users", "courses", "weeks", "lectures_per_week", "seed")},
+                "iterations": options["iterations"],
+            },
+            "results": results,
+            #hits/misses of the response cache over the whole run, warmup included
+            "response_cache": cache_stats,
+        }
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+
+        for name, result in results.items():
+            latency = result["latency_ms"]
+            self.stdout.write(
+                f"{name:32} p50 {latency['p50']:8.2f}ms  p99 {latency['p99']:8.2f}ms  "
+                f"queries {result['queries']['mean']:6.1f}  peak {result['peak_memory_kib']:8.1f}KiB"
+            )
+
+        if options["response_cache"]:
+            self.stdout.write(
+                f"response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                f"({cache_stats['hit_ratio']:.0%}), {cache_stats['bytes_stored_total']} bytes stored"
+            )
+
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                previous = json.load(f)
+            for name, row in compare(previous, report).items():
+                (p50_before, p50_now), (q_before, q_now) = row["p50_ms"], row["queries"]
+                self.stdout.write(
+                    f"{name:32} p50 {p50_before:.2f} -> {p50_now:.2f}ms  queries {q_before} -> {q_now}"
+                )
+        self.stdout.write(f"results written to {options['output']}")
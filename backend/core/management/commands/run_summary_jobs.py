@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import SummaryJob
+from core.utils.jobs import fail_stale_jobs, run_summary_job
+
+
+class Command(BaseCommand):
+    help = "Worker for DatabaseQueueJobBackend: processes queued summary jobs from the SummaryJob table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Process the current queue and exit.")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--batch", type=int, default=20, help="Jobs to fetch per poll.")
+
+    def handle(self, *args, **options):
+        while True:
+            #jobs a crashed worker left running (or that waited too long) are failed, users can queue them again
+            stale = fail_stale_jobs()
+            if stale:
+                self.stdout.write(f"failed {stale} stale summary job(s)")
+
+            job_ids = list(
+                SummaryJob.objects.filter(status=SummaryJob.QUEUED)
+                .order_by("created_at")
+                .values_list("pk", flat=True)[: options["batch"]]
+            )
+
+            #run_summary_job claims each job atomically, so several workers can share the table
+            processed = sum(1 for job_id in job_ids if run_summary_job(job_id))
+            if processed:
+                self.stdout.write(f"processed {processed} summary job(s)")
+
+            if options["once"]:
+                return
+            if not job_ids:
+                time.sleep(options["interval"])
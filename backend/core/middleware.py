@@ -0,0 +1,216 @@
+import contextvars
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+logger = logging.getLogger("core.profiling")
+
+#profile of the request being handled by this thread/task, None when not profiled
+_current = contextvars.ContextVar("request_profile", default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised when REQUEST_PROFILING_FAIL_ON_BUDGET is set and a view runs more queries than its budget.
+    """
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.sections = {}
+        self._open = Counter()
+        self.view = None
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def add(self, name, seconds):
+        count, total = self.sections.get(name, (0, 0.0))
+        self.sections[name] = (count + 1, total + seconds)
+
+    def duplicates(self, threshold):
+        #the sql text still has its placeholders, so repeats of the same statement with
+        #different params (the N+1 pattern) group together
+        counts = Counter(sql for sql, _ in self.queries)
+        return [{"sql": sql, "count": n} for sql, n in counts.most_common() if n >= threshold]
+
+
+def _record_query(execute, sql, params, many, context):
+    #connection wrapper recording into whichever request profile is current, stays installed
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.record_query(execute, sql, params, many, context)
+
+
+def _install_query_recorder():
+    #connections are per thread, and async views run their queries in sync_to_async threads,
+    #so the recorder goes on the connection of the thread the queries run in
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@contextmanager
+def profile_section(name):
+    """
+    Times a block of work under `name` (e.g. "serialize", "llm") in the current request's
+    profile. Nested blocks with the same name only count once. No-op outside a profiled request.
+    """
+    profile = _current.get()
+    if profile is None or profile._open[name]:
+        yield
+        return
+
+    profile._open[name] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile._open[name] -= 1
+        profile.add(name, time.perf_counter() - started)
+
+
+class RequestProfilingMiddleware:
+    """
+    Opt-in per-request profiling (REQUEST_PROFILING_ENABLED).
+
+    For a sampled share of requests (REQUEST_PROFILING_SAMPLE_RATE) records the total time,
+    every database query with its duration and the profile_section timings, then adds a
+    Server-Timing header and logs one JSON line on the "core.profiling" logger. Statements
+    repeated REQUEST_PROFILING_DUPLICATE_THRESHOLD or more times are flagged as likely N+1s.
+
+    REQUEST_PROFILING_QUERY_BUDGET is a query count (or a dict of view name -> count), views
+    going over it are logged as warnings, or raise QueryBudgetExceeded when
+    REQUEST_PROFILING_FAIL_ON_BUDGET is set (meant for test runs).
+
+    Works in both sync and async stacks, so under ASGI it never forces the chain into sync mode.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        if not getattr(settings, "REQUEST_PROFILING_ENABLED", False):
+            return False
+        return random.random() < getattr(settings, "REQUEST_PROFILING_SAMPLE_RATE", 1.0)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            _install_query_recorder()
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        self.report(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            await sync_to_async(_install_query_recorder)()
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        self.report(request, response, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current.get()
+        if profile is not None:
+            #DRF views carry their class as cls, plain Django (and the async) views as view_class
+            view = getattr(view_func, "cls", None) or getattr(view_func, "view_class", view_func)
+            profile.view = view.__name__
+
+    def report(self, request, response, profile):
+        total = time.perf_counter() - profile.started
+        db_time = sum(duration for _, duration in profile.queries)
+        duplicates = profile.duplicates(getattr(settings, "REQUEST_PROFILING_DUPLICATE_THRESHOLD", 3))
+
+        timings = [f'total;dur={total * 1000:.1f}', f'db;dur={db_time * 1000:.1f};desc="{len(profile.queries)} queries"']
+        timings += [
+            f'{name};dur={seconds * 1000:.1f};desc="{count}x"'
+            for name, (count, seconds) in profile.sections.items()
+        ]
+        response["Server-Timing"] = ", ".join(timings)
+
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "view": profile.view,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 1),
+            "db_ms": round(db_time * 1000, 1),
+            "db_queries": len(profile.queries),
+            "duplicate_queries": duplicates,
+            "sections_ms": {name: round(seconds * 1000, 1) for name, (_, seconds) in profile.sections.items()},
+        }))
+
+        budget = getattr(settings, "REQUEST_PROFILING_QUERY_BUDGET", None)
+        if isinstance(budget, dict):
+            budget = budget.get(profile.view)
+        if budget is not None and len(profile.queries) > budget:
+            message = f"{profile.view} ran {len(profile.queries)} queries, budget is {budget}"
+            if getattr(settings, "REQUEST_PROFILING_FAIL_ON_BUDGET", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware that also runs in an async stack. WhiteNoise's own middleware is sync only,
+    which makes Django run every request under ASGI (async views included) in a thread.
+
+    Requests for anything but a static file are passed straight on, static files are looked up
+    and served in a thread like WhiteNoise would.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
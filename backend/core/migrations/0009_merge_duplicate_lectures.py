@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:03
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def merge_duplicate_lectures(apps, schema_editor):
+    # fold lectures sharing (course, start_dt) into the first one so the unique
+    # constraint can be added, keeping every user's attendance, notes and summary
+    Lecture = apps.get_model("core", "Lecture")
+    Attendance = apps.get_model("core", "Attendance")
+
+    duplicates = (
+        Lecture.objects.values("course_id", "start_dt")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+    )
+    for dup in duplicates:
+        keep, *extra = Lecture.objects.filter(
+            course_id=dup["course_id"], start_dt=dup["start_dt"]
+        ).order_by("id")
+        for lecture in extra:
+            for att in Attendance.objects.filter(lecture=lecture):
+                existing = Attendance.objects.filter(
+                    lecture=keep, user_id=att.user_id
+                ).first()
+                if existing is None:
+                    att.lecture = keep
+                    att.save(update_fields=["lecture"])
+                    continue
+                existing.attended = existing.attended or att.attended
+                existing.note_upload = existing.note_upload or att.note_upload
+                existing.summary = existing.summary or att.summary
+                existing.save(update_fields=["attended", "note_upload", "summary"])
+            lecture.delete()
+
+
+class Migration(migrations.Migration):
+    # kept separate from the constraint migration, postgres refuses ALTER TABLE
+    # while the row changes made here still have pending deferred FK checks
+
+    dependencies = [
+        ("core", "0008_summaryjob"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lectures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_merge_duplicate_lectures"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="course",
+            index=models.Index(fields=["user", "name"], name="course_user_name_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="lecture",
+            constraint=models.UniqueConstraint(
+                fields=("course", "start_dt"), name="uniq_course_lecture_start"
+            ),
+        ),
+    ]
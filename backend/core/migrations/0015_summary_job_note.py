@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:35
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_note_name(apps, schema_editor):
+    # pending jobs were queued for the attendance's current note
+    SummaryJob = apps.get_model("core", "SummaryJob")
+    Attendance = apps.get_model("core", "Attendance")
+    note = Attendance.objects.filter(pk=OuterRef("attendance_id")).values(
+        "note_upload"
+    )[:1]
+    SummaryJob.objects.filter(status__in=["queued", "running"]).update(
+        note_name=Coalesce(Subquery(note), Value(""))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_attendance_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="summaryjob",
+            name="note_name",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.AddField(
+            model_name="summaryjob",
+            name="started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_note_name, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,33 @@
+import datetime
 import uuid #to generate ids
 import os
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import F, FilteredRelation, Prefetch, Q
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 User = get_user_model() #ref to the proj's user model
 
+class CourseQuerySet(models.QuerySet):
+    def for_dashboard(self, user, start=None, end=None):
+        #the courses with the user's AttendanceStats row joined in as stats_* (see core.utils.stats.attach_stats),
+        #plus one query each for the lectures starting within [start, end) and the user's attendances
+        stats = ["version", "stale_at", "total", "past", "attended", "missed", "upcoming", "summarized"]
+        lectures = Lecture.objects.prefetch_related(
+            Prefetch("attendances", queryset=Attendance.objects.filter(user=user), to_attr="user_attendances")
+        )
+        if start:
+            lectures = lectures.filter(start_dt__gte=start)
+        if end:
+            lectures = lectures.filter(start_dt__lt=end)
+        return self.annotate(
+            user_stats=FilteredRelation("stats", condition=Q(stats__user=user)),
+            **{f"stats_{name}": F(f"user_stats__{name}") for name in stats},
+        ).prefetch_related(Prefetch("lectures", queryset=lectures))
+
+
 class Course(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
@@ -17,24 +39,112 @@ class Course(models.Model):
     #color for calendar ui, defaults to light green, wants hex code
     color_hex = models.CharField(max_length=7, default='#90EE90') 
 
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CourseQuerySet.as_manager()
+
+    class Meta():
+        indexes = [
+            #ImportTimetable looks courses up by (user, name)
+            models.Index(fields=["user", "name"], name="course_user_name_idx"),
+        ]
+
     def __str__(self):
         return self.name
     
 
+class LectureQuerySet(models.QuerySet):
+    def with_user_attendance(self, user):
+        #loads the course and the given user's attendance row in a fixed number of queries,
+        #the attendance (if any) ends up in a list on lecture.user_attendances
+        return self.select_related("course").prefetch_related(
+            Prefetch(
+                "attendances",
+                queryset=Attendance.objects.filter(user=user),
+                to_attr="user_attendances",
+            )
+        )
+
+
+class LectureSeries(models.Model):
+    """
+    A weekly recurring lecture: one row per imported timetable slot instead of one Lecture per week.
+
+    Occurrences are expanded on read for the requested window (see core.utils.series) and only
+    stored as Lecture rows, with the id they were listed under, once something is attached to one
+    (an attendance, a note, an override). Dates in exdates are skipped, a stored Lecture at the
+    same course and start replaces the expanded occurrence.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="series")
+
+    #0 = Monday, times are UTC like the rest of the imported slots
+    weekday = models.PositiveSmallIntegerField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    from_date = models.DateField()
+    to_date = models.DateField()
+    location = models.CharField(max_length=100)
+
+    #ISO dates of cancelled occurrences
+    exdates = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta():
+        ordering = ["created_at", "id"]
+
+    def __str__(self):
+        return f"{self.course.name} - weekly from {self.from_date} to {self.to_date}"
+
+    def days(self, from_date=None, to_date=None):
+        #dates of the occurrences within [from_date, to_date], cancelled ones excluded
+        first = max(self.from_date, from_date) if from_date else self.from_date
+        last = min(self.to_date, to_date) if to_date else self.to_date
+        skipped = set(self.exdates)
+        day = first + datetime.timedelta(days=(self.weekday - first.weekday()) % 7)
+        while day <= last:
+            if day.isoformat() not in skipped:
+                yield day
+            day += datetime.timedelta(days=7)
+
+    def bounds(self, day):
+        #start and end of the occurrence on a given day
+        return (
+            datetime.datetime.combine(day, self.start_time, tzinfo=datetime.timezone.utc),
+            datetime.datetime.combine(day, self.end_time, tzinfo=datetime.timezone.utc),
+        )
+
+
 class Lecture(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
     #links each lecture to a course
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="lectures")
+
+    #the series a stored occurrence was expanded from, if any
+    series = models.ForeignKey(LectureSeries, on_delete=models.SET_NULL, null=True, blank=True, related_name="lectures")
     
     #start and end times
     start_dt = models.DateTimeField()
     end_dt = models.DateTimeField()
     location = models.CharField(max_length=100)
 
+    #the calendar feed's delta mode picks lectures changed since a given time by this
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = LectureQuerySet.as_manager()
+
     class Meta():
         #define table sorted ordering
         ordering = ["start_dt"]
+        constraints = [
+            #one lecture per course start time, imports rely on this; the index also serves
+            #the per course lecture lists and start_dt range scans
+            models.UniqueConstraint(fields=["course", "start_dt"], name="uniq_course_lecture_start"),
+        ]
 
     def __str__(self):
         return f"{self.course.name} - {self.start_dt:%Y-%m-%d %H:%M}"
@@ -74,3 +184,109 @@ class Attendance(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.lecture} - {'✔' if self.attended else '❌'}"
 
+
+
+class SummaryJob(models.Model):
+    """
+    A queued request to summarize the note attached to an attendance row.
+
+    Created by the summarize jobs endpoint and processed by the configured job backend
+    (see core.utils.jobs), which writes the result to Attendance.summary.
+
+    note_name is the note the job was queued for, the summary is only saved if the attendance
+    still has that note. Jobs pending for longer than SUMMARY_JOB_TIMEOUT are failed as stale.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="summary_jobs")
+    attendance = models.ForeignKey(Attendance, on_delete=models.CASCADE, related_name="summary_jobs")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    error = models.TextField(blank=True, default="")
+    note_name = models.CharField(max_length=100, blank=True, default="")
+
+    #set when a worker claims the job
+    started_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta():
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"{self.attendance} - {self.status}"
+
+
+class UserDataVersion(models.Model):
+    """
+    Per-user change counter behind the ETags of the dashboard, lecture and attendance
+    endpoints (see core.utils.versioning).
+
+    version is bumped whenever one of the user's courses, lectures or attendances is written.
+    stale_at is the next lecture start, when a lecture's status flips from upcoming to
+    missed and the serialized responses change without any write.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="data_version")
+    version = models.PositiveBigIntegerField(default=1)
+    stale_at = models.DateTimeField(null=True, blank=True)
+
+    #when version last changed, the Last-Modified of the calendar feed
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user.username} - v{self.version}"
+
+
+class AttendanceStats(models.Model):
+    """
+    A user's attendance counts for one course, so the dashboard reads one row per course instead
+    of counting lectures and attendances (see core.utils.stats).
+
+    missed and upcoming count lectures with those statuses (same precedence as
+    LectureSerializer.get_status), past and the rest count lectures whatever their status.
+    Writes mark the affected rows stale (stale_at None), reads recompute stale rows. stale_at is
+    otherwise the next lecture start, when past/missed/upcoming shift without any write.
+    version is bumped by every invalidation, so a recompute racing a write can't store old counts.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="attendance_stats")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="stats")
+
+    total = models.PositiveIntegerField(default=0)
+    past = models.PositiveIntegerField(default=0)
+    attended = models.PositiveIntegerField(default=0)
+    missed = models.PositiveIntegerField(default=0)
+    upcoming = models.PositiveIntegerField(default=0)
+    summarized = models.PositiveIntegerField(default=0)
+
+    stale_at = models.DateTimeField(null=True, blank=True)
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta():
+        constraints = [
+            models.UniqueConstraint(fields=["user", "course"], name="uniq_user_course_stats"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.course.name}: {self.attended}/{self.total}"
+
+
+class CalendarToken(models.Model):
+    """
+    Secret behind a user's calendar feed url (/api/calendar/<token>.ics).
+
+    Calendar apps can't send an Authorization header, so the token in the url is the
+    credential. Rotating it (see CalendarFeedLink) invalidates the old url.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="calendar_token")
+    token = models.CharField(max_length=64, unique=True)
+
+    def __str__(self):
+        return f"{self.user.username} - calendar feed"
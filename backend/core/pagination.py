@@ -0,0 +1,152 @@
+import base64
+import datetime
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination keyed on (ordering field, id).
+
+    Each page is fetched with `WHERE (key, id) > (last key, last id) ORDER BY key, id LIMIT n`,
+    so the cost per page stays flat however deep the client pages, and rows inserted
+    while paging never shift or duplicate the rows that come after the cursor.
+    The cursor is an opaque token of the last row's key.
+
+    Pagination is opt-in: responses stay a plain list unless the client sends `cursor`
+    or `page_size`, the first page is requested with `?page_size=<n>`.
+    """
+
+    #subclasses set the ordered field, e.g. "start_dt" or "lecture__start_dt"
+    ordering_field = None
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request):
+        default = getattr(settings, "API_PAGE_SIZE", 100)
+        max_size = getattr(settings, "API_MAX_PAGE_SIZE", 1000)
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return default
+        return max(1, min(size, max_size))
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None, extra=()):
+        """
+        extra are rows from outside the queryset (the expanded occurrences of lecture series),
+        sorted by (key, id), which are merged into the pages. It can be a callable of
+        (cursor, limit) returning the first `limit` of those rows after the decoded cursor
+        (None on the first page), so they are only produced for the page asked for.
+        """
+        queryset = self._page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        if callable(extra):
+            extra = extra(self.cursor, self.page_size + 1)
+        return self._set_page(self._merge(list(queryset), extra))
+
+    async def apaginate_queryset(self, queryset, request, view=None, extra=()):
+        #paginate_queryset for async views, the page is fetched with the async ORM
+        queryset = self._page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        if callable(extra):
+            extra = await sync_to_async(extra)(self.cursor, self.page_size + 1)
+        return self._set_page(self._merge([row async for row in queryset], extra))
+
+    def _page_queryset(self, queryset, request):
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(self.ordering_field, "id")
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        self.cursor = self.decode_cursor(cursor) if cursor else None
+        if self.cursor:
+            key, pk = self.cursor
+            queryset = queryset.filter(
+                Q(**{f"{self.ordering_field}__gt": key}) | Q(**{self.ordering_field: key, "id__gt": pk})
+            )
+
+        #one extra row tells us whether there is a next page
+        return queryset[: self.page_size + 1]
+
+    def _merge(self, rows, extra):
+        if not extra:
+            return rows
+        position = lambda row: (self.row_key(row), row.pk)
+        if self.cursor:
+            extra = [row for row in extra if position(row) > self.cursor]
+        return sorted(rows + list(extra[: self.page_size + 1]), key=position)[: self.page_size + 1]
+
+    def row_key(self, row):
+        for part in self.ordering_field.split("__"):
+            row = getattr(row, part)
+        return row
+
+    def _set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        key = self.row_key(last)
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(key, last.pk))
+
+    @staticmethod
+    def encode_cursor(key, pk):
+        raw = json.dumps([key.isoformat(), str(pk)]).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            key, pk = json.loads(raw)
+            key, pk = datetime.datetime.fromisoformat(key), uuid.UUID(pk)
+        except (TypeError, ValueError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+        #encode_cursor writes aware keys, a naive one can't be compared with the rows
+        if key.tzinfo is None:
+            raise NotFound(self.invalid_cursor_message)
+        return key, pk
+
+
+class LecturePagination(KeysetPagination):
+    ordering_field = "start_dt"
+
+
+class AttendancePagination(KeysetPagination):
+    ordering_field = "lecture__start_dt"
@@ -1,15 +1,25 @@
+import datetime
 import os
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError as DjangoValidationError
 
 from rest_framework import serializers
 from django.utils import timezone
-from .models import Course, Lecture, Attendance
+from .middleware import profile_section
+from .models import Course, Lecture, LectureSeries, Attendance, SummaryJob
 
 WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
+class ProfiledListSerializer(serializers.ListSerializer):
+    #times list serialization as "serialize" in the request profile (core.middleware)
+    @property
+    def data(self):
+        with profile_section("serialize"):
+            return super().data
+
 class CourseSerializer(serializers.ModelSerializer):
     #define how the course model should be parsed as when in json form
     class Meta:
@@ -28,12 +38,22 @@ class LectureSerializer(serializers.ModelSerializer):
         model = Lecture
         #course is the course uuid for actual linking, course_name is the actual string name for readability
         fields = ['id', 'course', 'course_name', 'start_dt', 'end_dt', 'location', 'attended', 'status', 'has_notes', 'note_filename']
+        list_serializer_class = ProfiledListSerializer
+
+    def _user_attendance(self, obj):
+        #returns the request user's attendance record for this lecture
+        #reads the prefetched list from Lecture.objects.with_user_attendance when available,
+        #otherwise runs one query and stores it the same way so the other fields reuse it
+        if not hasattr(obj, "user_attendances"):
+            user = self.context["request"].user
+            record = obj.attendances.filter(user=user).first()
+            obj.user_attendances = [record] if record else []
+        return obj.user_attendances[0] if obj.user_attendances else None
 
     def get_attended(self, obj):
         #returns corresponding attendance record for a user
         #we need a seperate def since this param is defined by attendance object itself
-        user = self.context["request"].user
-        record = obj.attendances.filter(user=user).first()
+        record = self._user_attendance(obj)
         return record.attended if record else None
 
     def get_status(self, obj):
@@ -44,10 +64,9 @@ class LectureSerializer(serializers.ModelSerializer):
         3) upcoming (start_dt > now)
         4) missed (past & not attended)
         """
-        user = self.context["request"].user
         now = timezone.now()
         
-        attendance = obj.attendances.filter(user = user).first()
+        attendance = self._user_attendance(obj)
         
         if attendance and attendance.summary:
             return "summarized"
@@ -58,19 +77,63 @@ class LectureSerializer(serializers.ModelSerializer):
         return "missed"
     
     def get_has_notes(self, obj):
-        user = self.context["request"].user
-        rec = obj.attendances.filter(user=user).first()
+        rec = self._user_attendance(obj)
         return bool(rec and rec.note_upload)
     
     def get_note_filename(self, obj):
-        user = self.context["request"].user
-        rec = obj.attendances.filter(user=user).first()
+        rec = self._user_attendance(obj)
         f = getattr(rec, "note_upload", None)
         if not f:
             return None
         name = getattr(f, "name", "") or ""
         return os.path.basename(name) if name else None
 
+class LectureFilterSerializer(serializers.Serializer):
+    #validates the optional LectureViewSet query params and turns from/to into a
+    #half-open [from, to) range of aware datetimes for Lecture.start_dt
+    #an ISO date for "to" includes that whole day, an ISO datetime is the exclusive bound
+    #"from" may be given as either an ISO date or datetime
+    #course limits the lectures to a single course
+    course = serializers.UUIDField(required=False)
+
+    def to_internal_value(self, data):
+        validated = super().to_internal_value(data)
+        errors = {}
+        for name in ("from", "to"):
+            raw = data.get(name)
+            if not raw:
+                continue
+            try:
+                validated[name] = self.parse_bound(raw, end=(name == "to"))
+            except ValueError:
+                errors[name] = ["Expected an ISO 8601 date or datetime."]
+        if errors:
+            raise serializers.ValidationError(errors)
+        return validated
+
+    def validate(self, data):
+        if "from" in data and "to" in data and data["from"] >= data["to"]:
+            raise serializers.ValidationError("the from bound must be before the to bound")
+        return data
+
+    @staticmethod
+    def parse_bound(raw, end=False):
+        #a plain date is midnight of that day, or of the next day for an end bound
+        tz = timezone.get_current_timezone()
+        try:
+            day = datetime.date.fromisoformat(raw)
+        except ValueError:
+            value = datetime.datetime.fromisoformat(raw)
+            return value if timezone.is_aware(value) else timezone.make_aware(value, tz)
+
+        if end:
+            day += datetime.timedelta(days=1)
+        return datetime.datetime.combine(day, datetime.time.min, tzinfo=tz)
+
+class AnalyticsFilterSerializer(LectureFilterSerializer):
+    #query params of the analytics endpoint: the lecture list filters plus the trend granularity
+    period = serializers.ChoiceField(choices=["week", "month"], default="week")
+
 class SlotSerializer(serializers.Serializer):
     #defines a Slot object, which is a recurring lecture time
     #so they all should have a course, day of the week, start and end time, date range, and location
@@ -92,6 +155,69 @@ class SlotSerializer(serializers.Serializer):
             raise serializers.ValidationError("the from_date must be on/before the to_date")
         return data
     
+class WeekdayField(serializers.ChoiceField):
+    #"Mon".."Sun" on the wire, 0..6 in the model
+    def __init__(self, **kwargs):
+        super().__init__(choices=WEEKDAYS, **kwargs)
+
+    def to_internal_value(self, data):
+        return WEEKDAYS.index(super().to_internal_value(data))
+
+    def to_representation(self, value):
+        return WEEKDAYS[value]
+
+class LectureSeriesSerializer(serializers.ModelSerializer):
+    #a weekly recurring lecture, exdates are the dates of cancelled occurrences
+    weekday = WeekdayField()
+    exdates = serializers.ListField(child=serializers.DateField(), required=False)
+
+    class Meta:
+        model = LectureSeries
+        fields = ['id', 'course', 'weekday', 'start_time', 'end_time', 'from_date', 'to_date', 'location', 'exdates']
+
+    def validate_course(self, course):
+        if course.user_id != self.context["request"].user.pk:
+            raise serializers.ValidationError("Course not found.")
+        return course
+
+    def validate(self, data):
+        start = data.get("start_time", getattr(self.instance, "start_time", None))
+        end = data.get("end_time", getattr(self.instance, "end_time", None))
+        if start >= end:
+            raise serializers.ValidationError("the start_time must be before the end_time")
+        first = data.get("from_date", getattr(self.instance, "from_date", None))
+        last = data.get("to_date", getattr(self.instance, "to_date", None))
+        if first > last:
+            raise serializers.ValidationError("the from_date must be on/before the to_date")
+        if "exdates" in data:
+            data["exdates"] = sorted({day.isoformat() for day in data["exdates"]})
+        return data
+
+class TimetableEventSerializer(serializers.Serializer):
+    #one event of an imported ics timetable, the course is the event's SUMMARY
+    course = serializers.CharField(max_length=100)
+    start_dt = serializers.DateTimeField()
+    end_dt = serializers.DateTimeField()
+    location = serializers.CharField(max_length=100, allow_blank=True)
+
+    def validate(self, data):
+        if data["start_dt"] >= data["end_dt"]:
+            raise serializers.ValidationError("the start must be before the end")
+        return data
+
+class TimetableFileSerializer(serializers.Serializer):
+    #an uploaded timetable, the format defaults to the file extension
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=["ics", "csv"], required=False)
+
+    def validate(self, data):
+        if "format" not in data:
+            ext = os.path.splitext(data["file"].name)[-1].lower().lstrip(".")
+            if ext not in ("ics", "csv"):
+                raise serializers.ValidationError("Upload an .ics or .csv file, or pass the format.")
+            data["format"] = ext
+        return data
+
 class AttendanceSerializer(serializers.ModelSerializer):
     #define how the attendance model should be parsed as when in json form
     course_name = serializers.CharField(source="lecture.course.name", read_only=True)
@@ -103,6 +229,7 @@ class AttendanceSerializer(serializers.ModelSerializer):
         #lecture saves the uuid of the lecture this attendance object corresponds to
         fields = ['id', 'lecture', 'course_name', 'lecture_start_dt', 'attended', 'note_upload', 'created_at', 'updated_at', 'summary']
         read_only_fields = ['created_at', 'updated_at']
+        list_serializer_class = ProfiledListSerializer
 
     def update(self, instance, validated_data):
         # If a new file is uploaded, clear the existing summary
@@ -110,36 +237,100 @@ class AttendanceSerializer(serializers.ModelSerializer):
             instance.summary = None
         return super().update(instance, validated_data)
 
+class BulkAttendanceSerializer(serializers.Serializer):
+    #body of the bulk attendance toggle: which lectures, and attended or not
+    lectures = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
+    attended = serializers.BooleanField()
+
+    def validate_lectures(self, value):
+        limit = getattr(settings, "ATTENDANCE_BULK_MAX", 1000)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"at most {limit} lectures per request")
+        return value
+
+class NoteUploadSerializer(serializers.Serializer):
+    #body of a presigned note upload request, the content type follows from the file extension
+    filename = serializers.CharField(max_length=200)
+    size = serializers.IntegerField(min_value=1)
+
+class NoteUploadConfirmSerializer(serializers.Serializer):
+    upload_id = serializers.CharField()
+
+class CalendarFeedSerializer(serializers.Serializer):
+    #optional delta mode of the calendar feed: only lectures changed after this ISO datetime
+    since = serializers.DateTimeField(required=False)
+
+class SummaryJobSerializer(serializers.ModelSerializer):
+    #status payload for a queued summarization, summary is filled in once the job is done
+    job_id = serializers.UUIDField(source="id", read_only=True)
+    attendance_id = serializers.UUIDField(source="attendance.id", read_only=True)
+    summary = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SummaryJob
+        fields = ['job_id', 'attendance_id', 'status', 'error', 'summary', 'created_at', 'updated_at']
+
+    def get_summary(self, obj):
+        if obj.status != SummaryJob.DONE:
+            return None
+        return obj.attendance.summary
+
 class CourseDashboardSerializer(serializers.ModelSerializer):
     #define the course model for dashboard display, which now
     #includes all lecture information associated with the course for a user
     lectures = serializers.SerializerMethodField()
     percentage = serializers.SerializerMethodField()
+    stats = serializers.SerializerMethodField()
 
     class Meta:
         model = Course
 
-        fields = ['id', 'name', 'color_hex', 'lectures', 'percentage']
+        fields = ['id', 'name', 'color_hex', 'lectures', 'percentage', 'stats']
+        list_serializer_class = ProfiledListSerializer
     
     def get_lectures(self, obj):
-        user = self.context["request"].user
-        lectures = obj.lectures.all().order_by("start_dt")
+        #lectures are already ordered by start_dt (Lecture.Meta.ordering), so .all() keeps
+        #using the prefetch from DashboardView instead of issuing a new query
+        lectures = obj.lectures.all()
+
+        #occurrences of the course's lecture series, expanded by core.utils.series.add_series_lectures
+        expanded = getattr(obj, "series_lectures", None)
+        if expanded:
+            lectures = sorted(list(lectures) + expanded, key=lambda lecture: lecture.start_dt)
 
         return LectureSerializer(lectures, many=True, context=self.context).data
     
     def get_percentage(self, obj):
-        user = self.context["request"].user
-        lectures = obj.lectures.all()
-
-        total_lecs = lectures.count()
+        #use the AttendanceStats row set by core.utils.stats.attach_stats when present
+        stats = getattr(obj, "attendance_stats", None)
+        if stats is None:
+            user = self.context["request"].user
+            lectures = obj.lectures.all()
+            total_lecs = lectures.count()
+            attended = lectures.filter(attendances__attended = True, attendances__user = user).count()
+        else:
+            total_lecs, attended = stats.total, stats.attended
 
         if total_lecs == 0:
             #for divide by 0
             return 0
 
-        attended = lectures.filter(attendances__attended = True, attendances__user = user)
+        return (attended/total_lecs) * 100
 
-        return (attended.count()/total_lecs) * 100
+    def get_stats(self, obj):
+        #lecture counts per status (see LectureSerializer.get_status) plus total/past/attended,
+        #from the AttendanceStats row set by core.utils.stats.attach_stats
+        stats = getattr(obj, "attendance_stats", None)
+        if stats is None:
+            return None
+        return {
+            "total": stats.total,
+            "past": stats.past,
+            "attended": stats.attended,
+            "summarized": stats.summarized,
+            "missed": stats.missed,
+            "upcoming": stats.upcoming,
+        }
     
 
 class RegistrationSerializer(serializers.ModelSerializer):
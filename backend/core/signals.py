@@ -0,0 +1,43 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Attendance, Course, Lecture, LectureSeries
+from core.utils.events import ATTENDANCE_UPDATED, SUMMARY_READY, attendance_event_data, publish
+from core.utils.stats import mark_stale
+from core.utils.versioning import bump_user_version
+
+#the Attendance fields AttendanceStats counts
+COUNTED_FIELDS = {"attended", "summary"}
+
+
+@receiver([post_save, post_delete], sender=Course)
+def course_changed(sender, instance, **kwargs):
+    bump_user_version(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Lecture)
+@receiver([post_save, post_delete], sender=LectureSeries)
+def lecture_changed(sender, instance, **kwargs):
+    if sender.course.is_cached(instance):
+        user_id = instance.course.user_id
+    else:
+        user_id = Course.objects.filter(pk=instance.course_id).values_list("user_id", flat=True).first()
+    if user_id is not None:
+        bump_user_version(user_id)
+    mark_stale(course_id=instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=Attendance)
+def attendance_changed(sender, instance, update_fields=None, **kwargs):
+    bump_user_version(instance.user_id)
+    if not update_fields or COUNTED_FIELDS & set(update_fields):
+        mark_stale(user_id=instance.user_id, course__lectures=instance.lecture_id)
+
+
+@receiver(post_save, sender=Attendance)
+def push_attendance_events(sender, instance, update_fields=None, **kwargs):
+    if update_fields and "summary" in update_fields:
+        if instance.summary:
+            publish(instance.user_id, SUMMARY_READY, attendance=instance.pk, lecture=instance.lecture_id)
+        return
+    publish(instance.user_id, ATTENDANCE_UPDATED, attendances=[attendance_event_data(instance)])
@@ -1,3 +1,1971 @@
-from django.test import TestCase
+import asyncio
+import base64
+import datetime
+import io
+import json
+import logging
+import tempfile
+import threading
+import time
+import uuid
+import zoneinfo
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import boto3
+import httpx
+from botocore.stub import Stubber
+import openai
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import CommandError, call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from docx import Document
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config import urls as config_urls
+from core.benchmarks import BENCHMARKS, generate_dataset, run_suite
+from core.pagination import LecturePagination
+from core.utils.events import InMemoryBroker, PostgresBroker
+from core.utils.ics import fold
+from core.utils.llm import AsyncLLMClient, CircuitBreaker, CircuitOpenError, LLMClient, TokenBucket
+from core.utils.summarization import (
+    asummarize_long_text, estimate_tokens, extract_text_from_file, iter_text_chunks, split_into_chunks,
+    summarize_long_text,
+)
+from core.utils.versioning import get_user_version
+from core.utils.response_cache import stats as response_cache_stats
+from core.utils.series import occurrence, occurrence_id, stored_keys
+from core.utils.stats import attach_stats, refresh_stats
+from core.utils.timetable import import_slots
+from core.utils.uploads import LocalDirectUpload, S3DirectUpload
+from core.utils.summary_cache import SummaryCache, get_summary_cache, summary_cache_key
+
+from .middleware import QueryBudgetExceeded
+from .views import LectureViewSet
+from .models import AttendanceStats, Course, Lecture, LectureSeries, Attendance, SummaryJob, UserDataVersion
+from .serializers import WEEKDAYS
+
+
+def make_semester(user, courses=2, lectures=5, attended_every=2):
+    #seeds courses for a user, one lecture per week each, and an attendance row
+    #for every lecture where every nth one is marked attended
+    start = timezone.now() - datetime.timedelta(weeks=lectures // 2)
+    for c in range(courses):
+        course = Course.objects.create(user=user, name=f"Course {c}")
+        for i in range(lectures):
+            lecture = Lecture.objects.create(
+                course=course,
+                start_dt=start + datetime.timedelta(weeks=i, hours=c),
+                end_dt=start + datetime.timedelta(weeks=i, hours=c + 1),
+                location="Room 1",
+            )
+            Attendance.objects.create(user=user, lecture=lecture, attended=(i % attended_every == 0))
+
+
+class CoreTestCase(TestCase):
+    def setUp(self):
+        #cached responses are keyed by user pk and data version, which repeat between tests
+        caches["responses"].clear()
+
+
+class LectureQueryCountTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        #create the etag version row up front, after that it costs one query per request
+        get_user_version(self.user.pk)
+
+    def test_lecture_list_query_count_is_constant(self):
+        make_semester(self.user, courses=1, lectures=2)
+        #version, lectures, attendances and the lecture series lookup
+        with self.assertNumQueries(4):
+            self.client.get("/api/lectures/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_semester(self.user, courses=4, lectures=10)
+        get_user_version(self.user.pk)
+        with self.assertNumQueries(4):
+            response = self.client.get("/api/lectures/")
+        self.assertEqual(len(response.data), 42)
+
+    def test_lecture_fields_use_only_own_attendance(self):
+        make_semester(self.user, courses=1, lectures=1)
+        lecture = Lecture.objects.get()
+        other = User.objects.create_user(username="bob", password="pw")
+        Attendance.objects.create(user=other, lecture=lecture, attended=False, summary="theirs")
+
+        row = self.client.get("/api/lectures/").data[0]
+        self.assertTrue(row["attended"])
+        self.assertEqual(row["status"], "attended")
+        self.assertFalse(row["has_notes"])
+        self.assertIsNone(row["note_filename"])
+
+
+class DashboardTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        get_user_version(self.user.pk)
+
+    def test_dashboard_query_count_is_constant(self):
+        make_semester(self.user, courses=1, lectures=2)
+        #the counts come with the courses once their stats rows are current
+        attach_stats(list(Course.objects.all()), self.user)
+        #one more for the lecture series of all courses
+        with self.assertNumQueries(5):
+            self.client.get("/api/dashboard/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_semester(self.user, courses=5, lectures=40)
+        get_user_version(self.user.pk)
+        attach_stats(list(Course.objects.all()), self.user)
+        with self.assertNumQueries(5):
+            response = self.client.get("/api/dashboard/")
+        self.assertEqual(len(response.data["courses"]), 6)
+
+    def test_dashboard_percentage_and_shape(self):
+        make_semester(self.user, courses=1, lectures=4, attended_every=2)
+        other = User.objects.create_user(username="bob", password="pw")
+        for lecture in Lecture.objects.all():
+            Attendance.objects.create(user=other, lecture=lecture, attended=True)
+        Course.objects.create(user=self.user, name="Empty")
+
+        courses = {c["name"]: c for c in self.client.get("/api/dashboard/").data["courses"]}
+        self.assertEqual(courses["Course 0"]["percentage"], 50)
+        self.assertEqual(courses["Empty"]["percentage"], 0)
+        self.assertEqual(
+            set(courses["Course 0"].keys()), {"id", "name", "color_hex", "lectures", "percentage", "stats"}
+        )
+        self.assertEqual([lec["attended"] for lec in courses["Course 0"]["lectures"]], [True, False, True, False])
+
+
+class AttendanceToggleTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make_semester(self.user, courses=1, lectures=4, attended_every=2)
+        self.lectures = list(Lecture.objects.order_by("start_dt"))
+
+    def test_toggle_updates_existing_row_in_place(self):
+        lecture = self.lectures[0]
+        before = Attendance.objects.get(lecture=lecture)
+        before.summary = "kept"
+        before.save()
+
+        #upsert and the lecture/course load, plus the version bump and stats invalidation after commit
+        with self.assertNumQueries(4), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/lectures/{lecture.id}/attendance/", {"attended": False}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["id"], str(before.id))
+        self.assertFalse(response.data["attended"])
+        self.assertEqual(response.data["summary"], "kept")
+        self.assertEqual(response.data["course_name"], "Course 0")
+        self.assertEqual(Attendance.objects.count(), 4)
+        self.assertFalse(Attendance.objects.get(pk=before.pk).attended)
+
+    def test_toggle_creates_missing_row(self):
+        lecture = self.lectures[1]
+        Attendance.objects.filter(lecture=lecture).delete()
+        response = self.client.post(f"/api/lectures/{lecture.id}/attendance/", {"attended": True}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Attendance.objects.get(user=self.user, lecture=lecture).attended)
+
+    def test_toggle_is_scoped_to_owner(self):
+        other = User.objects.create_user(username="bob", password="pw")
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.post(f"/api/lectures/{self.lectures[0].id}/attendance/", {"attended": True}, format="json")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Attendance.objects.filter(user=other).exists())
+
+    def test_toggle_bumps_data_version(self):
+        version = get_user_version(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/lectures/{self.lectures[0].id}/attendance/", {"attended": False}, format="json")
+        self.assertEqual(get_user_version(self.user.pk), version + 1)
+
+    def test_bulk_toggle(self):
+        other = User.objects.create_user(username="bob", password="pw")
+        make_semester(other, courses=1, lectures=1)
+        foreign = Lecture.objects.get(course__user=other)
+        ids = [str(lecture.id) for lecture in self.lectures]
+
+        #the upsert and the lookup of the ids that weren't found, which can't be series occurrences
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                "/api/attendances/bulk/", {"lectures": ids + [ids[0], str(foreign.id)], "attended": True}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["attendances"]), 4)
+        self.assertEqual(response.data["missing"], [foreign.id])
+        self.assertTrue(all(row["attended"] for row in response.data["attendances"]))
+        self.assertEqual(Attendance.objects.filter(user=self.user, attended=True).count(), 4)
+        self.assertTrue(Attendance.objects.get(user=other).attended)
+
+    @override_settings(ATTENDANCE_BULK_MAX=2)
+    def test_bulk_toggle_validation(self):
+        ids = [str(lecture.id) for lecture in self.lectures]
+        self.assertEqual(self.client.post("/api/attendances/bulk/", {"lectures": ids, "attended": True}, format="json").status_code, 400)
+        self.assertEqual(self.client.post("/api/attendances/bulk/", {"lectures": [], "attended": True}, format="json").status_code, 400)
+        self.assertEqual(self.client.post("/api/attendances/bulk/", {"lectures": ids[:1]}, format="json").status_code, 400)
+
+
+class ImportTimetableTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def slot(self, **overrides):
+        slot = {
+            "course": "Biology",
+            "weekday": "Wed",
+            "start_time": "09:00",
+            "end_time": "10:00",
+            "from_date": "2025-09-01",
+            "to_date": "2025-09-30",
+            "location": "Room 1",
+        }
+        slot.update(overrides)
+        return slot
+
+    def test_import_creates_lectures_once(self):
+        response = self.client.post("/api/schedule/import/", [self.slot()], format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 4)
+        self.assertEqual(len(self.client.get("/api/lectures/").data), 4)
+
+        #the version bump after commit invalidates the cached list
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/schedule/import/", [self.slot(), self.slot(to_date="2025-10-08")], format="json"
+            )
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(Course.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(LectureSeries.objects.count(), 2)
+        lectures = self.client.get("/api/lectures/").data
+        self.assertEqual(len(lectures), 6)
+        self.assertTrue(all(lecture["attended"] is False for lecture in lectures))
+        #nothing is stored per week
+        self.assertFalse(Lecture.objects.exists())
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_import_query_count_does_not_grow_with_range(self):
+        slots = [
+            self.slot(course=f"Course {i}", weekday=day, from_date="2025-01-01", to_date="2025-12-31")
+            for i, day in enumerate(["Mon", "Tue", "Wed", "Thu", "Fri"])
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post("/api/schedule/import/", slots, format="json")
+        self.assertEqual(response.data["created"], 5 * 52 + 1)
+        #a handful of statements, independent of the 261 lectures (sqlite splits big batches)
+        self.assertLessEqual(len(ctx), 12)
+
+
+class TimetableFileImportTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content, **data):
+        file = io.BytesIO(content.encode("utf-8") if isinstance(content, str) else content)
+        file.name = name
+        return self.client.post("/api/schedule/import/", dict(data, file=file), format="multipart")
+
+    def test_csv_import_reports_bad_rows(self):
+        content = (
+            "\ufeffcourse,weekday,start_time,end_time,from_date,to_date,location\r\n"
+            "Biology,Wed,09:00,10:00,2025-09-01,2025-09-30,Room 1\r\n"
+            "Chemistry,Someday,09:00,10:00,2025-09-01,2025-09-30,Lab\r\n"
+            "Physics,Mon,11:00,10:00,2025-09-01,2025-09-30,Hall\r\n"
+            "Biology,Fri,09:00,10:00,2025-09-01,2025-09-07,Room 2\r\n"
+        )
+        response = self.upload("timetable.csv", content)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 5)
+        self.assertEqual((response.data["rows"], response.data["imported"]), (4, 2))
+        self.assertEqual([error["line"] for error in response.data["errors"]], [3, 4])
+        self.assertIn("weekday", response.data["errors"][0]["errors"])
+        self.assertEqual(Course.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(LectureSeries.objects.count(), 2)
+        self.assertEqual(len(self.client.get("/api/lectures/").data), 5)
+
+    def test_csv_needs_the_slot_columns(self):
+        response = self.upload("timetable.csv", "course,start\nBiology,09:00\n")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("weekday", response.data["error"])
+        self.assertEqual(self.upload("timetable.csv", b"\xff\xfe\x00bad").status_code, 400)
+        self.assertEqual(self.upload("timetable.txt", "course").status_code, 400)
+
+    def test_ics_import_expands_recurrences(self):
+        content = "\r\n".join([
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "BEGIN:VEVENT",
+            "UID:bio@example.com",
+            "SUMMARY:Biology\\, intro",
+            "LOCATION:Room 1",
+            "DTSTART;TZID=Europe/London:20251001T090000",
+            "DTEND;TZID=Europe/London:20251001T100000",
+            "RRULE:FREQ=WEEKLY;COUNT=6",
+            "EXDATE;TZID=Europe/London:20251015T090000",
+            "BEGIN:VALARM",
+            "TRIGGER:-PT10M",
+            "DESCRIPTION:not the lecture",
+            "END:VALARM",
+            "END:VEVENT",
+            "BEGIN:VEVENT",
+            "SUMMARY:Chemistry",
+            "DTSTART:20251002T130000Z",
+            "DURATION:PT1H30M",
+            "LOCATION:Lab with a very long name that is folded onto a second line by",
+            "  the exporter",
+            "END:VEVENT",
+            "BEGIN:VEVENT",
+            "SUMMARY:Holiday",
+            "DTSTART;VALUE=DATE:20251003",
+            "END:VEVENT",
+            "BEGIN:VEVENT",
+            "SUMMARY:Cancelled",
+            "STATUS:CANCELLED",
+            "DTSTART:20251004T130000Z",
+            "DTEND:20251004T140000Z",
+            "END:VEVENT",
+            "END:VCALENDAR",
+            "",
+        ])
+        response = self.upload("calendar.ics", content)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 6)
+        self.assertEqual(response.data["rows"], 4)
+        self.assertEqual(response.data["errors"], [{"line": 23, "errors": ["All-day events can't be imported as lectures."]}])
+
+        biology = Lecture.objects.filter(course__name="Biology, intro").order_by("start_dt")
+        self.assertEqual(biology.count(), 5)
+        #wall clock time is kept across the end of daylight saving time on 26 Oct
+        starts = [lecture.start_dt.astimezone(zoneinfo.ZoneInfo("Europe/London")) for lecture in biology]
+        self.assertEqual({start.hour for start in starts}, {9})
+        self.assertNotIn(datetime.date(2025, 10, 15), [start.date() for start in starts])
+
+        chemistry = Lecture.objects.get(course__name="Chemistry")
+        self.assertEqual(chemistry.end_dt - chemistry.start_dt, datetime.timedelta(minutes=90))
+        self.assertTrue(chemistry.location.endswith("by the exporter"))
+
+        #importing again adds nothing
+        self.assertEqual(self.upload("calendar.ics", content).data["created"], 0)
+
+    def test_ics_import_with_a_concurrent_insert(self):
+        #a lecture inserted by another import between the lookup and the insert conflicts and is
+        #skipped, the attendance has to point at the stored lecture
+        content = "\r\n".join([
+            "BEGIN:VCALENDAR",
+            "BEGIN:VEVENT",
+            "SUMMARY:Biology",
+            "DTSTART:20251001T090000Z",
+            "DTEND:20251001T100000Z",
+            "RRULE:FREQ=WEEKLY;COUNT=2",
+            "END:VEVENT",
+            "END:VCALENDAR",
+            "",
+        ])
+        bulk_create = Lecture.objects.bulk_create
+        start = datetime.datetime(2025, 10, 1, 9, tzinfo=datetime.timezone.utc)
+
+        def racing_bulk_create(lectures, **kwargs):
+            course = Course.objects.get(user=self.user, name="Biology")
+            Lecture.objects.create(course=course, start_dt=start, end_dt=start + datetime.timedelta(hours=1), location="Lab")
+            return bulk_create(lectures, **kwargs)
+
+        with mock.patch.object(Lecture.objects, "bulk_create", side_effect=racing_bulk_create):
+            response = self.upload("calendar.ics", content)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 1)
+        lectures = Lecture.objects.filter(course__user=self.user).order_by("start_dt")
+        self.assertEqual([lecture.location for lecture in lectures], ["Lab", ""])
+        self.assertEqual(
+            set(Attendance.objects.filter(user=self.user).values_list("lecture_id", flat=True)),
+            {lecture.pk for lecture in lectures},
+        )
+
+    def test_ics_open_ended_recurrence_is_bounded(self):
+        content = "\n".join([
+            "BEGIN:VEVENT",
+            "SUMMARY:Maths",
+            "DTSTART:20250901T090000Z",
+            "DTEND:20250901T100000Z",
+            "RRULE:FREQ=WEEKLY",
+            "END:VEVENT",
+            "BEGIN:VEVENT",
+            "SUMMARY:Drills",
+            "DTSTART:20250901T090000Z",
+            "DTEND:20250901T091000Z",
+            "RRULE:FREQ=HOURLY",
+            "END:VEVENT",
+        ])
+        with override_settings(TIMETABLE_IMPORT_HORIZON_DAYS=70, TIMETABLE_IMPORT_MAX_OCCURRENCES=100):
+            response = self.upload("calendar.ics", content)
+        self.assertEqual(response.data["created"], 11)
+        self.assertIn("more than 100", response.data["errors"][0]["errors"][0])
+
+    def test_large_files_are_imported_in_batches(self):
+        rows = ["course,weekday,start_time,end_time,from_date,to_date,location"]
+        rows += [f"Course {i % 50},{WEEKDAYS[i % 5]},{8 + i % 10:02d}:00,{9 + i % 10:02d}:00,2025-09-01,2025-09-07,Room {i}" for i in range(500)]
+        with CaptureQueriesContext(connection) as ctx:
+            with mock.patch("core.utils.timetable_files.BATCH_SIZE", 100):
+                response = self.upload("timetable.csv", "\n".join(rows))
+        self.assertEqual(response.data["rows"], 500)
+        #each course's ten rows differ only in location, so they share one weekly lecture
+        self.assertEqual(response.data["created"], 50)
+        self.assertEqual(LectureSeries.objects.count(), 500)
+        self.assertEqual(Course.objects.count(), 50)
+        #queries grow with the number of batches, not rows
+        self.assertLessEqual(len(ctx), 50)
+
+    def test_only_errors_is_a_bad_request(self):
+        response = self.upload("calendar.ics", "BEGIN:VEVENT\nSUMMARY:x\nEND:VEVENT\n")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"][0]["errors"], ["Missing DTSTART."])
+
+
+@override_settings(SUMMARY_JOB_BACKEND="core.utils.jobs.ImmediateJobBackend")
+class SummaryJobTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make_semester(self.user, courses=1, lectures=1)
+        self.attendance = Attendance.objects.get()
+        self.attendance.note_upload = "lecture1.txt"
+        self.attendance.save()
+        get_summary_cache().clear()
+        cache.clear()
+
+    def queue(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/summarize/jobs/", {"attendance_id": str(self.attendance.id)}, format="json")
+
+    @mock.patch("core.utils.jobs.extract_text_from_file", return_value="photosynthesis")
+    @mock.patch("core.utils.summarization.summarize_text", return_value="plants make sugar")
+    def test_job_summarizes_and_can_be_polled(self, summarize, _extract):
+        response = self.queue()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], "queued")
+        summarize.assert_called_once_with("photosynthesis", client=None)
+
+        response = self.client.get(f"/api/summarize/jobs/{response.data['job_id']}/")
+        self.assertEqual(response.data["status"], "done")
+        self.assertEqual(response.data["summary"], "plants make sugar")
+        self.attendance.refresh_from_db()
+        self.assertEqual(self.attendance.summary, "plants make sugar")
+
+        #already summarized, answered without a job
+        response = self.queue()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["summary"], "plants make sugar")
+        self.assertEqual(summarize.call_count, 1)
+
+    @mock.patch("core.utils.jobs.extract_text_from_file", side_effect=OSError)
+    def test_unreadable_note_fails_job(self, _extract):
+        with self.assertLogs("core.utils.jobs", "WARNING"):
+            job_id = self.queue().data["job_id"]
+        response = self.client.get(f"/api/summarize/jobs/{job_id}/")
+        self.assertEqual(response.data["status"], "failed")
+        self.assertEqual(response.data["error"], "Unable to read uploaded note. Please reupload.")
+
+    def test_jobs_are_private(self):
+        job = SummaryJob.objects.create(user=self.user, attendance=self.attendance)
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username="bob", password="pw"))
+        self.assertEqual(other.get(f"/api/summarize/jobs/{job.id}/").status_code, 404)
+        response = other.post("/api/summarize/jobs/", {"attendance_id": str(self.attendance.id)}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(SUMMARY_JOB_BACKEND="core.utils.jobs.DatabaseQueueJobBackend")
+    @mock.patch("core.utils.jobs.extract_text_from_file", return_value="photosynthesis")
+    @mock.patch("core.utils.summarization.summarize_text", return_value="plants make sugar")
+    def test_database_queue_worker(self, _summarize, _extract):
+        job_id = self.queue().data["job_id"]
+        self.assertEqual(SummaryJob.objects.get(pk=job_id).status, "queued")
+
+        call_command("run_summary_jobs", "--once", stdout=io.StringIO())
+        self.assertEqual(SummaryJob.objects.get(pk=job_id).status, "done")
+
+    @override_settings(SUMMARY_JOB_BACKEND="core.utils.jobs.DatabaseQueueJobBackend", SUMMARY_JOB_TIMEOUT=60)
+    def test_stale_job_is_failed_and_queued_again(self):
+        #a job lost with a restarted worker stays queued, after the timeout a new one replaces it
+        job_id = self.queue().data["job_id"]
+        self.assertEqual(self.queue().data["job_id"], job_id)
+
+        SummaryJob.objects.filter(pk=job_id).update(created_at=timezone.now() - datetime.timedelta(minutes=2))
+        response = self.queue()
+        self.assertNotEqual(response.data["job_id"], job_id)
+        self.assertEqual(response.data["status"], "queued")
+        stale = SummaryJob.objects.get(pk=job_id)
+        self.assertEqual((stale.status, stale.error), ("failed", "Summarization timed out. Please try again."))
+
+        #the worker fails jobs a crashed worker left running
+        SummaryJob.objects.filter(pk=response.data["job_id"]).update(
+            status="running", started_at=timezone.now() - datetime.timedelta(minutes=2)
+        )
+        call_command("run_summary_jobs", "--once", stdout=io.StringIO())
+        self.assertEqual(SummaryJob.objects.get(pk=response.data["job_id"]).status, "failed")
+
+    @mock.patch("core.utils.summarization.summarize_text", return_value="plants make sugar")
+    def test_replaced_note_keeps_no_old_summary(self, _summarize):
+        def reupload(_note):
+            #the note is replaced while the old one is being summarized
+            Attendance.objects.filter(pk=self.attendance.pk).update(note_upload="lecture2.txt")
+            return "photosynthesis"
+
+        with mock.patch("core.utils.jobs.extract_text_from_file", side_effect=reupload), \
+                self.assertLogs("core.utils.jobs", "WARNING"):
+            job_id = self.queue().data["job_id"]
+        job = SummaryJob.objects.get(pk=job_id)
+        self.assertEqual((job.note_name, job.status), ("lecture1.txt", "failed"))
+        self.attendance.refresh_from_db()
+        self.assertIsNone(self.attendance.summary)
+
+        #the new note gets its own job
+        with mock.patch("core.utils.jobs.extract_text_from_file", return_value="photosynthesis"):
+            response = self.queue()
+        self.assertNotEqual(response.data["job_id"], job_id)
+        self.attendance.refresh_from_db()
+        self.assertEqual(self.attendance.summary, "plants make sugar")
+
+
+class SummaryCacheTests(TestCase):
+    def setUp(self):
+        get_summary_cache().clear()
+        cache.clear()
+
+    def test_key_depends_on_text_and_params(self):
+        params = {"model": "a", "temperature": 0.5}
+        self.assertEqual(summary_cache_key("notes", params), summary_cache_key("notes", dict(params)))
+        self.assertNotEqual(summary_cache_key("notes", params), summary_cache_key("notes!", params))
+        self.assertNotEqual(summary_cache_key("notes", params), summary_cache_key("notes", {**params, "model": "b"}))
+
+    def test_lru_eviction_and_counters(self):
+        summary_cache = SummaryCache(max_entries=2)
+        summary_cache.set("a", "1")
+        summary_cache.set("b", "2")
+        self.assertEqual(summary_cache.get("a"), "1")
+        summary_cache.set("c", "3")
+        self.assertIsNone(summary_cache.get("b"))
+        self.assertEqual(summary_cache.get("c"), "3")
+        stats = summary_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"], stats["entries"]), (2, 1, 1, 2))
+
+    def test_ttl_expiry(self):
+        summary_cache = SummaryCache(ttl=10)
+        with mock.patch("core.utils.summary_cache.time.monotonic", return_value=100):
+            summary_cache.set("a", "1")
+        with mock.patch("core.utils.summary_cache.time.monotonic", return_value=111):
+            self.assertIsNone(summary_cache.get("a"))
+
+    def test_shared_level_is_used_across_processes(self):
+        SummaryCache(alias="default").set("a", "1")
+        fresh = SummaryCache(alias="default")
+        self.assertEqual(fresh.get("a"), "1")
+        self.assertEqual(fresh.stats()["shared_hits"], 1)
+
+    @mock.patch("core.utils.summarization.summarize_text", return_value="summary")
+    def test_identical_notes_summarized_once(self, summarize):
+        user = User.objects.create_user(username="alice", password="pw")
+        make_semester(user, courses=1, lectures=2)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with mock.patch("core.views.extract_text_from_file", return_value="same notes"):
+            for attendance in Attendance.objects.all():
+                attendance.note_upload = "shared.txt"
+                attendance.save()
+                response = client.post("/api/summarize/", {"attendance_id": str(attendance.id)}, format="json")
+                self.assertEqual(response.data["summary"], "summary")
+        summarize.assert_called_once_with("same notes", client=None)
+
+
+class NoteExtractionTests(TestCase):
+    def test_txt_chunks_are_streamed_and_budgeted(self):
+        text = "é" * 100_000
+        note = ContentFile(text.encode("utf-8"), name="notes.txt")
+        chunks = list(iter_text_chunks(note))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), text)
+
+        note = ContentFile(text.encode("utf-8"), name="notes.txt")
+        self.assertEqual(extract_text_from_file(note, max_bytes=5), "éé")
+
+    def test_docx_paragraphs_and_early_stop(self):
+        doc = Document()
+        for i in range(3):
+            doc.add_paragraph(f"paragraph {i}")
+        buf = io.BytesIO()
+        doc.save(buf)
+
+        note = ContentFile(buf.getvalue(), name="notes.docx")
+        self.assertEqual(extract_text_from_file(note), "paragraph 0\nparagraph 1\nparagraph 2")
+        note = ContentFile(buf.getvalue(), name="notes.docx")
+        self.assertEqual(list(iter_text_chunks(note, max_bytes=15)), ["paragraph 0", "\npar"])
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            extract_text_from_file(ContentFile(b"x", name="notes.png"))
+
+
+class FakeLLMClient:
+    #stands in for openai.OpenAI, answers each request with a numbered summary
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.prompts = []
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        with self.lock:
+            if self.failures:
+                raise self.failures.pop(0)
+            self.prompts.append(messages[-1]["content"])
+            content = f"summary {len(self.prompts)}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class MapReduceSummarizationTests(TestCase):
+    def test_split_respects_token_budget(self):
+        text = "line\n" * 50 + "x" * 100
+        chunks = split_into_chunks(text, max_tokens=10)
+        self.assertTrue(all(estimate_tokens(chunk) <= 10 for chunk in chunks))
+        self.assertEqual("".join(chunks), text)
+
+    def test_short_text_is_one_call(self):
+        fake = FakeLLMClient()
+        summary = summarize_long_text("short", client=LLMClient(openai_client=fake), chunk_tokens=100)
+        self.assertEqual(summary, "summary 1")
+        self.assertEqual(fake.prompts, ["Summarize the following lecture:\n\nshort"])
+
+    def test_long_text_maps_then_reduces(self):
+        fake = FakeLLMClient()
+        text = "".join(f"paragraph {i}\n" for i in range(40))
+        summary = summarize_long_text(text, client=LLMClient(openai_client=fake), chunk_tokens=20, max_workers=3)
+
+        map_prompts = [p for p in fake.prompts if p.startswith("Summarize part")]
+        reduce_prompts = [p for p in fake.prompts if p.startswith("Combine")]
+        self.assertEqual(len(map_prompts), len(split_into_chunks(text, 20)))
+        self.assertGreaterEqual(len(reduce_prompts), 1)
+        self.assertEqual(summary, f"summary {len(fake.prompts)}")
+
+
+class LLMClientTests(TestCase):
+    def connection_error(self):
+        return openai.APIConnectionError(request=httpx.Request("POST", "http://llm.local"))
+
+    def test_client_is_built_lazily(self):
+        with mock.patch("core.utils.llm.openai.OpenAI") as factory:
+            client = LLMClient()
+            factory.assert_not_called()
+            client.client
+            client.client
+        factory.assert_called_once()
+
+    @mock.patch("core.utils.llm.time.sleep")
+    def test_retries_with_backoff_and_metrics(self, sleep):
+        fake = FakeLLMClient(failures=[self.connection_error()] * 2)
+        client = LLMClient(openai_client=fake, max_retries=2, backoff=0.5)
+        with self.assertLogs("core.utils.llm", "WARNING"):
+            self.assertEqual(client.chat(model="m", messages=[{"content": "hi"}]), "summary 1")
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [0.5, 1.0])
+        metrics = client.metrics.snapshot()
+        self.assertEqual((metrics["requests"], metrics["errors"], metrics["retries"]), (3, 2, 2))
+
+        fake = FakeLLMClient(failures=[self.connection_error()] * 2)
+        with self.assertRaises(openai.APIConnectionError), self.assertLogs("core.utils.llm", "WARNING"):
+            LLMClient(openai_client=fake, max_retries=1).chat(model="m", messages=[{"content": "hi"}])
+
+    def test_circuit_breaker_fails_fast_then_recovers(self):
+        fake = FakeLLMClient(failures=[self.connection_error()] * 2)
+        client = LLMClient(openai_client=fake, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=10))
+        for _ in range(2):
+            with self.assertRaises(openai.APIConnectionError):
+                client.chat(model="m", messages=[{"content": "hi"}])
+        with self.assertRaises(CircuitOpenError):
+            client.chat(model="m", messages=[{"content": "hi"}])
+        self.assertEqual(client.metrics.snapshot()["rejected"], 1)
+
+        with mock.patch("core.utils.llm.time.monotonic", return_value=time.monotonic() + 11):
+            self.assertEqual(client.chat(model="m", messages=[{"content": "hi"}]), "summary 1")
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_cancelled_trial_releases_the_circuit(self):
+        fake = AsyncFakeLLMClient(failures=[self.connection_error(), asyncio.CancelledError()])
+        client = AsyncLLMClient(openai_client=fake, max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=10))
+        with self.assertRaises(openai.APIConnectionError):
+            async_to_sync(client.chat)(model="m", messages=[{"content": "hi"}])
+
+        with mock.patch("core.utils.llm.time.monotonic", return_value=time.monotonic() + 11):
+            with self.assertRaises(asyncio.CancelledError):
+                async_to_sync(client.chat)(model="m", messages=[{"content": "hi"}])
+            #the cancelled trial doesn't keep the half open slot, the next call is the trial
+            self.assertEqual(async_to_sync(client.chat)(model="m", messages=[{"content": "hi"}]), "summary 1")
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    @mock.patch("core.utils.llm.time.sleep")
+    def test_honours_retry_after(self, sleep):
+        def rate_limited(retry_after):
+            response = httpx.Response(429, headers={"retry-after": retry_after}, request=httpx.Request("POST", "http://llm.local"))
+            return openai.RateLimitError("slow down", response=response, body=None)
+
+        fake = FakeLLMClient(failures=[rate_limited("3"), rate_limited("0")])
+        client = LLMClient(openai_client=fake, max_retries=2, backoff=0.5)
+        with self.assertLogs("core.utils.llm", "WARNING"):
+            self.assertEqual(client.chat(model="m", messages=[{"content": "hi"}]), "summary 1")
+        #the longer of the backoff and the provider's wait
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [3.0, 1.0])
+
+        #a wait beyond the timeout isn't sat out
+        sleep.reset_mock()
+        fake = FakeLLMClient(failures=[rate_limited("120")])
+        with self.assertRaises(openai.RateLimitError):
+            LLMClient(openai_client=fake, max_retries=2, timeout=30).chat(model="m", messages=[{"content": "hi"}])
+        sleep.assert_not_called()
+
+    def test_metrics_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username="alice", password="pw"))
+        self.assertEqual(client.get("/api/metrics/").status_code, 403)
+
+        client.force_authenticate(User.objects.create_user(username="admin", password="pw", is_staff=True))
+        response = client.get("/api/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["llm"]["circuit"]["state"], CircuitBreaker.CLOSED)
+        self.assertIn("retries", response.data["llm"])
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=1, capacity=2)
+        self.assertTrue(bucket.acquire(timeout=0))
+        self.assertTrue(bucket.acquire(timeout=0))
+        self.assertFalse(bucket.acquire(timeout=0))
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class QueryPlanTests(TestCase):
+    #the queries the hot views actually run should be served by index lookups, not full table scans
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="alice", password="pw")
+        make_semester(cls.user, courses=3, lectures=20)
+        for i in range(5):
+            make_semester(User.objects.create_user(username=f"user{i}", password="pw"), courses=3, lectures=20)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def view_queries(self, path, table):
+        #the statements a request runs against `table`, with their params filled in
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        statements = [q["sql"] for q in queries if f'FROM "{table}"' in q["sql"] or f'JOIN "{table}"' in q["sql"]]
+        self.assertTrue(statements, f"{path} ran no query on {table}")
+        return statements
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                #on tables this small the planner prefers a seq scan whatever the indexes,
+                #with seq scans priced out it shows which index it would use
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(f"EXPLAIN {sql}")
+                return "\n".join(row[0] for row in cursor.fetchall())
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return "\n".join(row[-1] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, path, table, indexes):
+        #indexes: names (or name prefixes, for the FK indexes Django names with a hash) any of which
+        #may serve `table` on postgres; sqlite names the unique constraints' indexes sqlite_autoindex_*
+        for sql in self.view_queries(path, table):
+            plan = self.explain(sql)
+            if connection.vendor == "postgresql":
+                self.assertNotIn(f"Seq Scan on {table}", plan, plan)
+                self.assertTrue(any(index in plan for index in indexes), plan)
+                continue
+            #sqlite: "SCAN core_lecture" is a full scan, "SEARCH core_lecture USING INDEX ..." is not
+            lines = [line for line in plan.splitlines() if line.split()[1:2] == [table]]
+            self.assertTrue(lines, plan)
+            for line in lines:
+                self.assertRegex(line, rf"^SEARCH {table} USING .*INDEX", plan)
+
+    def test_lecture_list_plan(self):
+        #LectureViewSet: the user's lectures through the course, plus the attendance prefetch
+        self.assertUsesIndex("/api/lectures/", "core_lecture", ["uniq_course_lecture_start"])
+        self.assertUsesIndex("/api/lectures/", "core_attendance", ["uniq_user_lecture_attendance", "core_attendance_"])
+
+    def test_attendance_list_plan(self):
+        #AttendanceViewSet
+        self.assertUsesIndex("/api/attendances/", "core_attendance", ["uniq_user_lecture_attendance", "core_attendance_user_id"])
+
+    def test_dashboard_plan(self):
+        #DashboardView: courses with their stats row, then the lecture and attendance prefetches
+        self.assertUsesIndex("/api/dashboard/", "core_course", ["course_user_name_idx", "core_course_user_id", "core_course_pkey"])
+        self.assertUsesIndex("/api/dashboard/", "core_lecture", ["uniq_course_lecture_start"])
+
+    def test_course_lookup_plan(self):
+        #ImportTimetable looks courses up by (user, name)
+        with CaptureQueriesContext(connection) as queries:
+            list(Course.objects.filter(user=self.user, name="Course 0"))
+        self.assertIn("course_user_name_idx", self.explain(queries[0]["sql"]))
+
+
+class LectureRangeFilterTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.bio = Course.objects.create(user=self.user, name="Biology")
+        self.chem = Course.objects.create(user=self.user, name="Chemistry")
+        for course, day, hour in [(self.bio, 1, 9), (self.bio, 7, 23), (self.bio, 8, 9), (self.chem, 3, 9)]:
+            start = datetime.datetime(2025, 9, day, hour, tzinfo=datetime.timezone.utc)
+            Lecture.objects.create(course=course, start_dt=start, end_dt=start + datetime.timedelta(hours=1), location="A")
+
+    def days(self, **params):
+        response = self.client.get("/api/lectures/", params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [datetime.datetime.fromisoformat(row["start_dt"]).day for row in response.data]
+
+    def test_date_bounds_include_the_whole_to_day(self):
+        self.assertEqual(self.days(**{"from": "2025-09-01", "to": "2025-09-07"}), [1, 3, 7])
+        self.assertEqual(self.days(**{"from": "2025-09-02"}), [3, 7, 8])
+
+    def test_datetime_bounds_are_half_open(self):
+        self.assertEqual(self.days(**{"from": "2025-09-01T09:00:00Z", "to": "2025-09-07T23:00:00Z"}), [1, 3])
+
+    def test_course_filter(self):
+        self.assertEqual(self.days(course=str(self.chem.id)), [3])
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get("/api/lectures/", {"from": "last week"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/lectures/", {"course": "nope"}).status_code, 400)
+        response = self.client.get("/api/lectures/", {"from": "2025-09-08", "to": "2025-09-01"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_range_uses_start_dt_index(self):
+        request = mock.Mock(user=self.user, query_params={"from": "2025-09-01", "to": "2025-09-07"})
+        queryset = LectureViewSet(request=request).get_queryset()
+        #no date cast around the column (the updated_at columns also contain "DATE")
+        self.assertNotIn("DATE(", str(queryset.query).upper())
+        #the range shows up as an index condition on the raw column
+        self.assertRegex(queryset.explain(), r"(?i)index.*start_dt ?>")
+
+
+class KeysetPaginationTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make_semester(self.user, courses=3, lectures=5)
+
+    def walk(self, url, **params):
+        seen = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row["id"] for row in response.data["results"])
+            if not response.data["next"]:
+                return seen
+            response = self.client.get(response.data["next"])
+
+    def test_unpaginated_by_default(self):
+        self.assertIsInstance(self.client.get("/api/lectures/").data, list)
+
+    def test_pages_cover_history_in_order(self):
+        ids = self.walk("/api/lectures/", page_size=4)
+        expected = [str(pk) for pk in Lecture.objects.order_by("start_dt", "id").values_list("pk", flat=True)]
+        self.assertEqual(ids, expected)
+
+        ids = self.walk("/api/attendances/", page_size=4)
+        self.assertEqual(len(ids), 15)
+        self.assertEqual(len(set(ids)), 15)
+
+    def test_cursor_is_stable_under_inserts_and_ties(self):
+        first = self.client.get("/api/lectures/", {"page_size": 5}).data
+        last_seen = Lecture.objects.get(pk=first["results"][-1]["id"])
+
+        #a lecture at the same start time and one before the cursor
+        Lecture.objects.create(course=Course.objects.create(user=self.user, name="Late"),
+                               start_dt=last_seen.start_dt, end_dt=last_seen.end_dt, location="B")
+        early = last_seen.start_dt - datetime.timedelta(days=365)
+        Lecture.objects.create(course=last_seen.course, start_dt=early, end_dt=early, location="B")
+
+        ordered = [str(pk) for pk in Lecture.objects.order_by("start_dt", "id").values_list("pk", flat=True)]
+        self.assertEqual(self.walk(first["next"]), ordered[ordered.index(str(last_seen.pk)) + 1:])
+
+    def test_page_query_count_is_flat(self):
+        first = self.client.get("/api/attendances/", {"page_size": 2}).data
+        #version lookup for the etag + the page
+        with self.assertNumQueries(2):
+            self.client.get(first["next"])
+        with self.assertNumQueries(4):
+            self.client.get("/api/lectures/", {"page_size": 2})
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get("/api/lectures/", {"cursor": "garbage"}).status_code, 404)
+
+    def test_crafted_cursors(self):
+        malformed = base64.urlsafe_b64encode(json.dumps(["2020-01-01T00:00:00+00:00", 123]).encode()).decode()
+        naive = LecturePagination.encode_cursor(datetime.datetime(2020, 1, 1), uuid.uuid4())
+        for cursor in [malformed, naive]:
+            for url in ["/api/lectures/", "/api/attendances/"]:
+                self.assertEqual(self.client.get(url, {"cursor": cursor}).status_code, 404)
+
+
+class ConditionalGetTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make_semester(self.user, courses=1, lectures=4)
+
+    def etag(self, url):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_not_modified_without_serializing(self):
+        for url in ["/api/dashboard/", "/api/lectures/", "/api/attendances/"]:
+            etag = self.etag(url)
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        etag = self.etag("/api/dashboard/")
+        lecture = Lecture.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/lectures/{lecture.id}/attendance/", {"attended": False}, format="json")
+        self.assertNotEqual(self.etag("/api/dashboard/"), etag)
+
+        etag = self.etag("/api/dashboard/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(user=self.user, name="New")
+        self.assertEqual(self.client.get("/api/dashboard/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_other_users_writes_keep_the_etag(self):
+        etag = self.etag("/api/lectures/")
+        with self.captureOnCommitCallbacks(execute=True):
+            make_semester(User.objects.create_user(username="bob", password="pw"), courses=1, lectures=1)
+        self.assertEqual(self.etag("/api/lectures/"), etag)
+
+    def test_etag_changes_when_a_lecture_starts(self):
+        etag = self.etag("/api/lectures/")
+        next_start = Lecture.objects.filter(start_dt__gt=timezone.now()).order_by("start_dt").first().start_dt
+        with mock.patch("core.utils.versioning.timezone.now", return_value=next_start + datetime.timedelta(seconds=1)):
+            self.assertNotEqual(self.etag("/api/lectures/"), etag)
+
+
+class ResponseCacheTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make_semester(self.user, courses=2, lectures=3)
+        response_cache_stats.reset()
+
+    def test_repeat_reads_skip_the_database(self):
+        first = self.client.get("/api/dashboard/").json()
+        #version lookup only
+        with self.assertNumQueries(1):
+            second = self.client.get("/api/dashboard/").json()
+        self.assertEqual(first, second)
+        stats = response_cache_stats.snapshot()
+        self.assertEqual((stats["hits"], stats["misses"], stats["stores"]), (1, 1, 1))
+        self.assertGreater(stats["bytes_stored_total"], 0)
+
+    def test_stats_endpoint(self):
+        self.client.get("/api/dashboard/")
+        self.client.get("/api/dashboard/")
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_user(username="admin", password="pw", is_staff=True))
+        data = admin.get("/api/metrics/").data
+        self.assertEqual((data["response_cache"]["hits"], data["response_cache"]["stores"]), (1, 1))
+        self.assertEqual(data["summary_cache"]["max_entries"], get_summary_cache().max_entries)
+
+    def test_entries_are_per_query(self):
+        week = self.client.get("/api/lectures/", {"from": "2000-01-01", "to": "2000-01-07"}).json()
+        self.assertEqual(week, [])
+        self.assertEqual(len(self.client.get("/api/lectures/").json()), 6)
+
+    def test_toggle_and_summary_writes_invalidate(self):
+        lecture = Lecture.objects.order_by("start_dt").first()
+        self.assertTrue(self.client.get("/api/lectures/").json()[0]["attended"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/lectures/{lecture.id}/attendance/", {"attended": False}, format="json")
+        self.assertFalse(self.client.get("/api/lectures/").json()[0]["attended"])
+
+        attendance = Attendance.objects.get(lecture=lecture)
+        attendance.note_upload = "notes.txt"
+        with self.captureOnCommitCallbacks(execute=True):
+            attendance.save()
+        with mock.patch("core.views.extract_text_from_file", return_value="text"), \
+                mock.patch("core.views.cached_summarize_text", return_value="summary"), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/summarize/", {"attendance_id": str(attendance.id)}, format="json")
+        self.assertEqual(self.client.get("/api/lectures/").json()[0]["status"], "summarized")
+
+    def test_other_users_are_isolated(self):
+        self.client.get("/api/dashboard/")
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username="bob", password="pw"))
+        self.assertEqual(other.get("/api/dashboard/").json(), {"courses": []})
+
+    @override_settings(RESPONSE_CACHE_MAX_BYTES=10)
+    def test_large_responses_are_not_stored(self):
+        self.client.get("/api/dashboard/")
+        self.assertEqual(response_cache_stats.snapshot()["skipped"], 1)
+
+
+@override_settings(REQUEST_PROFILING_ENABLED=True, RESPONSE_CACHE_ENABLED=False)
+class RequestProfilingTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make_semester(self.user, courses=2, lectures=3)
+
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs("core.profiling", "INFO") as logs:
+            response = self.client.get("/api/dashboard/")
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertIn("serialize;dur=", response["Server-Timing"])
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["view"], "DashboardView")
+        self.assertEqual(line["status"], 200)
+        self.assertGreater(line["db_queries"], 0)
+        self.assertEqual(line["duplicate_queries"], [])
+
+    def test_flags_repeated_queries(self):
+        #without the prefetch every lecture looks its attendance up on its own
+        with mock.patch.object(LectureViewSet, "get_queryset", lambda view: Lecture.objects.filter(course__user=self.user)), \
+                self.assertLogs("core.profiling", "INFO") as logs:
+            self.client.get("/api/lectures/")
+        duplicates = json.loads(logs.records[0].getMessage())["duplicate_queries"]
+        self.assertTrue(any(d["count"] == 6 and "core_attendance" in d["sql"] for d in duplicates))
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0.0)
+    def test_sampling(self):
+        self.assertNotIn("Server-Timing", self.client.get("/api/ping/"))
+
+    @override_settings(REQUEST_PROFILING_QUERY_BUDGET={"DashboardView": 1}, REQUEST_PROFILING_FAIL_ON_BUDGET=True)
+    def test_query_budget(self):
+        with self.assertLogs("core.profiling", "INFO"), self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/api/dashboard/")
+        with self.assertLogs("core.profiling", "INFO"):
+            self.client.get("/api/ping/")
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class BenchmarkTests(CoreTestCase):
+    def test_generate_dataset(self):
+        users = generate_dataset(users=2, courses=2, weeks=3, lectures_per_week=2, seed=1)
+        self.assertEqual(len(users), 2)
+        self.assertEqual(Lecture.objects.filter(course__user=users[0]).count(), 12)
+        self.assertEqual(Attendance.objects.filter(user=users[1]).count(), 12)
+
+    def test_run_suite(self):
+        user = generate_dataset(users=1, courses=2, weeks=2)[0]
+        results = run_suite(user, iterations=2, warmup=0)
+        self.assertEqual(set(results), set(BENCHMARKS))
+        for result in results.values():
+            self.assertEqual(set(result["latency_ms"]), {"mean", "p50", "p90", "p99", "max"})
+            self.assertGreater(result["queries"]["mean"], 0)
+            self.assertGreater(result["peak_memory_kib"], 0)
+
+
+class EventStreamTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.token = str(AccessToken.for_user(self.user))
+        make_semester(self.user, courses=1, lectures=2)
+        self.lecture = Lecture.objects.order_by("start_dt").first()
+
+    def toggle(self, attended):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f"/api/lectures/{self.lecture.id}/attendance/", {"attended": attended}, format="json")
+
+    async def open_stream(self):
+        response = await self.async_client.get("/api/events/", {"token": self.token})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertIn("event: ready", (await anext(stream)).decode())
+        return stream
+
+    async def test_broker_fan_out(self):
+        broker = InMemoryBroker(queue_size=2)
+        with broker.subscribe(1) as mine, broker.subscribe(2) as theirs:
+            for n in range(3):
+                broker.publish(1, {"type": "test", "data": {"n": n}})
+            await asyncio.sleep(0)
+            #the oldest event is dropped once the queue is full
+            self.assertEqual((await mine.get(timeout=1))["data"], {"n": 1})
+            self.assertEqual((await mine.get(timeout=1))["data"], {"n": 2})
+            self.assertIsNone(await theirs.get(timeout=0.01))
+        self.assertEqual(broker.subscriber_count(1), 0)
+
+    def test_postgres_broker_splits_large_events(self):
+        #NOTIFY payloads are capped at 8000 bytes, a bulk toggle of 1000 attendances is well over
+        attendances = [{"id": uuid.uuid4(), "lecture": uuid.uuid4(), "attended": True} for _ in range(1000)]
+        event = {"type": "attendance.updated", "data": {"attendances": attendances}}
+        broker = PostgresBroker()
+        with mock.patch("core.utils.events.connection") as conn, mock.patch("core.utils.events.transaction"):
+            broker.publish(1, event)
+        payloads = [c.args[1][1] for c in conn.cursor.return_value.__enter__.return_value.execute.call_args_list]
+        self.assertGreater(len(payloads), 1)
+        self.assertTrue(all(len(payload.encode()) < 8000 for payload in payloads))
+
+        delivered = []
+        with mock.patch.object(broker, "deliver", lambda user_id, event: delivered.append((user_id, event))):
+            for payload in payloads:
+                broker.receive(payload)
+            broker.receive(broker.payloads(1, {"type": "small", "data": {}})[0])
+        self.assertEqual([(user_id, e["type"]) for user_id, e in delivered], [(1, "attendance.updated"), (1, "small")])
+        self.assertEqual(delivered[0][1]["data"]["attendances"], json.loads(json.dumps(attendances, cls=DjangoJSONEncoder)))
+        self.assertEqual(broker._parts, {})
+
+    async def test_stream_requires_token(self):
+        self.assertEqual((await self.async_client.get("/api/events/")).status_code, 401)
+        self.assertEqual((await self.async_client.get("/api/events/", {"token": "nope"})).status_code, 401)
+
+    async def test_toggle_is_pushed(self):
+        stream = await self.open_stream()
+        try:
+            await sync_to_async(self.toggle)(False)
+            frame = (await anext(stream)).decode()
+        finally:
+            await stream.aclose()
+        self.assertIn("event: attendance.updated", frame)
+        data = json.loads(frame.split("data: ", 1)[1])
+        self.assertEqual(data["attendances"][0]["lecture"], str(self.lecture.id))
+        self.assertFalse(data["attendances"][0]["attended"])
+
+    @override_settings(EVENT_STREAM_HEARTBEAT=0.01)
+    async def test_heartbeat(self):
+        stream = await self.open_stream()
+        try:
+            self.assertEqual(await anext(stream), b": keepalive\n\n")
+        finally:
+            await stream.aclose()
+
+    def test_summary_and_import_events(self):
+        published = []
+        with mock.patch.object(InMemoryBroker, "publish", lambda broker, user_id, event: published.append(event)), \
+                self.captureOnCommitCallbacks(execute=True):
+            attendance = Attendance.objects.get(lecture=self.lecture)
+            attendance.summary = "short"
+            attendance.save(update_fields=["summary", "updated_at"])
+            import_slots(self.user, [{
+                "course": "New", "weekday": "Mon", "start_time": datetime.time(9), "end_time": datetime.time(10),
+                "from_date": datetime.date(2025, 9, 1), "to_date": datetime.date(2025, 9, 14), "location": "Hall",
+            }])
+        self.assertEqual([event["type"] for event in published], ["summary.ready", "timetable.imported"])
+        self.assertEqual(published[1]["data"], {"created": 2})
+
+
+class AsyncFakeLLMClient(FakeLLMClient):
+    #FakeLLMClient standing in for openai.AsyncOpenAI
+    def __init__(self, failures=()):
+        super().__init__(failures)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate))
+
+    async def acreate(self, model, messages, **kwargs):
+        return self.create(model, messages, **kwargs)
+
+
+class AsyncUrls:
+    #urlconf as with ASYNC_VIEWS on
+    urlpatterns = config_urls.async_urlpatterns + config_urls.urlpatterns
+
+
+class AsyncViewTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make_semester(self.user, courses=2, lectures=3)
+        get_user_version(self.user.pk)
+        get_summary_cache().clear()
+
+    def both(self, path, client=None, **headers):
+        client = client or self.client
+        sync = client.get(path, **headers)
+        with override_settings(ROOT_URLCONF=AsyncUrls):
+            async_ = client.get(path, **headers)
+        return sync, async_
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_responses_match_sync_views(self):
+        week = timezone.now().date()
+        paths = [
+            "/api/dashboard/",
+            "/api/lectures/",
+            f"/api/lectures/?from={week}&to={week + datetime.timedelta(days=7)}",
+            "/api/lectures/?page_size=2",
+            "/api/lectures/?from=yesterday",
+            "/api/ping/",
+        ]
+        for path in paths:
+            sync, async_ = self.both(path)
+            self.assertEqual(sync.status_code, async_.status_code, path)
+            self.assertEqual(sync.content, async_.content, path)
+            self.assertEqual(sync.get("ETag"), async_.get("ETag"), path)
+
+        sync, async_ = self.both("/api/dashboard/", client=APIClient())
+        self.assertEqual((sync.status_code, sync.content), (async_.status_code, async_.content))
+        self.assertEqual(sync["WWW-Authenticate"], async_["WWW-Authenticate"])
+
+    @override_settings(ROOT_URLCONF=AsyncUrls, REQUEST_PROFILING_ENABLED=True, RESPONSE_CACHE_ENABLED=False, DEBUG=True)
+    def test_async_stack_without_sync_adaptation(self):
+        #the ASGI handler builds the middleware chain in async mode, any sync only middleware
+        #logs an "adapted" line on django.request (with DEBUG on) and puts every request through a thread
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        with self.assertLogs("django.request", "DEBUG") as logs, self.assertLogs("core.profiling", "INFO") as profiling:
+            logging.getLogger("django.request").debug("start")
+            response = async_to_sync(AsyncClient().get)("/api/dashboard/", headers=headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertFalse([line for line in logs.output if "adapted" in line], logs.output)
+
+        line = json.loads(profiling.records[0].getMessage())
+        self.assertEqual(line["view"], "AsyncDashboardView")
+        self.assertGreater(line["db_queries"], 0)
+
+    @override_settings(ROOT_URLCONF=AsyncUrls)
+    def test_conditional_get_and_response_cache(self):
+        response_cache_stats.reset()
+        etag = self.client.get("/api/lectures/")["ETag"]
+        self.assertEqual(self.client.get("/api/lectures/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(len(self.client.get("/api/lectures/").data), 6)
+        self.assertEqual(response_cache_stats.snapshot()["hits"], 1)
+
+    @override_settings(ROOT_URLCONF=AsyncUrls)
+    @mock.patch("core.async_views.extract_text_from_file", return_value="photosynthesis")
+    def test_summarize(self, _extract):
+        attendance = Attendance.objects.first()
+        attendance.note_upload = "lecture1.txt"
+        attendance.save()
+        fake = AsyncFakeLLMClient()
+        with mock.patch("core.utils.summarization.get_async_llm_client", return_value=AsyncLLMClient(openai_client=fake)):
+            response = self.client.post("/api/summarize/", {"attendance_id": str(attendance.id)}, format="json")
+        self.assertEqual((response.status_code, response.data), (200, {"summary": "summary 1"}))
+        attendance.refresh_from_db()
+        self.assertEqual(attendance.summary, "summary 1")
+
+        response = self.client.post("/api/summarize/", {"attendance_id": str(Lecture.objects.first().id)}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_async_map_reduce_matches_sync(self):
+        text = "".join(f"paragraph {i}\n" for i in range(40))
+        sync_fake, async_fake = FakeLLMClient(), AsyncFakeLLMClient()
+        summarize_long_text(text, client=LLMClient(openai_client=sync_fake), chunk_tokens=20, max_workers=3)
+        summary = async_to_sync(asummarize_long_text)(
+            text, client=AsyncLLMClient(openai_client=async_fake), chunk_tokens=20, max_workers=3
+        )
+        self.assertEqual(sorted(async_fake.prompts), sorted(sync_fake.prompts))
+        self.assertEqual(summary, f"summary {len(async_fake.prompts)}")
+
+    @mock.patch("core.utils.llm.asyncio.sleep")
+    def test_async_client_retries(self, sleep):
+        error = openai.APIConnectionError(request=httpx.Request("POST", "http://llm.local"))
+        client = AsyncLLMClient(openai_client=AsyncFakeLLMClient(failures=[error]), backoff=0.5)
+        with self.assertLogs("core.utils.llm", "WARNING"):
+            self.assertEqual(async_to_sync(client.chat)(model="m", messages=[{"content": "hi"}]), "summary 1")
+        sleep.assert_called_once_with(0.5)
+        self.assertEqual(client.metrics.snapshot()["retries"], 1)
+
+
+class DirectUploadTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make_semester(self.user, courses=1, lectures=1)
+        self.attendance = Attendance.objects.get()
+        self.attendance.summary = "old summary"
+        self.attendance.save()
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.backend = LocalDirectUpload(storage=FileSystemStorage(location=tmp.name))
+        patcher = mock.patch("core.views.get_upload_backend", return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def start(self, filename="notes.txt", size=11):
+        return self.client.post(
+            f"/api/attendances/{self.attendance.id}/note/upload/", {"filename": filename, "size": size}, format="json"
+        )
+
+    def put(self, upload, body, content_type=None):
+        #the upload url needs no credentials, only the signed id in it
+        return APIClient().generic(
+            "PUT", upload["url"], body, content_type=content_type or upload["headers"]["Content-Type"]
+        )
+
+    def confirm(self, upload):
+        return self.client.post(
+            f"/api/attendances/{self.attendance.id}/note/confirm/", {"upload_id": upload["upload_id"]}, format="json"
+        )
+
+    def test_upload_and_confirm(self):
+        upload = self.start().data
+        self.assertEqual(upload["method"], "PUT")
+        self.assertEqual(upload["headers"], {"Content-Type": "text/plain"})
+        self.assertEqual(self.put(upload, b"hello notes").status_code, 200)
+
+        response = self.confirm(upload)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data["summary"])
+        self.attendance.refresh_from_db()
+        self.assertTrue(self.attendance.note_upload.name.startswith(f"uploads/{self.attendance.id}/"))
+        self.assertTrue(self.attendance.note_upload.name.endswith("-notes.txt"))
+        self.assertIsNone(self.attendance.summary)
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.start(filename="slides.pptx").status_code, 400)
+        with override_settings(NOTE_UPLOAD_MAX_BYTES=10):
+            self.assertEqual(self.start(size=11).status_code, 400)
+
+        other = User.objects.create_user(username="bob", password="pw")
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.post(f"/api/attendances/{self.attendance.id}/note/upload/", {"filename": "a.txt", "size": 1}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_put_must_match_ticket(self):
+        upload = self.start().data
+        self.assertEqual(self.put(upload, b"hello notes", content_type="application/pdf").status_code, 403)
+        self.assertEqual(self.put(upload, b"too long for the ticket").status_code, 403)
+        self.assertEqual(self.put(dict(upload, url=upload["url"].replace(upload["upload_id"], "forged")), b"hello notes").status_code, 403)
+        self.assertEqual(self.confirm(upload).status_code, 400)
+
+    def test_confirm_checks_stored_object(self):
+        upload = self.start().data
+        ticket = self.backend.read_ticket(upload["upload_id"])
+        #an object that doesn't match what was requested is rejected and removed
+        self.backend.storage.save(ticket["key"], ContentFile(b"short"))
+        self.assertEqual(self.confirm(upload).status_code, 400)
+        self.assertFalse(self.backend.storage.exists(ticket["key"]))
+
+        self.attendance.refresh_from_db()
+        self.assertEqual(self.attendance.summary, "old summary")
+
+    def test_confirm_is_scoped_to_attendance(self):
+        upload = self.start().data
+        self.put(upload, b"hello notes")
+        make_semester(self.user, courses=1, lectures=1)
+        other = Attendance.objects.exclude(pk=self.attendance.pk).get()
+        response = self.client.post(f"/api/attendances/{other.id}/note/confirm/", {"upload_id": upload["upload_id"]}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_s3_presigned_url_and_metadata(self):
+        s3 = boto3.client("s3", region_name="us-east-1", aws_access_key_id="key", aws_secret_access_key="secret")
+        storage = SimpleNamespace(
+            connection=SimpleNamespace(meta=SimpleNamespace(client=s3)),
+            bucket_name="bucket",
+            _normalize_name=lambda name: f"notes/{name}",
+        )
+        backend = S3DirectUpload(storage=storage)
+        upload = backend.issue(None, self.attendance, "week1.pdf", 2048)
+        key = backend.read_ticket(upload["upload_id"])["key"]
+        self.assertIn(f"/notes/{key}", upload["url"])
+        self.assertIn("Signature=", upload["url"])
+
+        with Stubber(s3) as stub:
+            stub.add_response("head_object", {"ContentLength": 2048, "ContentType": "application/pdf"},
+                              {"Bucket": "bucket", "Key": f"notes/{key}"})
+            stub.add_client_error("head_object", service_error_code="404", http_status_code=404)
+            self.assertEqual(backend.metadata(key), (2048, "application/pdf"))
+            self.assertIsNone(backend.metadata(key))
+
+
+class NoteDownloadTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make_semester(self.user, courses=1, lectures=1)
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.storage = FileSystemStorage(location=tmp.name)
+        patcher = mock.patch.object(Attendance._meta.get_field("note_upload"), "storage", self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.body = bytes(range(256)) * 1024
+        self.attendance = Attendance.objects.get()
+        self.attendance.note_upload.name = self.storage.save(
+            f"uploads/{self.attendance.id}/{'a' * 32}-week 1.pdf", ContentFile(self.body)
+        )
+        self.attendance.save()
+        self.url = f"/api/attendances/{self.attendance.id}/note/"
+
+    def test_streams_whole_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content), self.body)
+        self.assertEqual(response["Content-Length"], str(len(self.body)))
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn('filename="week 1.pdf"', response["Content-Disposition"])
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-299")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.body[100:300])
+        self.assertEqual(response["Content-Range"], f"bytes 100-299/{len(self.body)}")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-10")
+        self.assertEqual(b"".join(response.streaming_content), self.body[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.body)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.body)}")
+
+        #several ranges and stale If-Range both fall back to the whole file
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=0-1,5-6").status_code, 200)
+        stale = "Mon, 01 Jan 2001 00:00:00 GMT"
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE=stale).status_code, 200)
+
+    def test_if_modified_since_and_head(self):
+        last_modified = self.client.get(self.url)["Last-Modified"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        response = self.client.head(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Length"], str(len(self.body)))
+
+    def test_front_server_hand_off(self):
+        with override_settings(NOTE_DOWNLOAD_MODE="x-accel"):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-notes/uploads/{self.attendance.id}/{'a' * 32}-week%201.pdf")
+        self.assertEqual(response.content, b"")
+
+        with override_settings(NOTE_DOWNLOAD_MODE="x-sendfile"):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Sendfile"], self.storage.path(self.attendance.note_upload.name))
+
+    async def test_streams_under_asgi(self):
+        token = str(AccessToken.for_user(self.user))
+        response = await self.async_client.get(self.url, headers={"Authorization": f"Bearer {token}", "Range": "bytes=0-99"})
+        self.assertTrue(response.is_async)
+        self.assertEqual(b"".join([chunk async for chunk in response.streaming_content]), self.body[:100])
+
+    def test_only_owner_with_a_note(self):
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username="bob", password="pw"))
+        self.assertEqual(other.get(self.url).status_code, 404)
+
+        self.attendance.note_upload = None
+        self.attendance.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class CalendarFeedTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make_semester(self.user, courses=2, lectures=3)
+        self.url = self.client.get("/api/calendar/").data["url"]
+
+    def feed(self, **params):
+        response = APIClient().get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode("utf-8")
+
+    def test_feed_lists_lectures(self):
+        Course.objects.filter(name="Course 0").update(name="Maths, Stats; Probability")
+        response, body = self.feed()
+        self.assertEqual(response["Content-Type"], "text/calendar; charset=utf-8")
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(body.endswith("END:VCALENDAR\r\n"))
+        self.assertEqual(body.count("BEGIN:VEVENT"), 6)
+        self.assertIn("SUMMARY:Maths\\, Stats\\; Probability\r\n", body)
+        self.assertIn("X-COURSE-COLOR:#90EE90", body)
+
+        lecture = Lecture.objects.filter(start_dt__gt=timezone.now()).first()
+        self.assertIn(f"UID:{lecture.id}@sumori", body)
+        self.assertIn(f"DTSTART:{lecture.start_dt.astimezone(datetime.timezone.utc):%Y%m%dT%H%M%SZ}", body)
+        self.assertIn("DESCRIPTION:Status: attended", body)
+        self.assertIn("DESCRIPTION:Status: missed", body)
+
+    def test_long_lines_are_folded(self):
+        line = "DESCRIPTION:" + "é" * 60
+        folded = fold(line)
+        self.assertTrue(all(len(part.encode("utf-8")) <= 75 for part in folded.split("\r\n")))
+        self.assertEqual(folded.replace("\r\n ", "").rstrip("\r\n"), line)
+
+    def test_conditional_requests(self):
+        response, _ = self.feed()
+        etag = response["ETag"]
+        again = APIClient().get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+        again = APIClient().get(self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(again.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Attendance.objects.first().save()
+        self.assertEqual(APIClient().get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_since_only_sends_changes(self):
+        #nothing written in the last month (update() leaves auto_now alone)
+        month_ago = timezone.now() - datetime.timedelta(days=30)
+        for model in (Course, Lecture, Attendance):
+            model.objects.update(updated_at=month_ago)
+        since = timezone.now()
+        _, body = self.feed(since=since.isoformat())
+        self.assertEqual(body.count("BEGIN:VEVENT"), 0)
+
+        attendance = Attendance.objects.filter(lecture__start_dt__gt=since).first()
+        attendance.attended = not attendance.attended
+        attendance.save()
+        _, body = self.feed(since=since.isoformat())
+        self.assertEqual(body.count("BEGIN:VEVENT"), 1)
+        self.assertIn(f"UID:{attendance.lecture_id}@sumori", body)
+
+        #lectures that started since then flipped from upcoming to missed: both of last week's
+        #and the one that started as the semester was seeded, plus the changed attendance
+        _, body = self.feed(since=(since - datetime.timedelta(days=8)).isoformat())
+        self.assertEqual(body.count("BEGIN:VEVENT"), 4)
+
+        self.assertEqual(APIClient().get(self.url, {"since": "yesterday"}).status_code, 400)
+
+    def test_token_rotation(self):
+        response = self.client.post("/api/calendar/")
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.data["url"], self.url)
+        self.assertEqual(APIClient().get(self.url).status_code, 404)
+        self.assertEqual(APIClient().get(response.data["url"]).status_code, 200)
+        self.assertEqual(APIClient().get("/api/calendar/").status_code, 401)
+
+    async def test_streams_under_asgi(self):
+        path = self.url.replace("http://testserver", "")
+        response = await self.async_client.get(path)
+        self.assertTrue(response.is_async)
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode("utf-8")
+        self.assertEqual(body.count("BEGIN:VEVENT"), 6)
+
+
+class LectureSeriesTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.course = Course.objects.create(user=self.user, name="Biology")
+        #Wednesdays 3, 10, 17 and 24 September
+        self.series = LectureSeries.objects.create(
+            course=self.course, weekday=2, start_time=datetime.time(9), end_time=datetime.time(10),
+            from_date=datetime.date(2025, 9, 1), to_date=datetime.date(2025, 9, 30), location="Room 1",
+        )
+        self.window = {"from": "2025-09-01T00:00:00Z", "to": "2025-10-01T00:00:00Z"}
+
+    def at(self, day, hour=9):
+        return datetime.datetime(2025, 9, day, hour, tzinfo=datetime.timezone.utc)
+
+    def lectures(self, **params):
+        return self.client.get("/api/lectures/", dict(self.window, **params)).data
+
+    def test_list_expands_occurrences_between_stored_lectures(self):
+        #a stored lecture at an occurrence's start replaces it
+        stored = Lecture.objects.create(course=self.course, start_dt=self.at(10), end_dt=self.at(10, 10))
+        extra = Lecture.objects.create(course=self.course, start_dt=self.at(11), end_dt=self.at(11, 10))
+
+        lectures = self.lectures()
+        self.assertEqual(
+            [row["id"] for row in lectures],
+            [
+                str(occurrence_id(self.series.id, datetime.date(2025, 9, 3))), str(stored.id), str(extra.id),
+                str(occurrence_id(self.series.id, datetime.date(2025, 9, 17))),
+                str(occurrence_id(self.series.id, datetime.date(2025, 9, 24))),
+            ],
+        )
+        self.assertEqual(lectures[0]["status"], "missed")
+        self.assertEqual(lectures[0]["course_name"], "Biology")
+        self.assertEqual(len(self.lectures(**{"from": "2025-09-15T00:00:00Z"})), 2)
+        self.assertEqual(self.client.get("/api/lectures/", {"from": "2025-10-01T00:00:00Z"}).data, [])
+
+    def test_pages_cover_stored_and_expanded_lectures(self):
+        Lecture.objects.create(course=self.course, start_dt=self.at(11), end_dt=self.at(11, 10))
+        Lecture.objects.create(course=self.course, start_dt=self.at(18), end_dt=self.at(18, 10))
+        expected = [row["id"] for row in self.lectures()]
+
+        ids = []
+        page = self.lectures(page_size=2)
+        while True:
+            ids += [row["id"] for row in page["results"]]
+            if not page["next"]:
+                break
+            page = self.client.get(page["next"]).data
+        self.assertEqual(len(expected), 6)
+        self.assertEqual(ids, expected)
+
+    def test_pages_expand_only_from_the_cursor(self):
+        #ten years of Mondays, paged without a window
+        LectureSeries.objects.create(
+            course=self.course, weekday=0, start_time=datetime.time(14), end_time=datetime.time(15),
+            from_date=datetime.date(2020, 1, 1), to_date=datetime.date(2029, 12, 31),
+        )
+        Lecture.objects.create(course=self.course, start_dt=self.at(8, 14), end_dt=self.at(8, 15))
+        first = self.client.get("/api/lectures/", {"from": "2025-09-01T00:00:00Z", "page_size": 2}).data
+        self.assertEqual(len(first["results"]), 2)
+
+        with mock.patch("core.utils.series.occurrence", wraps=occurrence) as expanded, \
+                mock.patch("core.utils.series.stored_keys", wraps=stored_keys) as looked_up:
+            page = self.client.get(first["next"]).data
+        self.assertLessEqual(expanded.call_count, 8)
+        #stored lectures are only looked up up to the occurrences produced
+        for call in looked_up.call_args_list:
+            self.assertLessEqual(call.args[2], self.at(18))
+        #after 1 and 3 September, the stored lecture replaces the occurrence of 8 September
+        self.assertEqual(
+            [row["start_dt"] for row in first["results"] + page["results"]],
+            ["2025-09-01T14:00:00Z", "2025-09-03T09:00:00Z", "2025-09-08T14:00:00Z", "2025-09-10T09:00:00Z"],
+        )
+
+    def test_attaching_attendance_stores_the_occurrence(self):
+        pk = occurrence_id(self.series.id, datetime.date(2025, 9, 17))
+        self.assertEqual(self.client.get(f"/api/lectures/{pk}/").data["id"], str(pk))
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username="bob", password="pw"))
+        self.assertEqual(other.post(f"/api/lectures/{pk}/attendance/", {"attended": True}, format="json").status_code, 404)
+        self.assertFalse(Lecture.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/lectures/{pk}/attendance/", {"attended": True}, format="json")
+        self.assertEqual(response.status_code, 200)
+        lecture = Lecture.objects.get()
+        self.assertEqual((lecture.pk, lecture.series_id, lecture.start_dt), (pk, self.series.id, self.at(17)))
+
+        lectures = self.lectures()
+        self.assertEqual(len(lectures), 4)
+        self.assertEqual([row["attended"] for row in lectures], [False, False, True, False])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/attendances/bulk/",
+                {"lectures": [str(pk), str(occurrence_id(self.series.id, datetime.date(2025, 9, 24)))], "attended": True},
+                format="json",
+            )
+        self.assertEqual(len(response.data["attendances"]), 2)
+        self.assertEqual(response.data["missing"], [])
+        self.assertEqual(Lecture.objects.count(), 2)
+
+    def test_attendance_for_imported_occurrence(self):
+        #imported slots store no attendances, the client creates one with a JSON POST
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/schedule/import/", [{
+                "course": "Chemistry", "weekday": "Mon", "start_time": "09:00", "end_time": "10:00",
+                "from_date": "2025-09-01", "to_date": "2025-09-14", "location": "Lab",
+            }], format="json")
+        pk = next(row["id"] for row in self.lectures() if row["course_name"] == "Chemistry")
+        self.assertEqual(self.client.get("/api/attendances/", {"lecture_id": pk}).data, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/attendances/", {"lecture": pk}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["lecture"], uuid.UUID(pk))
+        self.assertEqual([row["id"] for row in self.client.get("/api/attendances/", {"lecture_id": pk}).data], [response.data["id"]])
+        self.assertEqual(Lecture.objects.get(pk=pk).location, "Lab")
+
+    def test_exdates_and_ownership(self):
+        url = f"/api/series/{self.series.id}/"
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(url, {"exdates": ["2025-09-17", "2025-09-10", "2025-09-17"]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["exdates"], ["2025-09-10", "2025-09-17"])
+        self.assertEqual(response.data["weekday"], "Wed")
+        self.assertEqual(len(self.lectures()), 2)
+
+        other = User.objects.create_user(username="bob", password="pw")
+        foreign = Course.objects.create(user=other, name="Theirs")
+        data = {
+            "course": str(foreign.id), "weekday": "Mon", "start_time": "09:00", "end_time": "10:00",
+            "from_date": "2025-09-01", "to_date": "2025-09-30", "location": "",
+        }
+        self.assertEqual(self.client.post("/api/series/", data, format="json").status_code, 400)
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.get(url).status_code, 404)
+
+    def test_dashboard_and_calendar_include_occurrences(self):
+        pk = occurrence_id(self.series.id, datetime.date(2025, 9, 3))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/lectures/{pk}/attendance/", {"attended": True}, format="json")
+
+        course = self.client.get("/api/dashboard/").data["courses"][0]
+        self.assertEqual(len(course["lectures"]), 4)
+        self.assertEqual(course["percentage"], 25)
+
+        response = APIClient().get(self.client.get("/api/calendar/").data["url"])
+        body = b"".join(response.streaming_content).decode("utf-8")
+        self.assertEqual(body.count("BEGIN:VEVENT"), 4)
+        self.assertEqual(body.count(f"UID:{pk}@sumori"), 1)
+
+    def test_dashboard_window(self):
+        #only the occurrences in the window are expanded, stats still count the whole series
+        course = self.client.get("/api/dashboard/", {"from": "2025-09-08", "to": "2025-09-20"}).data["courses"][0]
+        self.assertEqual([row["start_dt"][:10] for row in course["lectures"]], ["2025-09-10", "2025-09-17"])
+        self.assertEqual(course["stats"]["total"], 4)
+
+    def test_editing_times_moves_stored_occurrences(self):
+        #one occurrence before today and one after, both with an attendance attached
+        today = timezone.now().date()
+        series = LectureSeries.objects.create(
+            course=self.course, weekday=today.weekday(), start_time=datetime.time(0), end_time=datetime.time(0, 30),
+            from_date=today - datetime.timedelta(days=7), to_date=today + datetime.timedelta(days=7), location="Room 1",
+        )
+        past, upcoming = today - datetime.timedelta(days=7), today + datetime.timedelta(days=7)
+        with self.captureOnCommitCallbacks(execute=True):
+            for day in (past, upcoming):
+                self.client.post(f"/api/lectures/{occurrence_id(series.id, day)}/attendance/", {"attended": True}, format="json")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/series/{series.id}/", {"start_time": "14:00", "end_time": "15:30"}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        moved = Lecture.objects.get(pk=occurrence_id(series.id, upcoming))
+        self.assertEqual(
+            (moved.start_dt, moved.end_dt),
+            (
+                datetime.datetime.combine(upcoming, datetime.time(14), tzinfo=datetime.timezone.utc),
+                datetime.datetime.combine(upcoming, datetime.time(15, 30), tzinfo=datetime.timezone.utc),
+            ),
+        )
+        #the past lecture keeps its time, and neither day is listed twice
+        self.assertEqual(Lecture.objects.get(pk=occurrence_id(series.id, past)).start_dt.time(), datetime.time(0))
+        window = {"from": past.isoformat(), "to": upcoming.isoformat(), "course": str(self.course.id)}
+        days = [row["start_dt"][:10] for row in self.client.get("/api/lectures/", window).data]
+        self.assertEqual(sorted(days), [d.isoformat() for d in (past, today, upcoming)])
+        course = self.client.get("/api/dashboard/").data["courses"][0]
+        self.assertEqual(sum(row["start_dt"][:10] == past.isoformat() for row in course["lectures"]), 1)
+        self.assertEqual(course["stats"]["attended"], 2)
+
+    def test_next_occurrence_expires_the_version(self):
+        today = timezone.now().date()
+        tomorrow = today + datetime.timedelta(days=1)
+        LectureSeries.objects.create(
+            course=self.course, weekday=tomorrow.weekday(), start_time=datetime.time(9), end_time=datetime.time(10),
+            from_date=today, to_date=today + datetime.timedelta(days=30),
+        )
+        get_user_version(self.user.pk)
+        self.assertEqual(
+            UserDataVersion.objects.get(user=self.user).stale_at,
+            datetime.datetime.combine(tomorrow, datetime.time(9), tzinfo=datetime.timezone.utc),
+        )
+
+
+class AttendanceStatsTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make_semester(self.user, courses=1, lectures=4, attended_every=2)
+        self.course = Course.objects.get()
+        self.lectures = list(Lecture.objects.order_by("start_dt"))
+
+    def stats(self):
+        #through the dashboard, after commit callbacks ran
+        return self.client.get("/api/dashboard/").data["courses"][0]["stats"]
+
+    def row(self):
+        return AttendanceStats.objects.get(user=self.user, course=self.course)
+
+    def test_counts_match_lecture_statuses(self):
+        Attendance.objects.filter(lecture=self.lectures[1]).update(summary="notes")
+        #lectures without an attendance row
+        Attendance.objects.filter(lecture=self.lectures[3]).delete()
+        Lecture.objects.create(
+            course=self.course, start_dt=self.lectures[0].start_dt - datetime.timedelta(weeks=1),
+            end_dt=self.lectures[0].end_dt - datetime.timedelta(weeks=1),
+        )
+        today = timezone.now().date()
+        LectureSeries.objects.create(
+            course=self.course, weekday=today.weekday(), start_time=datetime.time(0), end_time=datetime.time(0, 30),
+            from_date=today - datetime.timedelta(days=20), to_date=today + datetime.timedelta(days=20),
+        )
+        lectures = self.client.get("/api/lectures/").data
+        statuses = [lecture["status"] for lecture in lectures]
+
+        stats = self.stats()
+        self.assertEqual(stats["total"], len(lectures))
+        self.assertEqual(stats["attended"], sum(1 for lecture in lectures if lecture["attended"]))
+        for status in ("summarized", "missed", "upcoming"):
+            self.assertEqual(stats[status], statuses.count(status), status)
+        self.assertEqual(stats["past"], sum(1 for lecture in lectures if lecture["start_dt"] <= timezone.now().isoformat()))
+
+    def test_writes_mark_rows_stale(self):
+        self.assertEqual(self.stats()["attended"], 2)
+        self.assertIsNotNone(self.row().stale_at)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/lectures/{self.lectures[1].id}/attendance/", {"attended": True}, format="json")
+        self.assertIsNone(self.row().stale_at)
+        self.assertEqual(self.stats()["attended"], 3)
+        self.assertEqual(self.row().attended, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lectures[0].delete()
+        self.assertEqual(self.stats()["total"], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            slot = {
+                "course": "Course 0", "weekday": "Mon", "start_time": "09:00", "end_time": "10:00",
+                "from_date": "2025-09-01", "to_date": "2025-09-30", "location": "Room 1",
+            }
+            response = self.client.post("/api/schedule/import/", [slot], format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stats()["total"], 8)
+
+    def test_rows_are_recomputed_once_a_lecture_starts(self):
+        self.stats()
+        AttendanceStats.objects.update(upcoming=5, stale_at=timezone.now() - datetime.timedelta(seconds=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.get().save()
+        self.assertEqual(self.stats()["upcoming"], 1)
+
+    def test_invalidated_row_is_not_overwritten(self):
+        self.stats()
+        version = self.row().version
+        with self.captureOnCommitCallbacks(execute=True):
+            Attendance.objects.filter(lecture=self.lectures[1]).get().delete()
+        #a recompute that read the row before the write
+        refresh_stats(self.user, [self.course.pk], {self.course.pk: version})
+        self.assertIsNone(self.row().stale_at)
+
+    def test_rebuild_and_verify_command(self):
+        self.stats()
+        out = io.StringIO()
+        call_command("attendance_stats", "--verify", stdout=out)
+        self.assertIn("checked 1 row(s), 0 mismatch(es)", out.getvalue())
+
+        AttendanceStats.objects.update(attended=7)
+        with self.assertRaises(CommandError):
+            call_command("attendance_stats", "--verify", stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command("attendance_stats", stdout=out)
+        self.assertIn("rebuilt stats for 1 course(s)", out.getvalue())
+        self.assertEqual(self.row().attended, 2)
+        call_command("attendance_stats", "--verify", stdout=io.StringIO())
+
+
+class AnalyticsTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        other = User.objects.create_user(username="bob", password="pw")
+
+        self.course = Course.objects.create(user=self.user, name="Biology")
+        self.other_course = Course.objects.create(user=self.user, name="Chemistry")
+        #Mondays and Wednesdays in September, None is no attendance row
+        for day, attended in [(1, True), (3, True), (8, False), (10, None), (15, True)]:
+            start = datetime.datetime(2025, 9, day, 9, tzinfo=datetime.timezone.utc)
+            lecture = Lecture.objects.create(course=self.course, start_dt=start, end_dt=start + datetime.timedelta(hours=1))
+            if attended is not None:
+                Attendance.objects.create(user=self.user, lecture=lecture, attended=attended)
+            Attendance.objects.create(user=other, lecture=lecture, attended=True)
+        start = datetime.datetime(2025, 10, 1, 9, tzinfo=datetime.timezone.utc)
+        lecture = Lecture.objects.create(course=self.other_course, start_dt=start, end_dt=start + datetime.timedelta(hours=1))
+        Attendance.objects.create(user=self.user, lecture=lecture, attended=True)
+        #Fridays 5, 12 and 19 September, never attended
+        LectureSeries.objects.create(
+            course=self.course, weekday=4, start_time=datetime.time(9), end_time=datetime.time(10),
+            from_date=datetime.date(2025, 9, 1), to_date=datetime.date(2025, 9, 20), location="Lab",
+        )
+        get_user_version(self.user.pk)
+
+    def test_weekly_trend_weekdays_and_streaks(self):
+        #version, trend, weekdays, streaks, the series and their stored lectures
+        with self.assertNumQueries(6):
+            response = self.client.get("/api/analytics/")
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual(data["period"], "week")
+        self.assertEqual(data["trend"], {
+            "start": ["2025-09-01", "2025-09-08", "2025-09-15", "2025-09-29"],
+            "total": [3, 3, 2, 1],
+            "attended": [2, 0, 1, 1],
+            "rate": [66.7, 0, 50.0, 100.0],
+            "cumulative_rate": [66.7, 33.3, 37.5, 44.4],
+        })
+        self.assertEqual(data["weekdays"]["weekday"], WEEKDAYS)
+        self.assertEqual(data["weekdays"]["total"], [3, 0, 3, 0, 3, 0, 0])
+        self.assertEqual(data["weekdays"]["attended"], [2, 0, 2, 0, 0, 0, 0])
+        self.assertEqual(data["streaks"], {"current": 1, "longest": 2})
+
+    def test_monthly_and_filters(self):
+        data = self.client.get("/api/analytics/", {"period": "month"}).data
+        self.assertEqual(data["trend"]["start"], ["2025-09-01", "2025-10-01"])
+        self.assertEqual(data["trend"]["total"], [8, 1])
+        self.assertEqual(data["trend"]["cumulative_rate"], [37.5, 44.4])
+
+        data = self.client.get("/api/analytics/", {"from": "2025-09-10", "to": "2025-09-30"}).data
+        self.assertEqual(data["trend"]["start"], ["2025-09-08", "2025-09-15"])
+        self.assertEqual(data["trend"]["total"], [2, 2])
+
+        data = self.client.get("/api/analytics/", {"course": str(self.other_course.id)}).data
+        self.assertEqual(data["trend"]["total"], [1])
+        self.assertEqual(data["streaks"], {"current": 1, "longest": 1})
+
+        self.assertEqual(self.client.get("/api/analytics/", {"period": "day"}).status_code, 400)
+        self.assertEqual(APIClient().get("/api/analytics/").status_code, 401)
+
+    def test_cached_per_version(self):
+        response = self.client.get("/api/analytics/")
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/api/analytics/").data, response.data)
+        self.assertEqual(self.client.get("/api/analytics/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        lecture = Lecture.objects.get(start_dt__day=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/lectures/{lecture.id}/attendance/", {"attended": True}, format="json")
+        self.assertEqual(self.client.get("/api/analytics/").data["trend"]["attended"][1], 1)
@@ -0,0 +1,119 @@
+import datetime
+import heapq
+from collections import Counter
+from operator import itemgetter
+
+from django.db.models import Count, F, FilteredRelation, Func, Q, Window
+from django.db.models.functions import ExtractWeekDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from core.models import Lecture
+from core.serializers import WEEKDAYS
+from core.utils.series import series_lectures
+
+UTC = datetime.timezone.utc
+
+PERIODS = {"week": TruncWeek, "month": TruncMonth}
+
+
+class RunningSum(Func):
+    #SUM(<aggregate>) OVER (...), Sum() refuses aggregates as its argument
+    function = "SUM"
+    window_compatible = True
+
+
+def _rate(attended, total):
+    return round(attended / total * 100, 1) if total else 0
+
+
+def _period_start(day, period):
+    #the date TruncWeek / TruncMonth put an occurrence under
+    if period == "month":
+        return day.replace(day=1)
+    return day - datetime.timedelta(days=day.weekday())
+
+
+def attendance_analytics(user, period="week", start=None, end=None, course_id=None, now=None):
+    """
+    The user's attendance over the lectures that have started, as columnar arrays:
+    {"period", "trend": {"start", "total", "attended", "rate", "cumulative_rate"},
+     "weekdays": {"weekday", "total", "attended", "rate"}, "streaks": {"current", "longest"}}.
+
+    Trends are grouped by TruncWeek/TruncMonth in the database, with the running totals behind
+    cumulative_rate as window functions over the groups, and the weekday pattern by ExtractWeekDay.
+    Lecture series occurrences nobody attached anything to count as missed and are added per group.
+    Only periods with lectures are listed. Times are bucketed in UTC like the imported slots.
+    """
+    now = now or timezone.now()
+    until = min(end, now) if end else now
+    lectures = Lecture.objects.filter(course__user=user, start_dt__lt=until).annotate(
+        mine=FilteredRelation("attendances", condition=Q(attendances__user=user))
+    )
+    if start:
+        lectures = lectures.filter(start_dt__gte=start)
+    if course_id:
+        lectures = lectures.filter(course_id=course_id)
+    attended = Count("id", filter=Q(mine__attended=True))
+    occurrences = series_lectures(user, start, until, course_id) if not start or start < until else []
+
+    bucket = F("bucket").asc()
+    groups = (
+        lectures.annotate(bucket=PERIODS[period]("start_dt", tzinfo=UTC))
+        .values("bucket")
+        .annotate(total=Count("id"), attended=attended)
+        #in a second annotate(), so the windows aren't added to the GROUP BY
+        .annotate(
+            running_total=Window(RunningSum(Count("id")), order_by=bucket),
+            running_attended=Window(RunningSum(attended), order_by=bucket),
+        )
+        .order_by("bucket")
+    )
+    stored = {row["bucket"].date(): row for row in groups}
+    expanded = Counter(_period_start(lecture.start_dt.date(), period) for lecture in occurrences)
+
+    trend = {"start": [], "total": [], "attended": [], "rate": [], "cumulative_rate": []}
+    running_total = running_attended = running_expanded = 0
+    for day in sorted(stored.keys() | expanded.keys()):
+        row = stored.get(day)
+        if row:
+            running_total, running_attended = row["running_total"], row["running_attended"]
+        running_expanded += expanded[day]
+        total = (row["total"] if row else 0) + expanded[day]
+        trend["start"].append(day.isoformat())
+        trend["total"].append(total)
+        trend["attended"].append(row["attended"] if row else 0)
+        trend["rate"].append(_rate(trend["attended"][-1], total))
+        trend["cumulative_rate"].append(_rate(running_attended, running_total + running_expanded))
+
+    #ExtractWeekDay counts from Sunday = 1, WEEKDAYS from Monday
+    weekdays = {"weekday": list(WEEKDAYS), "total": [0] * 7, "attended": [0] * 7}
+    for row in (
+        lectures.annotate(day=ExtractWeekDay("start_dt", tzinfo=UTC))
+        .values("day").annotate(total=Count("id"), attended=attended).order_by()
+    ):
+        weekdays["total"][(row["day"] + 5) % 7] += row["total"]
+        weekdays["attended"][(row["day"] + 5) % 7] += row["attended"]
+    for lecture in occurrences:
+        weekdays["total"][lecture.start_dt.weekday()] += 1
+    weekdays["rate"] = [_rate(a, t) for a, t in zip(weekdays["attended"], weekdays["total"])]
+
+    return {
+        "period": period,
+        "trend": trend,
+        "weekdays": weekdays,
+        "streaks": _streaks(lectures, occurrences),
+    }
+
+
+def _streaks(lectures, occurrences):
+    #runs of consecutive attended lectures, current being the run up to the latest lecture
+    marks = heapq.merge(
+        lectures.order_by("start_dt").values_list("start_dt", "mine__attended").iterator(),
+        ((lecture.start_dt, False) for lecture in occurrences),
+        key=itemgetter(0),
+    )
+    current = longest = 0
+    for _, attended in marks:
+        current = current + 1 if attended else 0
+        longest = max(longest, current)
+    return {"current": current, "longest": longest}
@@ -0,0 +1,67 @@
+import uuid
+
+from django.db import connection
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from core.models import Attendance, Course, Lecture
+from core.utils.events import ATTENDANCE_UPDATED, attendance_event_data, publish
+from core.utils.stats import mark_stale
+from core.utils.versioning import bump_user_version
+
+
+def _upsert_sql(rows):
+    qn = connection.ops.quote_name
+    attendance, lecture, course = Attendance._meta, Lecture._meta, Course._meta
+    columns = [field.column for field in attendance.concrete_fields]
+    values = ", ".join(["(%s, %s)"] * rows)
+    return (
+        f"INSERT INTO {qn(attendance.db_table)} (id, user_id, lecture_id, attended, created_at, updated_at) "
+        f"SELECT v.column1, %s, l.id, %s, %s, %s "
+        f"FROM (VALUES {values}) AS v "
+        f"JOIN {qn(lecture.db_table)} l ON l.id = v.column2 "
+        f"JOIN {qn(course.db_table)} c ON c.id = l.course_id "
+        f"WHERE c.user_id = %s "
+        f"ON CONFLICT (user_id, lecture_id) DO UPDATE "
+        f"SET attended = excluded.attended, updated_at = excluded.updated_at "
+        f"RETURNING {', '.join(qn(column) for column in columns)}"
+    )
+
+
+def set_attendance(user, lecture_ids, attended):
+    """
+    Marks the given lectures attended (or not) for `user` and returns the attendance rows.
+
+    A single INSERT ... SELECT ... ON CONFLICT DO UPDATE statement does the ownership check,
+    creates missing attendance rows and updates existing ones, so concurrent toggles can't
+    race each other. Lectures the user doesn't own are skipped. The returned rows come with
+    their lecture and course loaded in one more query, ready for AttendanceSerializer.
+    """
+    #the same key twice in one upsert is an error on postgres
+    lecture_ids = list(dict.fromkeys(lecture_ids))
+    if not lecture_ids:
+        return []
+
+    id_field = Attendance._meta.pk
+    lecture_field = Lecture._meta.pk
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    params = []
+    for lecture_id in lecture_ids:
+        params += [
+            id_field.get_db_prep_value(uuid.uuid4(), connection),
+            lecture_field.get_db_prep_value(lecture_id, connection),
+        ]
+    #in statement order: the SELECT list, the VALUES rows, the ownership filter
+    params = [user.pk, attended, now, now] + params + [user.pk]
+
+    rows = list(
+        Attendance.objects.raw(_upsert_sql(len(lecture_ids)), params)
+        .prefetch_related(Prefetch("lecture", queryset=Lecture.objects.select_related("course")))
+    )
+    if rows:
+        #raw sql sends no signals
+        bump_user_version(user.pk)
+        mark_stale(user=user, course__in={row.lecture.course_id for row in rows})
+        publish(user.pk, ATTENDANCE_UPDATED, attendances=[attendance_event_data(row) for row in rows])
+    return rows
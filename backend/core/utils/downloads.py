@@ -0,0 +1,136 @@
+import mimetypes
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from core.utils.streaming import streaming_response
+
+#bytes read from storage per chunk of a streamed download
+BLOCK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Returns the inclusive (start, end) byte range asked for by a Range header, or None
+    to send the whole file (no header, a unit other than bytes, or several ranges,
+    which the spec allows a server to ignore). Raises RangeNotSatisfiable for ranges
+    that start past the end of the file.
+    """
+    match = _RANGE_RE.match((header or "").replace(" ", ""))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        #suffix range: the last n bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def download_name(name):
+    #the name the note was uploaded with, without the storage key's prefixes
+    filename = posixpath.basename(name)
+    prefix, _, rest = filename.partition("-")
+    return rest if rest and len(prefix) == 32 else filename
+
+
+def _file_chunks(storage, name, start, length):
+    with storage.open(name, "rb") as file:
+        if start:
+            file.seek(start)
+        while length > 0:
+            block = file.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def _stream(request, storage, name, size, last_modified):
+    response_range = None
+    if_range = request.headers.get("If-Range")
+    #If-Range with an outdated date asks for the whole, current file
+    if not if_range or parse_http_date_safe(if_range) == last_modified:
+        try:
+            response_range = parse_range(request.headers.get("Range"), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    start, end = response_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    chunks = _file_chunks(storage, name, start, length) if request.method != "HEAD" else iter(())
+    response = streaming_response(request, chunks, status=206 if response_range else 200)
+    response["Content-Length"] = str(length)
+    if response_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
+
+
+def serve_note(request, field_file):
+    """
+    Response for downloading a stored note, picked by NOTE_DOWNLOAD_MODE:
+
+    "stream" reads the file from storage in BLOCK_SIZE chunks (with Range support),
+    "x-accel" / "x-sendfile" hand the file to nginx / Apache under
+    NOTE_DOWNLOAD_ACCEL_PREFIX / from its local path, and "s3-redirect" redirects
+    to a short lived presigned S3 url. Authorization happens before this is called.
+    """
+    storage, name = field_file.storage, field_file.name
+    mode = getattr(settings, "NOTE_DOWNLOAD_MODE", "stream")
+    filename = download_name(name)
+
+    if mode == "s3-redirect":
+        client = storage.connection.meta.client
+        url = client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": storage.bucket_name,
+                "Key": storage._normalize_name(name),
+                "ResponseContentDisposition": content_disposition_header(True, filename),
+            },
+            ExpiresIn=getattr(settings, "NOTE_DOWNLOAD_URL_EXPIRY", 300),
+        )
+        return HttpResponseRedirect(url)
+
+    #seconds precision, like the http dates it is compared with
+    last_modified = int(storage.get_modified_time(name).timestamp())
+    not_modified = get_conditional_response(request, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    if mode == "x-accel":
+        response = HttpResponse()
+        response["X-Accel-Redirect"] = getattr(settings, "NOTE_DOWNLOAD_ACCEL_PREFIX", "/protected-notes/") + quote(name)
+    elif mode == "x-sendfile":
+        response = HttpResponse()
+        response["X-Sendfile"] = storage.path(name)
+    else:
+        response = _stream(request, storage, name, storage.size(name), last_modified)
+        response["Accept-Ranges"] = "bytes"
+
+    response["Content-Type"] = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    return response
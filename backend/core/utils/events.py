@@ -0,0 +1,235 @@
+import asyncio
+import itertools
+import json
+import logging
+import select
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+#event types pushed to the clients
+ATTENDANCE_UPDATED = "attendance.updated"
+NOTE_UPLOADED = "note.uploaded"
+SUMMARY_READY = "summary.ready"
+TIMETABLE_IMPORTED = "timetable.imported"
+
+
+class Subscription:
+    """
+    One open event stream of a user, created by a broker's subscribe() on the consuming event loop.
+    """
+
+    def __init__(self, broker, user_id, queue_size):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+
+    def put(self, event):
+        #runs on self.loop; a client that falls queue_size events behind loses its oldest ones
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        #next event, or None if nothing arrived within timeout seconds
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class InMemoryBroker:
+    """
+    In-process pub/sub: publish fans an event out to every open subscription of that user
+    in this process.
+
+    publish may be called from any thread, subscriptions are read on an event loop.
+    """
+
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or getattr(settings, "EVENT_QUEUE_SIZE", 100)
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def publish(self, user_id, event):
+        self.deliver(user_id, dict(event, id=next(self._ids)))
+
+    def deliver(self, user_id, event):
+        #hands the event to this process's subscriptions of the user
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                #the loop has shut down, the subscription is closed along with it
+                pass
+
+    def subscribe(self, user_id):
+        #must be called from the event loop that reads the subscription
+        subscription = Subscription(self, user_id, self.queue_size)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def subscriber_count(self, user_id):
+        with self._lock:
+            return len(self._subscriptions.get(user_id, ()))
+
+
+class PostgresBroker(InMemoryBroker):
+    """
+    Pub/sub across processes and machines through Postgres LISTEN/NOTIFY.
+
+    publish sends a NOTIFY on the default database; each process runs one listener thread
+    (started by its first subscriber) that hands the notifications to its local subscribers.
+    Notifications are only delivered when the publishing transaction commits.
+
+    NOTIFY payloads are capped at 8000 bytes, so larger events (a bulk toggle lists up to
+    1000 attendances) are sent as numbered parts in one transaction, which postgres delivers
+    together and in order, and put back together by the listener.
+    """
+
+    channel = "core_events"
+
+    #payload bytes per part, leaving room for the part envelope under the 8000 byte cap
+    chunk_size = 7000
+
+    def __init__(self, queue_size=None):
+        super().__init__(queue_size)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+        self._parts = {}
+
+    def payloads(self, user_id, event):
+        #the NOTIFY payloads of one event, ascii only (json escapes the rest) so chars are bytes
+        payload = json.dumps({"user": user_id, "event": event}, cls=DjangoJSONEncoder)
+        if len(payload) <= self.chunk_size:
+            return [payload]
+        message = uuid.uuid4().hex
+        pieces = [payload[i:i + self.chunk_size] for i in range(0, len(payload), self.chunk_size)]
+        return [
+            json.dumps({"message": message, "part": n, "parts": len(pieces), "data": piece})
+            for n, piece in enumerate(pieces)
+        ]
+
+    def publish(self, user_id, event):
+        payloads = self.payloads(user_id, event)
+        with transaction.atomic(), connection.cursor() as cursor:
+            for payload in payloads:
+                cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, payload])
+
+    def receive(self, payload):
+        #delivers one NOTIFY payload, or holds a part until the rest of its event arrived
+        message = json.loads(payload)
+        if "message" in message:
+            parts = self._parts.setdefault(message["message"], [])
+            parts.append(message["data"])
+            if len(parts) < message["parts"]:
+                return
+            del self._parts[message["message"]]
+            message = json.loads("".join(parts))
+        self.deliver(message["user"], dict(message["event"], id=next(self._ids)))
+
+    def subscribe(self, user_id):
+        self._ensure_listener()
+        return super().subscribe(user_id)
+
+    def _ensure_listener(self):
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name="event-listener", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        import psycopg2
+
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**connection.get_connection_params())
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.receive(conn.notifies.pop(0).payload)
+            except Exception:
+                logger.exception("event listener lost its connection, reconnecting")
+                #parts of an event can't be completed on a new connection
+                self._parts.clear()
+                if conn is not None:
+                    conn.close()
+                time.sleep(5)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    #one broker per process, the class is picked by EVENT_BROKER_BACKEND
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            backend = getattr(settings, "EVENT_BROKER_BACKEND", "core.utils.events.InMemoryBroker")
+            _broker = import_string(backend)()
+        return _broker
+
+
+def publish(user_id, type, **data):
+    """
+    Pushes a change event to the user's open event streams once the current transaction
+    commits (right away outside of one). Delivery is best effort, a failing broker is logged
+    and never breaks the write that triggered it.
+    """
+    event = {"type": type, "data": data}
+
+    def send():
+        try:
+            get_broker().publish(user_id, event)
+        except Exception:
+            logger.exception("could not publish %s event", type)
+
+    transaction.on_commit(send)
+
+
+def attendance_event_data(attendance):
+    #what clients need to patch an attendance in place without refetching
+    return {"id": attendance.pk, "lecture": attendance.lecture_id, "attended": attendance.attended}
+
+
+def format_sse(event):
+    #one server-sent event frame
+    data = json.dumps(event["data"], cls=DjangoJSONEncoder)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
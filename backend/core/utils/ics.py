@@ -0,0 +1,159 @@
+import datetime
+import heapq
+from operator import itemgetter
+
+from django.conf import settings
+from django.db.models import BooleanField, ExpressionWrapper, FilteredRelation, Q
+from django.utils import timezone
+
+from core.models import Lecture, LectureSeries
+from core.utils.series import expand, stored_keys
+
+#events per chunk of the streamed feed
+EVENTS_PER_CHUNK = 100
+
+#rows fetched per database round trip
+ROWS_PER_FETCH = 500
+
+PRODID = "-//Sumori//Lectures//EN"
+
+_FIELDS = [
+    "id", "start_dt", "end_dt", "location", "updated_at",
+    "course__name", "course__color_hex", "course__updated_at",
+    "mine__attended", "mine__updated_at", "summarized",
+]
+
+
+def escape_text(value):
+    #TEXT values per RFC 5545 3.3.11
+    return (
+        value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "\\n")
+    )
+
+
+def format_dt(value):
+    return value.astimezone(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def fold(line):
+    #content lines are at most 75 octets, continuation lines start with a space
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        #never split a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        limit = 74
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def feed_rows(user_id, since=None, now=None):
+    """
+    The values the feed is built from, one row per lecture of the user with the course
+    and the user's attendance joined in, in start order. Occurrences of the user's lecture
+    series are merged in as rows of their own.
+
+    With `since`, only lectures whose lecture, course, series or attendance row was written after it,
+    or whose status flipped from upcoming to missed after it, are returned.
+    """
+    now = now or timezone.now()
+    rows = Lecture.objects.filter(course__user_id=user_id).annotate(
+        mine=FilteredRelation("attendances", condition=Q(attendances__user_id=user_id)),
+        summarized=ExpressionWrapper(Q(mine__summary__gt=""), output_field=BooleanField()),
+    )
+    if since is not None:
+        rows = rows.filter(
+            Q(updated_at__gt=since)
+            | Q(course__updated_at__gt=since)
+            | Q(mine__updated_at__gt=since)
+            | Q(start_dt__gt=since, start_dt__lte=now)
+        )
+    rows = rows.order_by("start_dt").values(*_FIELDS).iterator(chunk_size=ROWS_PER_FETCH)
+    return heapq.merge(rows, _series_rows(user_id, since, now), key=itemgetter("start_dt"))
+
+
+def _series_rows(user_id, since, now):
+    series = list(LectureSeries.objects.filter(course__user_id=user_id).select_related("course"))
+    if not series:
+        return []
+    rows = []
+    for lecture in expand(series, exclude=stored_keys(series)):
+        one = lecture.series
+        if since and max(one.updated_at, one.course.updated_at) <= since and not since < lecture.start_dt <= now:
+            continue
+        rows.append({
+            "id": lecture.pk, "start_dt": lecture.start_dt, "end_dt": lecture.end_dt,
+            "location": lecture.location, "updated_at": one.updated_at,
+            "course__name": one.course.name, "course__color_hex": one.course.color_hex,
+            "course__updated_at": one.course.updated_at,
+            "mine__attended": False, "mine__updated_at": None, "summarized": False,
+        })
+    return rows
+
+
+def lecture_status(row, now):
+    #same precedence as LectureSerializer.get_status
+    if row["summarized"]:
+        return "summarized"
+    if row["mine__attended"]:
+        return "attended"
+    if row["start_dt"] > now:
+        return "upcoming"
+    return "missed"
+
+
+def format_event(row, now):
+    modified = max(filter(None, [row["updated_at"], row["course__updated_at"], row["mine__updated_at"]]))
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{row['id']}@sumori",
+        f"DTSTAMP:{format_dt(modified)}",
+        f"LAST-MODIFIED:{format_dt(modified)}",
+        f"DTSTART:{format_dt(row['start_dt'])}",
+        f"DTEND:{format_dt(row['end_dt'])}",
+        f"SUMMARY:{escape_text(row['course__name'])}",
+        f"LOCATION:{escape_text(row['location'])}",
+        f"DESCRIPTION:Status: {lecture_status(row, now)}",
+        f"CATEGORIES:{escape_text(row['course__name'])}",
+        #RFC 7986 COLOR only takes css color names, the course color is a hex code
+        f"X-COURSE-COLOR:{row['course__color_hex']}",
+        "STATUS:CONFIRMED",
+        "END:VEVENT",
+    ]
+    return "".join(fold(line) for line in lines)
+
+
+def iter_calendar(rows, now=None):
+    """
+    Yields an iCalendar document for the given feed_rows() in chunks of EVENTS_PER_CHUNK events,
+    the stored rows being fetched ROWS_PER_FETCH at a time, so the feed is never built as one string.
+    """
+    now = now or timezone.now()
+    refresh = getattr(settings, "CALENDAR_FEED_REFRESH_MINUTES", 15)
+    yield "".join(fold(line) for line in [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        "X-WR-CALNAME:Lectures",
+        #how often well behaved clients should poll
+        f"REFRESH-INTERVAL;VALUE=DURATION:PT{refresh}M",
+        f"X-PUBLISHED-TTL:PT{refresh}M",
+    ])
+
+    events = []
+    for row in rows:
+        events.append(format_event(row, now))
+        if len(events) >= EVENTS_PER_CHUNK:
+            yield "".join(events)
+            events = []
+    events.append(fold("END:VCALENDAR"))
+    yield "".join(events)
@@ -0,0 +1,153 @@
+import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Attendance, SummaryJob
+from core.utils.summarization import extract_text_from_file
+from core.utils.summary_cache import cached_summarize_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = "core.utils.jobs.ThreadPoolJobBackend"
+
+STALE_ERROR = "Summarization timed out. Please try again."
+REPLACED_ERROR = "The note was replaced, summarize the new one."
+
+
+def fail_stale_jobs(jobs=None, now=None):
+    """
+    Marks the jobs (a SummaryJob queryset, all by default) that have been queued or running for
+    longer than SUMMARY_JOB_TIMEOUT as failed, e.g. ones lost with a restarted thread pool or a
+    crashed worker. Returns how many were failed.
+    """
+    jobs = SummaryJob.objects.all() if jobs is None else jobs
+    cutoff = (now or timezone.now()) - datetime.timedelta(seconds=getattr(settings, "SUMMARY_JOB_TIMEOUT", 600))
+    stale = Q(status=SummaryJob.QUEUED, created_at__lt=cutoff) | Q(status=SummaryJob.RUNNING, started_at__lt=cutoff)
+    return jobs.filter(stale).update(status=SummaryJob.FAILED, error=STALE_ERROR, updated_at=timezone.now())
+
+
+def run_summary_job(job_id):
+    """
+    Processes one queued SummaryJob: extracts the note text, summarizes it and
+    saves the result on the attendance row.
+
+    The queued -> running transition is a conditional update, so a job handed to
+    more than one worker only ever runs once. Returns True if this call ran the job.
+    The summary is dropped if the note was replaced meanwhile.
+    """
+    claimed = SummaryJob.objects.filter(pk=job_id, status=SummaryJob.QUEUED).update(
+        status=SummaryJob.RUNNING, started_at=timezone.now()
+    )
+    if not claimed:
+        return False
+
+    job = SummaryJob.objects.select_related("attendance").get(pk=job_id)
+    attendance = job.attendance
+
+    try:
+        if (attendance.note_upload.name or "") != job.note_name:
+            raise ValueError(REPLACED_ERROR)
+        if not attendance.summary:
+            if not attendance.note_upload:
+                raise ValueError("No note uploaded for this attendance.")
+            try:
+                note_text = extract_text_from_file(attendance.note_upload)
+            except Exception:
+                raise ValueError("Unable to read uploaded note. Please reupload.")
+
+            summary = cached_summarize_text(note_text)
+            with transaction.atomic():
+                #a note uploaded while summarizing must not get the old note's summary
+                attendance = Attendance.objects.select_for_update().get(pk=attendance.pk)
+                if (attendance.note_upload.name or "") != job.note_name:
+                    raise ValueError(REPLACED_ERROR)
+                attendance.summary = summary
+                attendance.save(update_fields=["summary", "updated_at"])
+    except ValueError as e:
+        logger.warning("summary job %s failed: %s", job_id, e)
+        job.status = SummaryJob.FAILED
+        job.error = str(e)
+    except Exception:
+        logger.exception("summary job %s failed", job_id)
+        job.status = SummaryJob.FAILED
+        job.error = "Summarization failed. Please try again."
+    else:
+        job.status = SummaryJob.DONE
+
+    job.save(update_fields=["status", "error", "updated_at"])
+    return True
+
+
+class BaseJobBackend:
+    """
+    Decides where a queued summary job runs. enqueue is called once the job row is committed.
+    """
+
+    def enqueue(self, job_id):
+        raise NotImplementedError
+
+
+class ImmediateJobBackend(BaseJobBackend):
+    """
+    Runs the job inline in the calling thread. Meant for tests and local debugging.
+    """
+
+    def enqueue(self, job_id):
+        run_summary_job(job_id)
+
+
+class ThreadPoolJobBackend(BaseJobBackend):
+    """
+    Runs jobs on a per-process thread pool (SUMMARY_JOB_WORKERS threads) so the
+    request worker returns right away.
+    """
+
+    _executor = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def executor(cls):
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "SUMMARY_JOB_WORKERS", 4),
+                    thread_name_prefix="summary-job",
+                )
+            return cls._executor
+
+    def enqueue(self, job_id):
+        self.executor().submit(self._run, job_id)
+
+    @staticmethod
+    def _run(job_id):
+        #worker threads get their own db connections, release them after each job
+        close_old_connections()
+        try:
+            run_summary_job(job_id)
+        except Exception:
+            logger.exception("summary job %s crashed", job_id)
+        finally:
+            close_old_connections()
+
+
+class DatabaseQueueJobBackend(BaseJobBackend):
+    """
+    Leaves the job in the SummaryJob table, which acts as the queue. Jobs are picked
+    up by `python manage.py run_summary_jobs` running as a separate worker process.
+    """
+
+    def enqueue(self, job_id):
+        pass
+
+
+def get_job_backend():
+    #SUMMARY_JOB_BACKEND is a dotted path to a BaseJobBackend subclass, so a broker
+    #(celery, rq, ...) can be plugged in with a small subclass that calls run_summary_job
+    return import_string(getattr(settings, "SUMMARY_JOB_BACKEND", DEFAULT_BACKEND))()
@@ -0,0 +1,369 @@
+import asyncio
+import email.utils
+import logging
+import os
+import threading
+import time
+
+import openai
+from django.conf import settings
+
+from core.middleware import profile_section
+
+logger = logging.getLogger(__name__)
+
+#errors worth retrying: rate limits, provider 5xx, timeouts and dropped connections
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised without calling the provider while the circuit breaker is open.
+    """
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills at `rate` tokens per second up to `capacity`.
+    acquire blocks until a token is available (or timeout runs out).
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _take(self):
+        #takes a token and returns 0, or returns how long until one is available
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def aacquire(self, timeout=None):
+        #acquire for the event loop, waits without blocking the thread
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds, then lets one trial call through (half open) which
+    closes the circuit again on success. A trial that ends without an answer either
+    way (cancelled) hands the slot to the next call.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("LLM provider unavailable, failing fast.")
+                self.state = self.HALF_OPEN
+            elif self.state == self.HALF_OPEN:
+                #a trial call is already in flight
+                raise CircuitOpenError("LLM provider unavailable, failing fast.")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        #the call let through was abandoned, back to open with the timeout already run out
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "failures": self._failures}
+
+
+class LLMMetrics:
+    """
+    Process-wide counters for LLM calls: requests, retries, errors, tokens and latency.
+    """
+
+    FIELDS = ("requests", "retries", "errors", "rejected", "prompt_tokens", "completion_tokens")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = dict.fromkeys(self.FIELDS, 0)
+            self.latency_total = 0.0
+            self.latency_max = 0.0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.counts[name] += value
+
+    def observe_latency(self, seconds):
+        with self._lock:
+            self.latency_total += seconds
+            self.latency_max = max(self.latency_max, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            calls = self.counts["requests"]
+            return dict(
+                self.counts,
+                latency_total=self.latency_total,
+                latency_max=self.latency_max,
+                latency_avg=self.latency_total / calls if calls else 0.0,
+            )
+
+
+class LLMClient:
+    """
+    Chat completion client shared by all threads of a process.
+
+    The underlying openai.OpenAI client (and its HTTP connection pool) is built on first use.
+    Every call waits for the rate limiter, is rejected right away while the circuit breaker
+    is open, and is retried with exponential backoff on RETRYABLE_ERRORS. A Retry-After sent
+    with a 429/503 is waited out instead when longer, or given up on if it's beyond the timeout.
+    """
+
+    def __init__(self, openai_client=None, timeout=30.0, max_retries=3, backoff=1.0,
+                 rate_limiter=None, breaker=None, metrics=None):
+        self._client = openai_client
+        self._client_lock = threading.Lock()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limiter = rate_limiter
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics or LLMMetrics()
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                #retries are handled here, so the sdk's own retry loop is disabled
+                self._client = openai.OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    timeout=self.timeout,
+                    max_retries=0,
+                )
+            return self._client
+
+    def _before_call(self):
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.metrics.add(rejected=1)
+            raise
+
+    @staticmethod
+    def _retry_after(error):
+        #seconds the provider asked to wait (Retry-After as seconds or an http date), None if it didn't
+        response = getattr(error, "response", None)
+        value = response.headers.get("retry-after") if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _retry_delay(self, error, attempt, started):
+        #books a retryable failure and returns the backoff before the next attempt,
+        #re-raises once the retries are used up
+        self.metrics.observe_latency(time.monotonic() - started)
+        self.metrics.add(requests=1, errors=1)
+        self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            raise error
+        delay = self.backoff * (2 ** attempt)
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            if retry_after > self.timeout:
+                #not worth holding the caller that long
+                raise error
+            delay = max(delay, retry_after)
+        logger.warning("LLM call failed (%s), retrying in %.1fs", type(error).__name__, delay)
+        self.metrics.add(retries=1)
+        return delay
+
+    def _failed(self, started):
+        #client side errors (bad request, auth) mean the provider did answer
+        self.metrics.observe_latency(time.monotonic() - started)
+        self.metrics.add(requests=1, errors=1)
+        self.breaker.record_success()
+
+    def _succeeded(self, response, started):
+        self.metrics.observe_latency(time.monotonic() - started)
+        self.breaker.record_success()
+        usage = getattr(response, "usage", None)
+        self.metrics.add(
+            requests=1,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        )
+        return response.choices[0].message.content
+
+    def chat(self, **kwargs):
+        #returns the message content of a chat.completions.create(**kwargs) call
+        attempt = 0
+        while True:
+            self._before_call()
+            started = time.monotonic()
+            try:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                started = time.monotonic()
+                with profile_section("llm"):
+                    response = self.client.chat.completions.create(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                time.sleep(self._retry_delay(e, attempt, started))
+                attempt += 1
+                continue
+            except Exception:
+                self._failed(started)
+                raise
+            except BaseException:
+                #interrupted before an answer, says nothing about the provider
+                self.breaker.release()
+                raise
+            return self._succeeded(response, started)
+
+
+class AsyncLLMClient(LLMClient):
+    """
+    LLMClient for the event loop: the same rate limiting, circuit breaking, retries and
+    metrics, on top of openai.AsyncOpenAI, so waiting on the provider holds no thread.
+    """
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                self._client = openai.AsyncOpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    timeout=self.timeout,
+                    max_retries=0,
+                )
+            return self._client
+
+    async def chat(self, **kwargs):
+        attempt = 0
+        while True:
+            self._before_call()
+            started = time.monotonic()
+            try:
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.aacquire()
+                started = time.monotonic()
+                with profile_section("llm"):
+                    response = await self.client.chat.completions.create(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                await asyncio.sleep(self._retry_delay(e, attempt, started))
+                attempt += 1
+                continue
+            except Exception:
+                self._failed(started)
+                raise
+            except BaseException:
+                #cancelled (client went away, timeout) before an answer, says nothing about the provider
+                self.breaker.release()
+                raise
+            return self._succeeded(response, started)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    #one client per process, configured from the LLM_* settings
+    global _client
+    with _client_lock:
+        if _client is None:
+            rate = getattr(settings, "LLM_RATE_LIMIT", None)
+            _client = LLMClient(
+                timeout=getattr(settings, "LLM_TIMEOUT", 30.0),
+                max_retries=getattr(settings, "LLM_MAX_RETRIES", 3),
+                backoff=getattr(settings, "LLM_RETRY_BACKOFF", 1.0),
+                rate_limiter=TokenBucket(rate, getattr(settings, "LLM_RATE_BURST", None)) if rate else None,
+                breaker=CircuitBreaker(
+                    failure_threshold=getattr(settings, "LLM_CIRCUIT_FAILURES", 5),
+                    reset_timeout=getattr(settings, "LLM_CIRCUIT_RESET", 30.0),
+                ),
+            )
+        return _client
+
+
+_async_client = None
+
+
+def get_async_llm_client():
+    #async counterpart of get_llm_client, sharing its rate limit, circuit breaker and metrics
+    global _async_client
+    shared = get_llm_client()
+    with _client_lock:
+        if _async_client is None:
+            _async_client = AsyncLLMClient(
+                timeout=shared.timeout,
+                max_retries=shared.max_retries,
+                backoff=shared.backoff,
+                rate_limiter=shared.rate_limiter,
+                breaker=shared.breaker,
+                metrics=shared.metrics,
+            )
+        return _async_client
@@ -0,0 +1,124 @@
+import hashlib
+import threading
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.decorators import method_decorator
+from rest_framework.response import Response
+
+from core.utils.versioning import request_user_version
+
+
+class ResponseCacheStats:
+    """
+    Per-process counters for the response cache. Counts only ever grow (until reset): the backend
+    evicts and expires entries without telling, so bytes_stored_total is what was written, not
+    what the cache currently holds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = self.stores = self.skipped = self.bytes_stored_total = 0
+
+    def record(self, hits=0, misses=0, stores=0, skipped=0, bytes_stored=0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.stores += stores
+            self.skipped += skipped
+            self.bytes_stored_total += bytes_stored
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "skipped": self.skipped,
+                "bytes_stored_total": self.bytes_stored_total,
+                "avg_entry_bytes": self.bytes_stored_total / self.stores if self.stores else 0.0,
+            }
+
+
+stats = ResponseCacheStats()
+
+
+def response_cache_key(request):
+    """
+    Key of a cached response: user, the user's data version and the full path with its query.
+
+    Model signals bump the data version on every write to the user's courses, lectures and
+    attendances, so a write makes all of that user's entries unreachable at once while other
+    users' entries stay valid. Orphaned entries age out through the backend's eviction.
+    """
+    digest = hashlib.sha256(request.get_full_path().encode("utf-8")).hexdigest()
+    return f"response:{request.user.pk}:{request_user_version(request)}:{digest}"
+
+
+def _store_after_render(response, cache, key):
+    #store once rendered, so the size check uses the bytes actually sent
+    def store(rendered):
+        size = len(rendered.content)
+        if size <= getattr(settings, "RESPONSE_CACHE_MAX_BYTES", 1024 * 1024):
+            cache.set(key, rendered.data)
+            stats.record(stores=1, bytes_stored=size)
+        else:
+            stats.record(skipped=1)
+
+    if response.status_code == 200:
+        response.add_post_render_callback(store)
+    return response
+
+
+def _cache_user_response(handler):
+    if iscoroutinefunction(handler):
+        return _async_cache_user_response(handler)
+
+    @wraps(handler)
+    def wrapper(request, *args, **kwargs):
+        if not getattr(settings, "RESPONSE_CACHE_ENABLED", True):
+            return handler(request, *args, **kwargs)
+
+        cache = caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "responses")]
+        key = response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            stats.record(hits=1)
+            return Response(data)
+
+        stats.record(misses=1)
+        return _store_after_render(handler(request, *args, **kwargs), cache, key)
+
+    return wrapper
+
+
+def _async_cache_user_response(handler):
+    @wraps(handler)
+    async def wrapper(request, *args, **kwargs):
+        if not getattr(settings, "RESPONSE_CACHE_ENABLED", True):
+            return await handler(request, *args, **kwargs)
+
+        cache = caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "responses")]
+        key = await sync_to_async(response_cache_key)(request)
+        data = await cache.aget(key)
+        if data is not None:
+            stats.record(hits=1)
+            return Response(data)
+
+        stats.record(misses=1)
+        return _store_after_render(await handler(request, *args, **kwargs), cache, key)
+
+    return wrapper
+
+
+#decorates a DRF handler (get, list), sync or async, to serve the serialized data of a user's GET from the
+#RESPONSE_CACHE_ALIAS cache without touching the database or serializers; apply below conditional_on_user_version so both share the version lookup
+cache_user_response = method_decorator(_cache_user_response)
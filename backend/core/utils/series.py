@@ -0,0 +1,251 @@
+import datetime
+import heapq
+import itertools
+import uuid
+
+from django.utils import timezone
+
+from core.models import Attendance, Lecture, LectureSeries
+from core.utils.versioning import bump_user_version
+
+
+def occurrence_id(series_id, day):
+    #the id an occurrence is listed under, and stored with once materialized: a uuid5 of the
+    #series and day with the day's ordinal in the last 4 bytes, so occurrence_day can read it back
+    digest = uuid.uuid5(series_id, day.isoformat()).bytes
+    return uuid.UUID(bytes=digest[:12] + day.toordinal().to_bytes(4, "big"))
+
+
+def occurrence_day(lecture_id):
+    #the day an occurrence id was made for, None if it can't be one (stored lectures get uuid4s)
+    if lecture_id.version != 5:
+        return None
+    try:
+        return datetime.date.fromordinal(int.from_bytes(lecture_id.bytes[12:], "big"))
+    except (ValueError, OverflowError):
+        return None
+
+
+def _dates(start, end):
+    #the date range of LectureSeries.days covering a [start, end) datetime window
+    from_date = start.astimezone(datetime.timezone.utc).date() if start else None
+    to_date = end.astimezone(datetime.timezone.utc).date() if end else None
+    return from_date, to_date
+
+
+def occurrence(series, day):
+    start_dt, end_dt = series.bounds(day)
+    return Lecture(
+        id=occurrence_id(series.id, day), course=series.course, series=series,
+        start_dt=start_dt, end_dt=end_dt, location=series.location,
+    )
+
+
+def _occurrences(series, start=None, end=None):
+    #the series' occurrences starting within [start, end), in order and expanded as they are read
+    from_date, to_date = _dates(start, end)
+    for day in series.days(from_date, to_date):
+        lecture = occurrence(series, day)
+        if (start and lecture.start_dt < start) or (end and lecture.start_dt >= end):
+            continue
+        yield lecture
+
+
+def user_series(user, start=None, end=None, course_id=None):
+    #the user's series with an occurrence that may fall within [start, end), courses loaded
+    from_date, to_date = _dates(start, end)
+    series = LectureSeries.objects.filter(course__user=user).select_related("course")
+    if from_date:
+        series = series.filter(to_date__gte=from_date)
+    if to_date:
+        series = series.filter(from_date__lte=to_date)
+    if course_id:
+        series = series.filter(course_id=course_id)
+    return list(series)
+
+
+def lecture_keys(rows):
+    """
+    The keys stored lectures replace occurrences by, from (course_id, start_dt, series_id) rows:
+    (course, start) for any lecture, and (series, day) for a stored occurrence, which keeps
+    replacing its occurrence when its times no longer match the series.
+    """
+    keys = set()
+    for course_id, start_dt, series_id in rows:
+        keys.add((course_id, start_dt))
+        if series_id:
+            keys.add((series_id, start_dt.astimezone(datetime.timezone.utc).date()))
+    return keys
+
+
+def stored_keys(series, start=None, end=None):
+    #lecture_keys of the stored lectures that could collide with the series' occurrences
+    lectures = Lecture.objects.filter(course__in={s.course_id for s in series})
+    if start:
+        lectures = lectures.filter(start_dt__gte=start)
+    if end:
+        lectures = lectures.filter(start_dt__lt=end)
+    return lecture_keys(lectures.values_list("course_id", "start_dt", "series_id"))
+
+
+def expand(series, start=None, end=None, exclude=()):
+    """
+    Unsaved Lectures for the occurrences of the given series starting within [start, end),
+    ordered by (start_dt, id). An occurrence is skipped when one of its keys is in `exclude`
+    (lecture_keys of the stored lectures) or it was already produced by an earlier series.
+    """
+    seen = set(exclude)
+    lectures = []
+    for one in series:
+        for lecture in _occurrences(one, start, end):
+            key = (one.course_id, lecture.start_dt)
+            if key not in seen and (one.id, lecture.start_dt.date()) not in seen:
+                seen.add(key)
+                lectures.append(lecture)
+    lectures.sort(key=lambda lecture: (lecture.start_dt, lecture.pk))
+    return lectures
+
+
+def with_user_attendance(lectures, user):
+    #occurrences nobody attached anything to read as not attended, like freshly imported lectures,
+    #in the user_attendances list LectureSerializer reads
+    for lecture in lectures:
+        lecture.user_attendances = [Attendance(user=user, lecture=lecture, attended=False)]
+    return lectures
+
+
+def series_lectures(user, start=None, end=None, course_id=None, stored=None):
+    """
+    Expanded occurrences of the user's series for a lecture listing of [start, end),
+    ready for LectureSerializer. `stored` are the listed Lecture rows if all of them are
+    at hand, otherwise the colliding ones are looked up.
+    """
+    series = user_series(user, start, end, course_id)
+    if not series:
+        return []
+    if stored is None:
+        exclude = stored_keys(series, start, end)
+    else:
+        exclude = lecture_keys((lecture.course_id, lecture.start_dt, lecture.series_id) for lecture in stored)
+    return with_user_attendance(expand(series, start, end, exclude), user)
+
+
+def series_page(user, start=None, end=None, course_id=None, after=None, limit=100):
+    """
+    The first `limit` occurrences after the (start_dt, id) position `after` within [start, end),
+    for a keyset page of the lecture list (see KeysetPagination). Occurrences are expanded lazily
+    from the position on and only the stored lectures up to the last one produced are looked up,
+    so a page costs the same however deep the client pages.
+    """
+    if after and (start is None or after[0] > start):
+        start = after[0]
+    series = user_series(user, start, end, course_id)
+    position = lambda lecture: (lecture.start_dt, lecture.pk)
+    candidates = heapq.merge(*(_occurrences(one, start, end) for one in series), key=position)
+    if after:
+        candidates = (lecture for lecture in candidates if position(lecture) > after)
+
+    seen = set()
+    lectures = []
+    while len(lectures) < limit:
+        batch = list(itertools.islice(candidates, limit - len(lectures)))
+        if not batch:
+            break
+        seen |= stored_keys(series, batch[0].start_dt, batch[-1].start_dt + datetime.timedelta(microseconds=1))
+        for lecture in batch:
+            key = (lecture.course_id, lecture.start_dt)
+            if key not in seen and (lecture.series_id, lecture.start_dt.date()) not in seen:
+                seen.add(key)
+                lectures.append(lecture)
+    return with_user_attendance(lectures, user)
+
+
+def add_series_lectures(courses, user, start=None, end=None):
+    """
+    Sets series_lectures on dashboard courses (see Course.objects.for_dashboard) to their expanded
+    occurrences within [start, end), one query for all courses. The courses' prefetched lectures
+    must cover the same window.
+    """
+    from_date, to_date = _dates(start, end)
+    series = LectureSeries.objects.filter(course__in=courses).select_related("course")
+    if from_date:
+        series = series.filter(to_date__gte=from_date)
+    if to_date:
+        series = series.filter(from_date__lte=to_date)
+    by_course = {}
+    for one in series:
+        by_course.setdefault(one.course_id, []).append(one)
+    for course in courses:
+        stored = lecture_keys((lecture.course_id, lecture.start_dt, lecture.series_id) for lecture in course.lectures.all())
+        expanded = expand(by_course.get(course.pk, []), start, end, exclude=stored)
+        course.series_lectures = with_user_attendance(expanded, user)
+    return courses
+
+
+def find_occurrences(user, lecture_ids):
+    #unsaved Lectures for those of lecture_ids that are occurrences of the user's series,
+    #only the series running on the days the ids were made for are looked at
+    wanted = {}
+    for lecture_id in lecture_ids:
+        try:
+            lecture_id = uuid.UUID(str(lecture_id))
+        except ValueError:
+            continue
+        day = occurrence_day(lecture_id)
+        if day is not None:
+            wanted[lecture_id] = day
+    found = []
+    if not wanted:
+        return found
+    series = LectureSeries.objects.filter(
+        course__user=user, from_date__lte=max(wanted.values()), to_date__gte=min(wanted.values())
+    ).select_related("course")
+    for one in series:
+        for lecture_id, day in wanted.items():
+            if occurrence_id(one.id, day) == lecture_id and day in one.days(day, day):
+                found.append(occurrence(one, day))
+    return found
+
+
+def retime_lectures(series, now=None):
+    """
+    Moves the stored upcoming occurrences of an edited series to its current times and location.
+    Lectures on days that are no longer part of the series (or that would collide with another
+    lecture) stay as they are, with whatever was attached to them.
+    """
+    now = now or timezone.now()
+    moved = []
+    lectures = list(series.lectures.filter(start_dt__gte=now))
+    if not lectures:
+        return moved
+    taken = set(
+        Lecture.objects.filter(course_id=series.course_id, start_dt__gte=now)
+        .exclude(series=series).values_list("start_dt", flat=True)
+    )
+    for lecture in lectures:
+        day = lecture.start_dt.astimezone(datetime.timezone.utc).date()
+        start_dt, end_dt = series.bounds(day)
+        if day not in series.days(day, day) or start_dt in taken:
+            continue
+        if (lecture.start_dt, lecture.end_dt, lecture.location) != (start_dt, end_dt, series.location):
+            lecture.start_dt, lecture.end_dt, lecture.location, lecture.updated_at = start_dt, end_dt, series.location, now
+            moved.append(lecture)
+    #updated_at is what the calendar feed's delta mode goes by
+    Lecture.objects.bulk_update(moved, ["start_dt", "end_dt", "location", "updated_at"])
+    return moved
+
+
+def materialize_lectures(user, lecture_ids):
+    """
+    Stores the occurrences among lecture_ids as Lecture rows under the id they were listed with,
+    so attendances and notes can point at them. Other ids are ignored, as are occurrences
+    already stored or taken by another lecture at the same course and start.
+    Returns the number of occurrences found.
+    """
+    lectures = find_occurrences(user, lecture_ids)
+    if lectures:
+        Lecture.objects.bulk_create(lectures, ignore_conflicts=True)
+        #bulk_create sends no signals
+        bump_user_version(user.pk)
+    return len(lectures)
+
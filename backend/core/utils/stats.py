@@ -0,0 +1,129 @@
+from django.db import transaction
+from django.db.models import Count, F, FilteredRelation, Min, Q
+from django.utils import timezone
+
+from core.models import AttendanceStats, Lecture, LectureSeries
+from core.utils.series import expand, stored_keys
+from core.utils.versioning import IDLE_RECHECK
+
+#the counted columns of AttendanceStats
+COUNTS = ["total", "past", "attended", "missed", "upcoming", "summarized"]
+
+
+def mark_stale(**filters):
+    """
+    Marks the AttendanceStats rows matching filters for a recompute on their next read, e.g.
+    mark_stale(course_id=...) after a lecture write.
+
+    Runs after commit like bump_user_version, so a recompute never reads data from before the write.
+    """
+    def mark():
+        AttendanceStats.objects.filter(**filters).update(stale_at=None, version=F("version") + 1)
+
+    transaction.on_commit(mark)
+
+
+def count_lectures(user, course_ids, now=None):
+    """
+    Fresh counts of the given courses for `user`: {course_id: {count: n, ..., "stale_at": ...}},
+    stale_at being the next lecture start. One grouped query over the stored lectures with the
+    user's attendance joined in, plus the lecture series occurrences, which have no attendance yet.
+    """
+    now = now or timezone.now()
+    counts = {course_id: dict.fromkeys(COUNTS, 0) | {"stale_at": None} for course_id in course_ids}
+    if not counts:
+        return counts
+
+    #lectures nothing was attached to yet are upcoming or missed by their start
+    unmarked = ~Q(mine__attended=True) & ~Q(mine__summary__gt="")
+    rows = (
+        Lecture.objects.filter(course__in=counts)
+        .annotate(mine=FilteredRelation("attendances", condition=Q(attendances__user=user)))
+        .values("course_id")
+        .annotate(
+            total=Count("id"),
+            past=Count("id", filter=Q(start_dt__lte=now)),
+            attended=Count("id", filter=Q(mine__attended=True)),
+            summarized=Count("id", filter=Q(mine__summary__gt="")),
+            missed=Count("id", filter=Q(start_dt__lte=now) & unmarked),
+            upcoming=Count("id", filter=Q(start_dt__gt=now) & unmarked),
+            stale_at=Min("start_dt", filter=Q(start_dt__gt=now)),
+        )
+        .order_by()
+    )
+    for row in rows:
+        counts[row.pop("course_id")].update(row)
+
+    series = list(LectureSeries.objects.filter(course__in=counts))
+    if series:
+        for lecture in expand(series, exclude=stored_keys(series)):
+            row = counts[lecture.course_id]
+            row["total"] += 1
+            if lecture.start_dt <= now:
+                row["past"] += 1
+                row["missed"] += 1
+            else:
+                row["upcoming"] += 1
+                row["stale_at"] = min(row["stale_at"] or lecture.start_dt, lecture.start_dt)
+
+    for row in counts.values():
+        #nothing shifts without a write, look again now and then like the data version does
+        row["stale_at"] = row["stale_at"] or now + IDLE_RECHECK
+    return counts
+
+
+def refresh_stats(user, course_ids, versions=None, now=None):
+    """
+    Recomputes and stores the AttendanceStats of the given courses, returns the fresh counts
+    (see count_lectures). versions maps course ids to the version of their row as read, rows that
+    don't exist yet are created first. A row invalidated in the meantime isn't overwritten,
+    it stays stale for the next read.
+    """
+    now = now or timezone.now()
+    versions = dict(versions or {})
+    missing = [course_id for course_id in course_ids if course_id not in versions]
+    if missing:
+        #created stale before counting, so a write committing meanwhile bumps their version
+        AttendanceStats.objects.bulk_create(
+            [AttendanceStats(user=user, course_id=course_id) for course_id in missing], ignore_conflicts=True
+        )
+        versions.update(dict.fromkeys(missing, 1))
+
+    counts = count_lectures(user, course_ids, now)
+    for course_id, row in counts.items():
+        AttendanceStats.objects.filter(user=user, course_id=course_id, version=versions[course_id]).update(
+            updated_at=now, **row
+        )
+    return counts
+
+
+def attach_stats(courses, user, now=None):
+    """
+    Sets attendance_stats on each of the user's courses, reading the stored rows and recomputing
+    only the stale or missing ones. Courses from Course.objects.for_dashboard carry their row
+    already, otherwise it's one query for all of them.
+    """
+    now = now or timezone.now()
+    if courses and not hasattr(courses[0], "stats_version"):
+        rows = {row.course_id: row for row in AttendanceStats.objects.filter(user=user, course__in=courses)}
+    else:
+        rows = {
+            course.pk: AttendanceStats(
+                user=user, course_id=course.pk, stale_at=course.stats_stale_at, version=course.stats_version,
+                **{name: getattr(course, f"stats_{name}") for name in COUNTS},
+            )
+            for course in courses if course.stats_version is not None
+        }
+
+    stale = [
+        course.pk for course in courses
+        if course.pk not in rows or rows[course.pk].stale_at is None or rows[course.pk].stale_at <= now
+    ]
+    if stale:
+        versions = {course_id: rows[course_id].version for course_id in stale if course_id in rows}
+        for course_id, row in refresh_stats(user, stale, versions, now).items():
+            rows[course_id] = AttendanceStats(user=user, course_id=course_id, **row)
+
+    for course in courses:
+        course.attendance_stats = rows[course.pk]
+    return courses
@@ -0,0 +1,32 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+_DONE = object()
+
+
+async def _aiter(iterator):
+    #pulls one chunk at a time off the event loop, so db cursors and file handles stay on their thread
+    iterator = iter(iterator)
+    try:
+        while True:
+            chunk = await sync_to_async(next)(iterator, _DONE)
+            if chunk is _DONE:
+                return
+            yield chunk
+    finally:
+        #the client may go away mid stream
+        if hasattr(iterator, "close"):
+            await sync_to_async(iterator.close)()
+
+
+def streaming_response(request, chunks, **kwargs):
+    """
+    StreamingHttpResponse over a sync iterator that stays streamed under ASGI too.
+
+    Django's ASGI handler reads a sync iterator into a list before sending anything, so for
+    requests that came in over ASGI the iterator is wrapped into an async one instead.
+    """
+    if isinstance(getattr(request, "_request", request), ASGIRequest):
+        chunks = _aiter(chunks)
+    return StreamingHttpResponse(chunks, **kwargs)
@@ -1,34 +1,227 @@
+import asyncio
+import codecs
 import os
-import openai
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
 from docx import Document
 from PyPDF2 import PdfReader
 
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-def summarize_text(text):
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
+from core.utils.llm import get_async_llm_client, get_llm_client
+
+#request parameters for summarize_text, also part of the summary cache key
+SUMMARY_PARAMS = {
+    "model": "gpt-3.5-turbo",
+    "system_prompt": "You are a helpful assistant that summarizes lecture notes in a digestible way.",
+    "user_prompt": "Summarize the following lecture:\n\n{text}",
+    "map_prompt": "Summarize part {part} of {parts} of the following lecture:\n\n{text}",
+    "reduce_prompt": "Combine these summaries of consecutive parts of one lecture into a single summary:\n\n{text}",
+    "max_tokens": 667,
+    "temperature": 0.5,
+}
+
+#rough token estimate for budgeting chunks, avoids pulling in a tokenizer
+CHARS_PER_TOKEN = 4
+
+def _chat_kwargs(prompt, text, **format_args):
+    return dict(
+        model=SUMMARY_PARAMS["model"],
         messages=[
-            {"role": "system", "content": "You are a helpful assistant that summarizes lecture notes in a digestible way."},
-            {"role": "user", "content": f"Summarize the following lecture:\n\n{text}"}
+            {"role": "system", "content": SUMMARY_PARAMS["system_prompt"]},
+            {"role": "user", "content": prompt.format(text=text, **format_args)}
         ],
-        max_tokens=667,
-        temperature=0.5,
+        max_tokens=SUMMARY_PARAMS["max_tokens"],
+        temperature=SUMMARY_PARAMS["temperature"],
     )
-    return response.choices[0].message.content
 
-def extract_text_from_file(file):
-    name = file.name
-    ext = os.path.splitext(name)[-1].lower()
 
+def _complete(prompt, text, client=None, **format_args):
+    #one chat completion through the shared LLM client (rate limited, retried, circuit broken)
+    client = client or get_llm_client()
+    return client.chat(**_chat_kwargs(prompt, text, **format_args))
+
+
+async def _acomplete(prompt, text, client=None, **format_args):
+    client = client or get_async_llm_client()
+    return await client.chat(**_chat_kwargs(prompt, text, **format_args))
+
+
+def summarize_text(text, client=None):
+    return _complete(SUMMARY_PARAMS["user_prompt"], text, client=client)
+
+
+async def asummarize_text(text, client=None):
+    return await _acomplete(SUMMARY_PARAMS["user_prompt"], text, client=client)
+
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def split_into_chunks(text, max_tokens):
+    """
+    Splits text into pieces of at most max_tokens (estimated), breaking on line
+    boundaries where possible and hard-splitting lines that are longer than a chunk.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current = []
+    size = 0
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                chunks.append("".join(current))
+                current, size = [], 0
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if size + len(line) > max_chars:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    if current:
+        chunks.append("".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def _reduce_groups(partials, chunk_tokens):
+    groups = split_into_chunks("\n\n".join(partials), chunk_tokens)
+    if len(groups) >= len(partials):
+        #grouping no longer shrinks anything, merge everything in one call
+        groups = ["\n\n".join(partials)]
+    return groups
+
+
+def summarize_long_text(text, client=None, chunk_tokens=None, max_workers=None):
+    """
+    Map-reduce summarization for notes that do not fit in one request.
+
+    Text within chunk_tokens goes through summarize_text as before. Longer text is split
+    into chunk_tokens sized chunks that are summarized concurrently on at most max_workers
+    threads, and the partial summaries are merged by a final reduce call (reduced again
+    in groups if the partials themselves exceed the budget). Defaults come from the
+    SUMMARY_CHUNK_TOKENS and SUMMARY_MAP_WORKERS settings, retries are handled by the
+    LLM client (see core.utils.llm).
+    """
+    chunk_tokens = chunk_tokens or getattr(settings, "SUMMARY_CHUNK_TOKENS", 3000)
+    max_workers = max_workers or getattr(settings, "SUMMARY_MAP_WORKERS", 4)
+
+    if estimate_tokens(text) <= chunk_tokens:
+        return summarize_text(text, client=client)
+
+    chunks = split_into_chunks(text, chunk_tokens)
+
+    def summarize_chunk(args):
+        part, chunk = args
+        return _complete(SUMMARY_PARAMS["map_prompt"], chunk, client=client, part=part, parts=len(chunks))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        partials = list(executor.map(summarize_chunk, enumerate(chunks, start=1)))
+
+    #merge partial summaries, in rounds if they do not fit into one reduce call
+    while True:
+        merged = [
+            _complete(SUMMARY_PARAMS["reduce_prompt"], group, client=client)
+            for group in _reduce_groups(partials, chunk_tokens)
+        ]
+        if len(merged) <= 1:
+            return merged[0] if merged else ""
+        partials = merged
+
+
+async def asummarize_long_text(text, client=None, chunk_tokens=None, max_workers=None):
+    """
+    summarize_long_text for the event loop: the chunk summaries run as concurrent
+    coroutines, at most max_workers in flight, instead of on a thread pool.
+    """
+    chunk_tokens = chunk_tokens or getattr(settings, "SUMMARY_CHUNK_TOKENS", 3000)
+    max_workers = max_workers or getattr(settings, "SUMMARY_MAP_WORKERS", 4)
+
+    if estimate_tokens(text) <= chunk_tokens:
+        return await asummarize_text(text, client=client)
+
+    chunks = split_into_chunks(text, chunk_tokens)
+    limit = asyncio.Semaphore(max_workers)
+
+    async def summarize_chunk(part, chunk):
+        async with limit:
+            return await _acomplete(SUMMARY_PARAMS["map_prompt"], chunk, client=client, part=part, parts=len(chunks))
+
+    partials = list(await asyncio.gather(
+        *(summarize_chunk(part, chunk) for part, chunk in enumerate(chunks, start=1))
+    ))
+
+    while True:
+        merged = [
+            await _acomplete(SUMMARY_PARAMS["reduce_prompt"], group, client=client)
+            for group in _reduce_groups(partials, chunk_tokens)
+        ]
+        if len(merged) <= 1:
+            return merged[0] if merged else ""
+        partials = merged
+
+
+#read size for plain text notes
+TEXT_BLOCK_SIZE = 64 * 1024
+
+
+def iter_text_chunks(file, max_bytes=None):
+    """
+    Yields the text of an uploaded note one chunk at a time (a block of a .txt file,
+    a paragraph of a .docx, a page of a .pdf) so large notes never have to be held
+    in memory as one string. "".join(chunks) gives the full text.
+
+    Reads straight from the storage file handle. If max_bytes is given, stops as soon
+    as that many utf-8 bytes have been produced, so remaining pages are never parsed.
+    """
+    ext = os.path.splitext(file.name)[-1].lower()
+    if ext not in (".txt", ".docx", ".pdf"):
+        raise ValueError('Unsupported file format.')
+
+    if hasattr(file, "open"):
+        file.open("rb")
+    try:
+        remaining = max_bytes
+        for chunk in _iter_raw_chunks(file, ext):
+            if remaining is not None:
+                encoded = chunk.encode("utf-8")
+                if len(encoded) >= remaining:
+                    #cut on the budget, dropping a partially cut character
+                    yield encoded[:remaining].decode("utf-8", errors="ignore")
+                    return
+                remaining -= len(encoded)
+            yield chunk
+    finally:
+        if hasattr(file, "open"):
+            file.close()
+
+
+def _iter_raw_chunks(file, ext):
     if ext == ".txt":
-        return file.read().decode("utf-8")
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        while True:
+            block = file.read(TEXT_BLOCK_SIZE)
+            if not block:
+                break
+            text = decoder.decode(block)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
     elif ext == ".docx":
         doc = Document(file)
-        dummy = "\n".join(p.text for p in doc.paragraphs)
-        print(dummy)
-        return dummy
+        for i, paragraph in enumerate(doc.paragraphs):
+            yield paragraph.text if i == 0 else "\n" + paragraph.text
     elif ext == ".pdf":
         reader = PdfReader(file)
-        return "\n".join(page.extract_text() for page in reader.pages)
-    else:
-        raise ValueError('Unsupported file format.')
+        for i, page in enumerate(reader.pages):
+            text = page.extract_text()
+            yield text if i == 0 else "\n" + text
+
+
+def extract_text_from_file(file, max_bytes=None):
+    #full note text, capped at NOTE_TEXT_MAX_BYTES unless a budget is given
+    if max_bytes is None:
+        max_bytes = getattr(settings, "NOTE_TEXT_MAX_BYTES", None)
+    return "".join(iter_text_chunks(file, max_bytes=max_bytes))
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from core.utils import summarization
+
+KEY_PREFIX = "summary:"
+
+
+def summary_cache_key(text, params=None):
+    """
+    Content hash of the note text plus the parameters the summary was generated with,
+    so changing the model or prompt never serves a stale summary.
+    """
+    if params is None:
+        #long notes are summarized in chunks, so the chunk size changes the result too
+        params = dict(summarization.SUMMARY_PARAMS, chunk_tokens=getattr(settings, "SUMMARY_CHUNK_TOKENS", 3000))
+    digest = hashlib.sha256()
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return KEY_PREFIX + digest.hexdigest()
+
+
+class SummaryCache:
+    """
+    Two level cache for generated summaries.
+
+    The first level is an in-process LRU bounded by max_entries with a per-entry TTL,
+    the optional second level is a Django cache alias shared between processes
+    (e.g. redis in production). Hits and misses are counted for both levels.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, alias=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.alias = alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        shared = self._shared()
+        value = shared.get(key) if shared is not None else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+        self._remember(key, value)
+        return value
+
+    def set(self, key, value):
+        self._remember(key, value)
+        shared = self._shared()
+        if shared is not None:
+            shared.set(key, value, timeout=self.ttl)
+
+    def _remember(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.shared_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache():
+    #one cache per process, configured from the SUMMARY_CACHE_* settings
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SummaryCache(
+                max_entries=getattr(settings, "SUMMARY_CACHE_MAX_ENTRIES", 1024),
+                ttl=getattr(settings, "SUMMARY_CACHE_TTL", None),
+                alias=getattr(settings, "SUMMARY_CACHE_ALIAS", None),
+            )
+        return _cache
+
+
+def cached_summarize_text(text):
+    """
+    summarize_long_text, but identical note text (re-uploads, notes shared between
+    classmates) is only ever sent to the LLM once.
+    """
+    cache = get_summary_cache()
+    key = summary_cache_key(text)
+
+    summary = cache.get(key)
+    if summary is None:
+        summary = summarization.summarize_long_text(text)
+        cache.set(key, summary)
+    return summary
+
+
+async def acached_summarize_text(text):
+    #cached_summarize_text for the event loop, the cache lookups run off the loop
+    cache = get_summary_cache()
+    key = summary_cache_key(text)
+
+    summary = await sync_to_async(cache.get)(key)
+    if summary is None:
+        summary = await summarization.asummarize_long_text(text)
+        await sync_to_async(cache.set)(key, summary)
+    return summary
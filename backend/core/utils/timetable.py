@@ -0,0 +1,194 @@
+import datetime
+import zoneinfo
+
+from django.db import transaction
+
+from core.models import Course, Lecture, LectureSeries, Attendance
+from core.serializers import WEEKDAYS
+from core.utils.events import TIMETABLE_IMPORTED, publish
+from core.utils.stats import mark_stale
+from core.utils.versioning import bump_user_version
+
+UTC = zoneinfo.ZoneInfo("UTC")
+
+#rows per INSERT statement for bulk_create
+BATCH_SIZE = 500
+
+
+class TimetableImport:
+    """
+    Base of the importers: the user's courses by name, created as needed, and the change
+    notification once the import is done. Subclasses take batches of rows in add(), which runs
+    a fixed number of queries per batch so imports of any size run in bounded memory.
+    Run inside a transaction and call finish() at the end.
+    """
+
+    def __init__(self, user, batch_size=BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        self.courses = {}
+        self.created = 0
+        self.touched = False
+
+    def ensure_courses(self, names):
+        names = {name for name in names if name not in self.courses}
+        if not names:
+            return
+        #first matching course per name, same as get_or_create would pick
+        for course in Course.objects.filter(user=self.user, name__in=names).order_by("name", "pk"):
+            self.courses.setdefault(course.name, course)
+
+        new_courses = [
+            Course(user=self.user, name=name, color_hex="#4F46E5")
+            for name in sorted(names) if name not in self.courses
+        ]
+        Course.objects.bulk_create(new_courses, batch_size=self.batch_size)
+        self.courses.update((course.name, course) for course in new_courses)
+
+    def add(self, rows):
+        raise NotImplementedError
+
+    def finish(self):
+        #bulk_create sends no signals
+        if self.touched:
+            bump_user_version(self.user.pk)
+            mark_stale(course__in=[course.pk for course in self.courses.values()])
+            publish(self.user.pk, TIMETABLE_IMPORTED, created=self.created)
+        return self.created
+
+
+class LectureImport(TimetableImport):
+    """
+    Imports (course name, start, end, location) occurrences as Lecture rows with the user's
+    attendance rows, for occurrences that aren't weekly slots (e.g. ics events).
+
+    The batch's existing lectures are loaded in one range query and everything missing is inserted
+    in bulk. An occurrence never overrides an earlier one (or an existing lecture) at the same start.
+    A lecture inserted concurrently makes its row conflict and be skipped, so the attendances
+    point at the lectures read back after the insert, not at the ones built here.
+    """
+
+    def add(self, occurrences):
+        occurrences = list(occurrences)
+        self.ensure_courses({name for name, _, _, _ in occurrences})
+
+        wanted = {}
+        for name, start_dt, end_dt, location in occurrences:
+            course = self.courses[name]
+            wanted.setdefault((course.pk, start_dt), (course, end_dt, location))
+        if not wanted:
+            return 0
+        self.touched = True
+
+        #one query for the lectures that already exist for these courses in the batch's range
+        existing = self.stored(wanted)
+
+        new_lectures = [
+            Lecture(course=course, start_dt=start_dt, end_dt=end_dt, location=location)
+            for (course_id, start_dt), (course, end_dt, location) in wanted.items()
+            if (course_id, start_dt) not in existing
+        ]
+        if new_lectures:
+            Lecture.objects.bulk_create(new_lectures, batch_size=self.batch_size, ignore_conflicts=True)
+            #rows that conflicted were skipped and keep the pk of the lecture already there
+            stored = self.stored(wanted)
+        else:
+            stored = existing
+
+        Attendance.objects.bulk_create(
+            [
+                Attendance(user=self.user, lecture_id=stored[key], attended=False)
+                for key in wanted if key in stored
+            ],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        created = sum(1 for lecture in new_lectures if stored.get((lecture.course_id, lecture.start_dt)) == lecture.pk)
+        self.created += created
+        return created
+
+    def stored(self, wanted):
+        #{(course_id, start_dt): pk} of the stored lectures in the batch's courses and range
+        return {
+            (course_id, start_dt): pk
+            for pk, course_id, start_dt in Lecture.objects.filter(
+                course__in={course for course, _, _ in wanted.values()},
+                start_dt__gte=min(start for _, start in wanted),
+                start_dt__lte=max(start for _, start in wanted),
+            ).values_list("pk", "course_id", "start_dt")
+        }
+
+
+def _series_signature(series):
+    return (
+        series.course_id, series.weekday, series.start_time, series.end_time,
+        series.from_date, series.to_date, series.location,
+    )
+
+
+class SeriesImport(TimetableImport):
+    """
+    Imports validated slots (see SlotSerializer) as one LectureSeries each instead of a Lecture
+    and an Attendance per week, so writes grow with the slots, not the weeks.
+
+    A slot identical to an existing series is skipped. created counts the occurrences that weren't
+    listed before: the batch's stored lectures and existing series in its date range are loaded
+    in two queries and the new series' occurrences are checked against them.
+    """
+
+    def add(self, slots):
+        slots = list(slots)
+        self.ensure_courses({slot["course"] for slot in slots})
+        if not slots:
+            return 0
+        self.touched = True
+
+        series = [
+            LectureSeries(
+                course=self.courses[slot["course"]], weekday=WEEKDAYS.index(slot["weekday"]),
+                start_time=slot["start_time"], end_time=slot["end_time"],
+                from_date=slot["from_date"], to_date=slot["to_date"], location=slot["location"],
+            )
+            for slot in slots
+        ]
+        course_ids = {one.course_id for one in series}
+        first = min(one.from_date for one in series)
+        last = max(one.to_date for one in series)
+
+        existing = list(LectureSeries.objects.filter(course__in=course_ids, from_date__lte=last, to_date__gte=first))
+        listed = set(
+            Lecture.objects.filter(
+                course__in=course_ids,
+                start_dt__gte=datetime.datetime.combine(first, datetime.time.min, tzinfo=UTC),
+                start_dt__lt=datetime.datetime.combine(last + datetime.timedelta(days=1), datetime.time.min, tzinfo=UTC),
+            ).values_list("course_id", "start_dt")
+        )
+        for one in existing:
+            listed.update((one.course_id, one.bounds(day)[0]) for day in one.days(first, last))
+
+        known = {_series_signature(one) for one in existing}
+        new_series = []
+        for one in series:
+            if _series_signature(one) in known:
+                continue
+            known.add(_series_signature(one))
+            occurrences = {(one.course_id, one.bounds(day)[0]) for day in one.days()}
+            self.created += len(occurrences - listed)
+            listed |= occurrences
+            new_series.append(one)
+        LectureSeries.objects.bulk_create(new_series, batch_size=self.batch_size)
+        return len(new_series)
+
+
+def import_slots(user, slots, batch_size=BATCH_SIZE):
+    """
+    Stores a list of validated slots (see SlotSerializer) as the user's lecture series
+    and returns the number of lectures that were added to the timetable.
+
+    Runs in one transaction with a fixed number of queries (see SeriesImport). The weekly
+    lectures are expanded when listed, and only stored once an attendance or note is attached.
+    """
+    with transaction.atomic():
+        importer = SeriesImport(user, batch_size=batch_size)
+        importer.add(slots)
+        return importer.finish()
@@ -0,0 +1,306 @@
+import csv
+import datetime
+import io
+import re
+import zoneinfo
+
+from dateutil import rrule
+from django.conf import settings
+from django.db import transaction
+
+from core.serializers import SlotSerializer, TimetableEventSerializer
+from core.utils.timetable import BATCH_SIZE, LectureImport, SeriesImport
+
+UTC = zoneinfo.ZoneInfo("UTC")
+
+#columns of a csv timetable, one slot (see SlotSerializer) per row
+CSV_COLUMNS = ["course", "weekday", "start_time", "end_time", "from_date", "to_date", "location"]
+
+_DURATION_RE = re.compile(r"^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+
+class TimetableFileError(Exception):
+    """
+    Raised when a timetable file can't be read at all (as opposed to single bad rows).
+    """
+
+
+class RowError(Exception):
+    pass
+
+
+def import_timetable_file(user, file, kind, batch_size=BATCH_SIZE):
+    """
+    Imports an uploaded ICS or CSV timetable into the user's lectures and returns a report:
+    {"created", "rows", "imported", "errors": [{"line", "errors"}, ...], "errors_truncated"}.
+
+    The file is read as a stream. CSV rows are validated slots that become lecture series
+    (SeriesImport), ICS events are expanded into lecture occurrences (LectureImport). Either goes
+    into the importer batch_size at a time, so memory stays bounded whatever the file size.
+    Bad rows are reported by line number and skipped, the rest is imported in one transaction.
+    """
+    max_errors = getattr(settings, "TIMETABLE_IMPORT_MAX_ERRORS", 500)
+    report = {"created": 0, "rows": 0, "imported": 0, "errors": [], "errors_truncated": False}
+    if kind == "csv":
+        rows, importer_class = iter_csv_slots(file), SeriesImport
+    else:
+        rows, importer_class = iter_ics_occurrences(file), LectureImport
+
+    try:
+        with transaction.atomic():
+            importer = importer_class(user, batch_size=batch_size)
+            pending = []
+            for line, items, errors in rows:
+                report["rows"] += 1
+                if errors:
+                    if len(report["errors"]) < max_errors:
+                        report["errors"].append({"line": line, "errors": errors})
+                    else:
+                        report["errors_truncated"] = True
+                    continue
+                report["imported"] += 1
+                pending += items
+                if len(pending) >= batch_size:
+                    importer.add(pending)
+                    pending = []
+            importer.add(pending)
+            report["created"] = importer.finish()
+    except UnicodeDecodeError:
+        raise TimetableFileError("The file is not UTF-8 encoded text.")
+    except csv.Error as e:
+        raise TimetableFileError(f"Unreadable csv: {e}")
+    return report
+
+
+def _text(file):
+    #utf-8-sig drops the byte order mark spreadsheet exports like to start with
+    return io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+
+
+def iter_csv_slots(file):
+    """
+    Yields (line, [slot], errors) per data row of a csv timetable with a CSV_COLUMNS header,
+    errors being the SlotSerializer errors of an invalid row.
+    """
+    reader = csv.DictReader(_text(file))
+    missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise TimetableFileError(f"Missing csv columns: {', '.join(missing)}.")
+
+    for row in reader:
+        slot = SlotSerializer(data={column: (row[column] or "").strip() for column in CSV_COLUMNS})
+        if slot.is_valid():
+            yield reader.line_num, [slot.validated_data], None
+        else:
+            yield reader.line_num, None, slot.errors
+
+
+def iter_ics_occurrences(file):
+    """
+    Yields (line, occurrences, errors) per VEVENT of an iCalendar file, line being where the
+    event starts. Recurring events (RRULE, RDATE, EXDATE) are expanded here, cancelled events
+    yield no occurrences. Events that are moved instances of a recurrence (RECURRENCE-ID)
+    are imported as lectures of their own.
+    """
+    horizon = datetime.timedelta(days=getattr(settings, "TIMETABLE_IMPORT_HORIZON_DAYS", 366))
+    max_occurrences = getattr(settings, "TIMETABLE_IMPORT_MAX_OCCURRENCES", 1000)
+    for line, event in iter_ics_events(_text(file)):
+        try:
+            yield line, event_occurrences(event, horizon, max_occurrences), None
+        except RowError as e:
+            yield line, None, [str(e)]
+
+
+def _unfold(lines):
+    #joins folded continuation lines, yields (line number, content line)
+    current, start = None, 0
+    for number, line in enumerate(lines, start=1):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield start, current
+        current, start = line, number
+    if current:
+        yield start, current
+
+
+def parse_content_line(line):
+    #"NAME;PARAM=value;...:value" -> (NAME, {PARAM: value}, value)
+    quoted = False
+    for i, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ":" and not quoted:
+            head, value = line[:i], line[i + 1:]
+            break
+    else:
+        raise RowError(f"Malformed line: {line[:40]}")
+    name, *raw_params = head.split(";")
+    params = {}
+    for param in raw_params:
+        key, _, param_value = param.partition("=")
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, value
+
+
+def iter_ics_events(lines):
+    """
+    Yields (line, properties) for every VEVENT, properties mapping each property name to a list
+    of (params, value). Only one event is held in memory at a time, nested components such as
+    VALARM are skipped.
+    """
+    event, start, depth = None, 0, 0
+    for number, line in _unfold(lines):
+        upper = line.upper()
+        if upper == "BEGIN:VEVENT":
+            event, start, depth = {}, number, 0
+        elif event is None:
+            continue
+        elif upper == "END:VEVENT":
+            yield start, event
+            event = None
+        elif upper.startswith("BEGIN:"):
+            depth += 1
+        elif upper.startswith("END:"):
+            depth -= 1
+        elif depth == 0:
+            try:
+                name, params, value = parse_content_line(line)
+            except RowError as e:
+                event.setdefault("_errors", []).append(str(e))
+                continue
+            event.setdefault(name, []).append((params, value))
+
+
+def unescape_text(value):
+    return re.sub(r"\\([\\;,nN])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+def parse_ics_datetime(value, params):
+    """
+    Parses a DATE-TIME value: UTC ("Z"), with a TZID parameter, or floating (taken as UTC,
+    like imported slots). Returns a date for DATE values.
+    """
+    value = value.strip()
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        try:
+            return datetime.datetime.strptime(value, "%Y%m%d").date()
+        except ValueError:
+            raise RowError(f"Invalid date: {value}")
+    try:
+        parsed = datetime.datetime.strptime(value.rstrip("Zz"), "%Y%m%dT%H%M%S")
+    except ValueError:
+        raise RowError(f"Invalid date-time: {value}")
+    if value[-1:] in "Zz":
+        return parsed.replace(tzinfo=UTC)
+    tzid = params.get("TZID")
+    if tzid:
+        try:
+            return parsed.replace(tzinfo=zoneinfo.ZoneInfo(tzid.lstrip("/")))
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise RowError(f"Unknown time zone: {tzid}")
+    return parsed.replace(tzinfo=UTC)
+
+
+def parse_duration(value):
+    match = _DURATION_RE.match(value.strip())
+    if not match or not any(match.groups()[1:]):
+        raise RowError(f"Invalid duration: {value}")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = datetime.timedelta(
+        weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+        minutes=int(minutes or 0), seconds=int(seconds or 0),
+    )
+    return -duration if sign == "-" else duration
+
+
+def _first(event, name):
+    values = event.get(name)
+    return values[0] if values else (None, None)
+
+
+def _date_list(event, name, start):
+    #all values of a (possibly repeated, comma separated) EXDATE / RDATE property as datetimes
+    dates = []
+    for params, value in event.get(name, []):
+        for item in value.split(","):
+            parsed = parse_ics_datetime(item, params)
+            if not isinstance(parsed, datetime.datetime):
+                #a DATE exception drops the occurrence starting that day
+                parsed = datetime.datetime.combine(parsed, start.timetz())
+            dates.append(parsed)
+    return dates
+
+
+def event_occurrences(event, horizon, max_occurrences):
+    """
+    (course name, start, end, location) of every lecture an event stands for: SUMMARY is the
+    course, recurrences are expanded up to max_occurrences, open ended ones up to `horizon`
+    after DTSTART. Raises RowError for events that can't be imported.
+    """
+    if event.get("_errors"):
+        raise RowError(event["_errors"][0])
+    if (_first(event, "STATUS")[1] or "").strip().upper() == "CANCELLED":
+        return []
+
+    params, value = _first(event, "DTSTART")
+    if value is None:
+        raise RowError("Missing DTSTART.")
+    start = parse_ics_datetime(value, params)
+    if not isinstance(start, datetime.datetime):
+        raise RowError("All-day events can't be imported as lectures.")
+
+    params, value = _first(event, "DTEND")
+    if value is not None:
+        end = parse_ics_datetime(value, params)
+        if not isinstance(end, datetime.datetime):
+            raise RowError("All-day events can't be imported as lectures.")
+        length = end - start
+    elif _first(event, "DURATION")[1] is not None:
+        length = parse_duration(_first(event, "DURATION")[1])
+    else:
+        raise RowError("Missing DTEND or DURATION.")
+
+    fields = TimetableEventSerializer(data={
+        "course": unescape_text(_first(event, "SUMMARY")[1] or "").strip(),
+        "location": unescape_text(_first(event, "LOCATION")[1] or "").strip(),
+        "start_dt": start,
+        "end_dt": start + length,
+    })
+    if not fields.is_valid():
+        raise RowError("; ".join(f"{name}: {' '.join(map(str, errors))}" for name, errors in fields.errors.items()))
+    course, location = fields.validated_data["course"], fields.validated_data["location"]
+
+    starts = _expand(event, start, horizon, max_occurrences)
+    return [(course, occurrence, occurrence + length, location) for occurrence in starts]
+
+
+def _expand(event, start, horizon, max_occurrences):
+    rules = [value for _, value in event.get("RRULE", [])]
+    rdates = _date_list(event, "RDATE", start)
+    if not rules and not rdates:
+        return [start]
+
+    rules_set = rrule.rruleset()
+    try:
+        for rule in rules:
+            rules_set.rrule(rrule.rrulestr(rule, dtstart=start))
+    except (ValueError, TypeError) as e:
+        raise RowError(f"Invalid RRULE: {e}")
+    rules_set.rdate(start)
+    for rdate in rdates:
+        rules_set.rdate(rdate)
+    for exdate in _date_list(event, "EXDATE", start):
+        rules_set.exdate(exdate)
+
+    until = start + horizon
+    starts = []
+    for occurrence in rules_set:
+        if occurrence > until:
+            break
+        if len(starts) == max_occurrences:
+            raise RowError(f"The recurrence has more than {max_occurrences} occurrences.")
+        starts.append(occurrence)
+    return starts
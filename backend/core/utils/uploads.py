@@ -0,0 +1,184 @@
+import os
+import posixpath
+import threading
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from django.utils.text import get_valid_filename
+
+from core.models import Attendance
+
+#note formats extract_text_from_file can read, with the content type the upload must be sent as
+NOTE_CONTENT_TYPES = {
+    ".txt": "text/plain",
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+SIGNING_SALT = "core.note-upload"
+
+
+class UploadRejected(Exception):
+    """
+    Raised when an upload ticket is invalid or the stored object doesn't match it.
+    """
+
+
+def note_content_type(filename):
+    #content type a note with this name must be uploaded as, None for unsupported formats
+    return NOTE_CONTENT_TYPES.get(os.path.splitext(filename)[-1].lower())
+
+
+class DirectUpload:
+    """
+    Presigned note uploads: the client PUTs the file straight to storage instead of through the API.
+
+    issue() hands out a signed ticket for one object key plus where and how to PUT the file,
+    confirm() checks the ticket and the stored object's size and type, then attaches the key
+    to the attendance. Subclasses provide the upload target and the object metadata.
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage or Attendance._meta.get_field("note_upload").storage
+
+    @property
+    def expiry(self):
+        return getattr(settings, "NOTE_UPLOAD_URL_EXPIRY", 900)
+
+    @property
+    def max_bytes(self):
+        return getattr(settings, "NOTE_UPLOAD_MAX_BYTES", 20 * 1024 * 1024)
+
+    def issue(self, request, attendance, filename, size):
+        content_type = note_content_type(filename)
+        if content_type is None:
+            raise UploadRejected("Unsupported file format.")
+        if not 0 < size <= self.max_bytes:
+            raise UploadRejected(f"Notes must be between 1 byte and {self.max_bytes} bytes.")
+
+        #a fresh key per upload, so an unconfirmed upload never replaces the current note
+        key = posixpath.join("uploads", str(attendance.pk), f"{uuid.uuid4().hex}-{get_valid_filename(filename)}")
+        ticket = {"attendance": str(attendance.pk), "key": key, "content_type": content_type, "size": size}
+        upload_id = signing.dumps(ticket, salt=SIGNING_SALT)
+        return {
+            "upload_id": upload_id,
+            "method": "PUT",
+            "url": self.upload_url(request, upload_id, ticket),
+            "headers": {"Content-Type": content_type},
+            "expires_in": self.expiry,
+        }
+
+    def read_ticket(self, upload_id, max_age=None):
+        try:
+            return signing.loads(upload_id, salt=SIGNING_SALT, max_age=max_age or self.expiry)
+        except signing.BadSignature:
+            raise UploadRejected("Invalid or expired upload.")
+
+    def confirm(self, attendance, upload_id):
+        """
+        Attaches the uploaded object to the attendance once its stored size and content type
+        match the ticket, clearing the summary of the previous note. A mismatching object is deleted.
+        """
+        #confirming may come a little after the upload url expired
+        ticket = self.read_ticket(upload_id, max_age=self.expiry * 2)
+        if ticket["attendance"] != str(attendance.pk):
+            raise UploadRejected("Invalid or expired upload.")
+
+        key = ticket["key"]
+        metadata = self.metadata(key)
+        if metadata is None:
+            raise UploadRejected("Nothing was uploaded.")
+        size, content_type = metadata
+        if size != ticket["size"] or size > self.max_bytes or content_type != ticket["content_type"]:
+            self.storage.delete(key)
+            raise UploadRejected("The uploaded file does not match the upload request.")
+
+        attendance.note_upload.name = key
+        attendance.summary = None
+        attendance.save(update_fields=["note_upload", "summary", "updated_at"])
+        return attendance
+
+    def upload_url(self, request, upload_id, ticket):
+        raise NotImplementedError
+
+    def metadata(self, key):
+        #(size, content type) of the stored object, None if it doesn't exist
+        raise NotImplementedError
+
+
+class S3DirectUpload(DirectUpload):
+    """
+    Presigned S3 PUT urls. The declared content type and length are signed into the url,
+    and confirm() checks the object's metadata again with a HEAD request.
+    """
+
+    def _client(self):
+        return self.storage.connection.meta.client
+
+    def _object_key(self, key):
+        return self.storage._normalize_name(key)
+
+    def upload_url(self, request, upload_id, ticket):
+        return self._client().generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.storage.bucket_name,
+                "Key": self._object_key(ticket["key"]),
+                "ContentType": ticket["content_type"],
+                "ContentLength": ticket["size"],
+            },
+            ExpiresIn=self.expiry,
+        )
+
+    def metadata(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self._client().head_object(Bucket=self.storage.bucket_name, Key=self._object_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return head["ContentLength"], head["ContentType"]
+
+
+class LocalDirectUpload(DirectUpload):
+    """
+    The same flow on local file storage (development and tests): the upload url is
+    LocalUploadTarget, which checks the ticket the way S3 checks a presigned url.
+    """
+
+    def upload_url(self, request, upload_id, ticket):
+        return request.build_absolute_uri(reverse("note-upload-target", args=[upload_id]))
+
+    def receive(self, upload_id, content_type, content_length, stream):
+        #stores a PUT body for a ticket, the target side of upload_url
+        ticket = self.read_ticket(upload_id)
+        if content_type != ticket["content_type"] or content_length != ticket["size"]:
+            raise UploadRejected("Content-Type and Content-Length must match the upload request.")
+        if self.storage.exists(ticket["key"]):
+            raise UploadRejected("Already uploaded.")
+        self.storage.save(ticket["key"], File(stream, name=ticket["key"]))
+
+    def metadata(self, key):
+        if not self.storage.exists(key):
+            return None
+        #file storage keeps no content type, the extension decides what the bytes were accepted as
+        return self.storage.size(key), note_content_type(key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_upload_backend():
+    #one backend per process, picked by NOTE_UPLOAD_BACKEND
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(settings.NOTE_UPLOAD_BACKEND)()
+        return _backend
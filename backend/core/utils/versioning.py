@@ -0,0 +1,111 @@
+import datetime
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from core.models import Lecture, LectureSeries, UserDataVersion
+
+#how long to trust a version when the user has no upcoming lectures
+IDLE_RECHECK = datetime.timedelta(days=1)
+
+
+def _next_status_change(user_id, now):
+    next_start = (
+        Lecture.objects.filter(course__user_id=user_id, start_dt__gt=now)
+        .order_by("start_dt")
+        .values_list("start_dt", flat=True)
+        .first()
+    )
+    #occurrences of lecture series flip status too
+    today = now.astimezone(datetime.timezone.utc).date()
+    for series in LectureSeries.objects.filter(course__user_id=user_id, to_date__gte=today):
+        for day in series.days(today):
+            start_dt, _ = series.bounds(day)
+            if start_dt > now:
+                next_start = min(next_start or start_dt, start_dt)
+                break
+    return next_start or now + IDLE_RECHECK
+
+
+def get_user_version(user_id):
+    """
+    Returns the current data version of a user, one query in the common case.
+
+    Once the stored stale_at (next lecture start) has passed, lecture statuses have changed,
+    so the version is bumped and stale_at moves on to the following lecture.
+    """
+    return get_user_version_state(user_id)[0]
+
+
+def get_user_version_state(user_id):
+    #(version, changed_at) of a user, changed_at being when that version was reached
+    now = timezone.now()
+    row = UserDataVersion.objects.filter(user_id=user_id).first()
+    if row is None:
+        row, _ = UserDataVersion.objects.get_or_create(
+            user_id=user_id, defaults={"stale_at": _next_status_change(user_id, now)}
+        )
+        return row.version, row.changed_at
+
+    if row.stale_at is not None and row.stale_at > now:
+        return row.version, row.changed_at
+
+    #stale_at is None right after a write (already bumped), otherwise time has moved past it
+    bump = 0 if row.stale_at is None else 1
+    changed_at = now if bump else row.changed_at
+    updated = UserDataVersion.objects.filter(user_id=user_id, version=row.version, stale_at=row.stale_at).update(
+        version=F("version") + bump, stale_at=_next_status_change(user_id, now), changed_at=changed_at
+    )
+    if not updated:
+        #another request refreshed it first
+        return UserDataVersion.objects.values_list("version", "changed_at").get(user_id=user_id)
+    return row.version + bump, changed_at
+
+
+def bump_user_version(user_id):
+    #runs after commit, so a request never pairs a new version with data from before the write
+    def bump():
+        UserDataVersion.objects.filter(user_id=user_id).update(
+            version=F("version") + 1, stale_at=None, changed_at=timezone.now()
+        )
+
+    transaction.on_commit(bump)
+
+
+def request_user_version(request):
+    #data version of the requesting user, looked up once per request
+    if not hasattr(request, "_user_data_version"):
+        request._user_data_version = get_user_version(request.user.pk)
+    return request._user_data_version
+
+
+def user_data_etag(request, *args, **kwargs):
+    #strong etag for anything serialized from the requesting user's courses, lectures and attendances
+    if not request.user.is_authenticated:
+        return None
+    return f"{request.user.pk}-{request_user_version(request)}"
+
+
+def _conditional_on_user_version(handler):
+    conditional = condition(etag_func=user_data_etag)(handler)
+    if not iscoroutinefunction(handler):
+        return conditional
+
+    @wraps(handler)
+    async def wrapper(request, *args, **kwargs):
+        #look the version up off the event loop, condition() then finds it memoized on the request
+        if request.user.is_authenticated:
+            await sync_to_async(request_user_version)(request)
+        return await conditional(request, *args, **kwargs)
+
+    return wrapper
+
+
+#decorates a DRF handler (get, list, retrieve), sync or async, to send the ETag and answer
+#If-None-Match with 304 without running the handler; the request is authenticated by the time it runs
+conditional_on_user_version = method_decorator(_conditional_on_user_version)
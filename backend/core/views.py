@@ -1,4 +1,9 @@
 from django.shortcuts import render
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.urls import reverse
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
 
 
@@ -7,16 +12,42 @@ from rest_framework import generics, viewsets, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
 
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 import datetime
-import zoneinfo
-
-from .models import Course, Lecture, Attendance
-from .serializers import CourseSerializer, LectureSerializer, SlotSerializer, AttendanceSerializer, CourseDashboardSerializer, RegistrationSerializer, WEEKDAYS
-
-from core.utils.summarization import summarize_text, extract_text_from_file
+import json
+import secrets
+
+from django.db import transaction
+
+from .models import Course, Lecture, LectureSeries, Attendance, SummaryJob, CalendarToken
+from .serializers import CourseSerializer, LectureSerializer, SlotSerializer, AttendanceSerializer, CourseDashboardSerializer, RegistrationSerializer, SummaryJobSerializer, LectureFilterSerializer, BulkAttendanceSerializer, NoteUploadSerializer, NoteUploadConfirmSerializer, CalendarFeedSerializer, TimetableFileSerializer, LectureSeriesSerializer, AnalyticsFilterSerializer
+from .pagination import LecturePagination, AttendancePagination
+
+from core.utils.summarization import extract_text_from_file
+from core.utils.summary_cache import cached_summarize_text, get_summary_cache
+from core.utils.timetable import import_slots
+from core.utils.series import add_series_lectures, find_occurrences, materialize_lectures, retime_lectures, series_lectures, series_page, with_user_attendance
+from core.utils.stats import attach_stats
+from core.utils.analytics import attendance_analytics
+from core.utils.timetable_files import TimetableFileError, import_timetable_file
+from core.utils.attendance import set_attendance
+from core.utils.uploads import LocalDirectUpload, UploadRejected, get_upload_backend
+from core.utils.downloads import serve_note
+from core.utils.ics import feed_rows, iter_calendar
+from core.utils.streaming import streaming_response
+from core.utils.jobs import fail_stale_jobs, get_job_backend
+from core.utils.llm import get_llm_client
+from core.utils.versioning import conditional_on_user_version, get_user_version, get_user_version_state
+from core.utils.events import NOTE_UPLOADED, format_sse, get_broker, publish
+from core.utils.response_cache import cache_user_response, stats as response_cache_stats
 
 class CourseViewSet(viewsets.ModelViewSet):
     #defines how to handle intermediate actions when the course api is called
@@ -32,93 +63,165 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
+class LectureSeriesViewSet(viewsets.ModelViewSet):
+    #weekly recurring lectures of the user's courses, created by timetable imports;
+    #cancel single occurrences through exdates
+    serializer_class = LectureSeriesSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return LectureSeries.objects.filter(course__user=self.request.user).select_related("course")
+
+    def perform_update(self, serializer):
+        #attendances and notes already attached to upcoming occurrences move with the new times,
+        #in one transaction so the series' change notification (on commit) covers the moved lectures
+        with transaction.atomic():
+            retime_lectures(serializer.save())
+
+
+def lecture_filters(request):
+    #validated from/to/course query params of the lecture list
+    params = LectureFilterSerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    return params.validated_data
+
+
+def lecture_queryset(request):
+    #lectures of the requesting user filtered by the query params, shared by the sync and async list views
+    #same user, with the user's attendance prefetched for the serializer
+    queryset = Lecture.objects.filter(course__user = request.user).with_user_attendance(request.user)
+
+    #optional query parameters, the date range is compared on the raw start_dt column
+    #so it can use the (course, start_dt) index
+    filters = lecture_filters(request)
+
+    if "from" in filters:
+        queryset = queryset.filter(start_dt__gte=filters["from"])
+    if "to" in filters:
+        queryset = queryset.filter(start_dt__lt=filters["to"])
+    if "course" in filters:
+        queryset = queryset.filter(course_id=filters["course"])
+
+    return queryset
+
+
+def listed_series_lectures(request, stored=None):
+    #the expanded lecture series occurrences that belong in the lecture list, same filters
+    filters = lecture_filters(request)
+    return series_lectures(request.user, filters.get("from"), filters.get("to"), filters.get("course"), stored=stored)
+
+
+def paged_series_lectures(request):
+    #listed_series_lectures for a page of the list, expanded from the page's cursor on (see KeysetPagination)
+    filters = lecture_filters(request)
+    return lambda cursor, limit: series_page(
+        request.user, filters.get("from"), filters.get("to"), filters.get("course"), after=cursor, limit=limit
+    )
+
+
+def merge_lectures(stored, expanded):
+    #stored lectures keep their order, occurrences slot in by start
+    return sorted(list(stored) + expanded, key=lambda lecture: lecture.start_dt)
+
+
 class LectureViewSet(viewsets.ReadOnlyModelViewSet):
     #defines how to handle intermediate actions when the lecture api is called
+    #lists the stored lectures plus the occurrences of the user's lecture series in the requested window
     serializer_class = LectureSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = LecturePagination
+
+    #ETag / If-None-Match on the user's data version (core.utils.versioning),
+    #list responses are cached per user and query (core.utils.response_cache)
+    @conditional_on_user_version
+    @cache_user_response
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        if self.paginator.is_requested(request):
+            page = self.paginator.paginate_queryset(queryset, request, view=self, extra=paged_series_lectures(request))
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+        lectures = list(queryset)
+        lectures = merge_lectures(lectures, listed_series_lectures(request, stored=lectures))
+        return Response(self.get_serializer(lectures, many=True).data)
+
+    @conditional_on_user_version
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            #an occurrence of one of the user's series that isn't stored yet
+            found = with_user_attendance(find_occurrences(request.user, [kwargs["pk"]]), request.user)
+            if not found:
+                raise
+            return Response(self.get_serializer(found[0]).data)
 
     def get_queryset(self):
-        #same user
-        queryset = Lecture.objects.filter(course__user = self.request.user)
-
-        #optional query parameters
-        from_str = self.request.query_params.get("from")
-        to_str = self.request.query_params.get("to")
+        return lecture_queryset(self.request)
 
-        #filter by optional date param
-        if from_str:
-            queryset = queryset.filter(start_dt__date__gte=from_str)
-        if to_str:
-            queryset = queryset.filter(end_dt__date__lte=to_str)
 
-        return queryset
-    
 class ImportTimetable(APIView):
     """
     POST endpoint for bulk-creating lectures.
 
     For each Slot object in the request body, (course, weekday, start and end time, date range, location)
-    We loop through the date range, creating a Lecture object for said course with start and end time
-    on that specific date.
+    We compute every date in the range that falls on the slot's weekday, creating a Lecture object for
+    said course with start and end time on that specific date.
 
     Simply put, turns a singular API call into multiple corresponding Lecture rows.
+    The rows are inserted in bulk within one transaction (see core.utils.timetable).
+
+    An .ics or .csv timetable can be uploaded as multipart "file" instead. It is parsed as a
+    stream (see core.utils.timetable_files), invalid rows are skipped and listed in the response.
     """
     permission_classes = [permissions.IsAuthenticated]
+    parser_classes = (JSONParser, MultiPartParser)
 
     def post(self, request):
+        if "file" in request.FILES:
+            return self.import_file(request)
+
         serializer = SlotSerializer(data=request.data, many = True)
         serializer.is_valid(raise_exception = True) 
 
-        created = 0
-        utc = zoneinfo.ZoneInfo("UTC")
-        weekday_idx = {name: i for i, name in enumerate(WEEKDAYS)}
-
-        #for each slot object, create/get a course object
-        for slot in serializer.validated_data:
-            course, _ = Course.objects.get_or_create(
-                user = request.user,
-                name = slot["course"],
-                defaults={"color_hex": "#4F46E5"}
-            )
-
-            day_cursor = slot["from_date"]
-            target_weekday = weekday_idx[slot["weekday"]]
-            
-            #move the day pointer. if same day, create/get new lecture object
-            #based on slot info
-            while day_cursor <= slot["to_date"]:
-                if day_cursor.weekday() == target_weekday:
-                    start_dt = datetime.datetime.combine(day_cursor, slot["start_time"], tzinfo=utc)
-                    end_dt = datetime.datetime.combine(day_cursor, slot["end_time"], tzinfo=utc)
-
-                    lecture, made = Lecture.objects.get_or_create(
-                        course=course,
-                        start_dt=start_dt,
-                        defaults={"end_dt": end_dt, "location": slot["location"]}
-                    )
-                    
-
-                    Attendance.objects.get_or_create(
-                        user=request.user,
-                        lecture=lecture,
-                        defaults={"attended": False}
-                    )
-
-                    if made:
-                        created += 1
-
-                day_cursor += datetime.timedelta(days=1)
+        created = import_slots(request.user, serializer.validated_data)
 
         return Response({"created": created}, status = 201)
 
+    def import_file(self, request):
+        serializer = TimetableFileSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            report = import_timetable_file(
+                request.user, serializer.validated_data["file"], serializer.validated_data["format"]
+            )
+        except TimetableFileError as e:
+            return Response({"error": str(e)}, status=400)
+        #nothing importable at all is a bad request, partial imports list what was skipped
+        status = 400 if report["errors"] and not report["imported"] else 201
+        return Response(report, status=status)
+
 class AttendanceViewSet(viewsets.ModelViewSet):
     #defines how to handle intermediate actions when the attendance api is called
     serializer_class = AttendanceSerializer
     permission_classes = [permissions.IsAuthenticated]
-    parser_classes = (MultiPartParser, FormParser)
+    #JSON for creating the attendance of a lecture (series occurrences have none until then),
+    #multipart for note uploads
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
+    pagination_class = AttendancePagination
+
+    #ETag / If-None-Match on the user's data version (core.utils.versioning)
+    @conditional_on_user_version
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_on_user_version
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def get_queryset(self):
-        queryset = Attendance.objects.filter(user = self.request.user)
+        #lecture and course are serialized for every row, load them in the same query
+        queryset = Attendance.objects.filter(user = self.request.user).select_related("lecture__course")
 
         lecture_id = self.request.query_params.get("lecture_id")
         if lecture_id:
@@ -132,10 +235,166 @@ class AttendanceViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def create(self, request, *args, **kwargs):
+        #an occurrence of a lecture series is stored first, so the attendance has a lecture to point at
+        if request.data.get("lecture"):
+            materialize_lectures(request.user, [request.data["lecture"]])
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         #save the new attendance object with the current user as owner?
         serializer.save(user=self.request.user)
 
+    def perform_update(self, serializer):
+        attendance = serializer.save()
+        if serializer.validated_data.get("note_upload"):
+            publish(attendance.user_id, NOTE_UPLOADED, attendance=attendance.pk, lecture=attendance.lecture_id)
+
+
+class NoteUploadStart(APIView):
+    """
+    POST endpoint for starting a direct-to-storage note upload
+
+    Returns where and how to PUT the file (a presigned S3 url in production) and an upload_id
+    for NoteUploadConfirm, so the file itself never passes through the API.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        try:
+            attendance = Attendance.objects.get(pk=pk, user=request.user)
+        except Attendance.DoesNotExist:
+            return Response({"detail": "Not found."}, status=404)
+
+        serializer = NoteUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = get_upload_backend().issue(
+                request, attendance, serializer.validated_data["filename"], serializer.validated_data["size"]
+            )
+        except UploadRejected as e:
+            return Response({"error": str(e)}, status=400)
+        return Response(upload, status=201)
+
+
+class NoteUploadConfirm(APIView):
+    """
+    POST endpoint for attaching a finished direct upload to the attendance as its note
+
+    The stored object's size and content type are checked against the upload request first.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        try:
+            attendance = Attendance.objects.select_related("lecture__course").get(pk=pk, user=request.user)
+        except Attendance.DoesNotExist:
+            return Response({"detail": "Not found."}, status=404)
+
+        serializer = NoteUploadConfirmSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            get_upload_backend().confirm(attendance, serializer.validated_data["upload_id"])
+        except UploadRejected as e:
+            return Response({"error": str(e)}, status=400)
+
+        publish(attendance.user_id, NOTE_UPLOADED, attendance=attendance.pk, lecture=attendance.lecture_id)
+        return Response(AttendanceSerializer(attendance).data, status=200)
+
+
+class NoteUploadTarget(APIView):
+    """
+    PUT endpoint that stands in for the storage service when notes are stored locally
+
+    Authorized by the signed upload_id in the url alone, like a presigned url.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def put(self, request, upload_id):
+        backend = get_upload_backend()
+        if not isinstance(backend, LocalDirectUpload):
+            return Response({"detail": "Not found."}, status=404)
+
+        content_type = request.META.get("CONTENT_TYPE", "").split(";")[0].strip()
+        try:
+            content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+            backend.receive(upload_id, content_type, content_length, request.stream)
+        except (UploadRejected, ValueError) as e:
+            return Response({"error": str(e)}, status=403)
+        return Response(status=200)
+
+
+class NoteDownload(APIView):
+    """
+    GET endpoint for downloading an attendance's note
+
+    Only the owner may download it. The file is streamed in chunks with Range and
+    If-Modified-Since support, or handed to the front server / S3 (see core.utils.downloads).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        attendance = Attendance.objects.filter(pk=pk, user=request.user).only("note_upload").first()
+        if attendance is None or not attendance.note_upload:
+            return Response({"detail": "Not found."}, status=404)
+        try:
+            return serve_note(request, attendance.note_upload)
+        except FileNotFoundError:
+            return Response({"detail": "Not found."}, status=404)
+
+
+class CalendarFeedLink(APIView):
+    """
+    GET endpoint returning the url of the user's calendar (ICS) feed, POST to replace it with a new one
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        feed, _ = CalendarToken.objects.get_or_create(user=request.user, defaults={"token": secrets.token_urlsafe(32)})
+        return Response(self.link(request, feed))
+
+    def post(self, request):
+        #the old url stops working straight away
+        feed, _ = CalendarToken.objects.update_or_create(user=request.user, defaults={"token": secrets.token_urlsafe(32)})
+        return Response(self.link(request, feed), status=201)
+
+    @staticmethod
+    def link(request, feed):
+        return {"url": request.build_absolute_uri(reverse("calendar-feed", args=[feed.token]))}
+
+
+class CalendarFeed(APIView):
+    """
+    GET endpoint serving a user's lectures as an iCalendar feed for calendar apps
+
+    Authorized by the token in the url. The ETag is the user's data version, so polling
+    clients get a 304 for two small queries. ?since=<ISO datetime> only sends the
+    lectures changed after that time (deleted lectures are not reported).
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, token):
+        user_id = CalendarToken.objects.filter(token=token).values_list("user_id", flat=True).first()
+        if user_id is None:
+            return Response({"detail": "Not found."}, status=404)
+
+        params = CalendarFeedSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        version, changed_at = get_user_version_state(user_id)
+        etag = quote_etag(f"{user_id}-{version}")
+        last_modified = int(changed_at.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            rows = feed_rows(user_id, since=params.validated_data.get("since"))
+            response = streaming_response(request, iter_calendar(rows), content_type="text/calendar; charset=utf-8")
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
 
 class SummarizeNotes(APIView):
     """
@@ -170,27 +429,108 @@ class SummarizeNotes(APIView):
         except Exception:
             return Response({"error": "Unable to read uploaded note. Please reupload."}, status=500)
         
-        #if so, summarize it
-        summary = summarize_text(note_text)
+        #if so, summarize it (identical note text is served from the summary cache)
+        summary = cached_summarize_text(note_text)
 
         attendance_obj.summary = summary
-        attendance_obj.save()
+        attendance_obj.save(update_fields=["summary", "updated_at"])
 
         return Response({"summary": summary}, status=200)
 
+class SummarizeNotesJob(APIView):
+    """
+    POST endpoint for summarizing notes without blocking the request
+
+    If a summary already exists it is returned right away (200). Otherwise a SummaryJob
+    is queued on the configured job backend and its id is returned (202), the result
+    can then be polled through SummaryJobDetail.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        attendance_id = request.data.get("attendance_id")
+
+        try:
+            attendance_obj = Attendance.objects.get(id = attendance_id, user=request.user)
+        except (Attendance.DoesNotExist, DjangoValidationError):
+            return Response({'error': f"Attendance not found: {attendance_id}"}, status=404)
+
+        if attendance_obj.summary:
+            return Response({"job_id": None, "attendance_id": attendance_obj.id, "status": SummaryJob.DONE,
+                             "summary": attendance_obj.summary}, status=200)
+
+        if not attendance_obj.note_upload:
+            return Response({"error": "No note uploaded for this attendance."}, status=404)
+
+        #reuse a job that is still pending for this note instead of queueing another,
+        #jobs stuck past SUMMARY_JOB_TIMEOUT are failed first so they are queued again
+        fail_stale_jobs(attendance_obj.summary_jobs.all())
+        job = attendance_obj.summary_jobs.filter(
+            status__in=[SummaryJob.QUEUED, SummaryJob.RUNNING], note_name=attendance_obj.note_upload.name
+        ).first()
+        if job is None:
+            job = SummaryJob.objects.create(
+                user=request.user, attendance=attendance_obj, note_name=attendance_obj.note_upload.name
+            )
+            backend = get_job_backend()
+            transaction.on_commit(lambda: backend.enqueue(job.id))
+
+        return Response(SummaryJobSerializer(job).data, status=202)
+
+class SummaryJobDetail(APIView):
+    """
+    GET endpoint for polling a summarization job
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        try:
+            job = SummaryJob.objects.select_related("attendance").get(pk=pk, user=request.user)
+        except SummaryJob.DoesNotExist:
+            return Response({"detail": "Not found."}, status=404)
+        return Response(SummaryJobSerializer(job).data, status=200)
+
 class DashboardView(APIView):
     """
     GET endpoint for obtaining course details for dashboard specifically
 
-    Will include all associated courses and the lectures for said courses
+    Will include all associated courses and the lectures for said courses, optionally only those
+    within the lecture list's from/to window (the stats still cover the whole course)
+    Sends an ETag of the user's data version and answers a matching If-None-Match with 304,
+    the serialized response is cached per user until one of their courses/lectures/attendances changes
     """
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_on_user_version
+    @cache_user_response
     def get(self, request):
-        courses = Course.objects.filter(user = request.user)
+        filters = lecture_filters(request)
+        start, end = filters.get("from"), filters.get("to")
+        courses = list(Course.objects.filter(user = request.user).for_dashboard(request.user, start, end))
+        add_series_lectures(courses, request.user, start, end)
+        attach_stats(courses, request.user)
         serializer = CourseDashboardSerializer(courses, many=True, context = {"request":request})
         return Response({"courses": serializer.data})
 
+class AttendanceAnalytics(APIView):
+    """
+    GET endpoint for the user's attendance trends (weekly or monthly), weekday pattern and streaks
+
+    Aggregated in the database and returned as columnar arrays (see core.utils.analytics), takes the
+    lecture list's from/to/course filters. Cached per user and data version like the dashboard.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @conditional_on_user_version
+    @cache_user_response
+    def get(self, request):
+        params = AnalyticsFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+        return Response(attendance_analytics(
+            request.user, filters["period"], filters.get("from"), filters.get("to"), filters.get("course")
+        ))
+
 class LectureAttendanceToggle(APIView):
     """
     POST endpoint for updating a lecture's corresponding attendance object
@@ -198,21 +538,44 @@ class LectureAttendanceToggle(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        #bug checks, shouldnt happen
-        try:
-            lecture = Lecture.objects.filter(course__user=request.user).get(pk=pk)
-        except Lecture.DoesNotExist:
-            return Response({"detail": "Not found."}, status=404)
-
         attended = request.data.get("attended", None)
         if not isinstance(attended, bool):
             return Response({"detail": "'attended' must be boolean true/false."},
                             status=404)
-        
-        att, _ = Attendance.objects.get_or_create(user=request.user, lecture=lecture, defaults={"attended": False})
-        att.attended = attended
-        att.save(update_fields=["attended", "updated_at"])
-        return Response(AttendanceSerializer(att).data, status=200)
+
+        #one upsert does the ownership check, the create and the update
+        rows = set_attendance(request.user, [pk], attended)
+        if not rows and materialize_lectures(request.user, [pk]):
+            #an occurrence of a lecture series, stored now that something is attached to it
+            rows = set_attendance(request.user, [pk], attended)
+        if not rows:
+            return Response({"detail": "Not found."}, status=404)
+        return Response(AttendanceSerializer(rows[0]).data, status=200)
+
+
+class BulkAttendanceToggle(APIView):
+    """
+    POST endpoint for marking many lectures attended/unattended at once (e.g. a whole week)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkAttendanceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lecture_ids = serializer.validated_data["lectures"]
+
+        rows = set_attendance(request.user, lecture_ids, serializer.validated_data["attended"])
+        found = {row.lecture_id for row in rows}
+        unknown = [lecture_id for lecture_id in lecture_ids if lecture_id not in found]
+        if unknown and materialize_lectures(request.user, unknown):
+            #occurrences of lecture series, stored now that something is attached to them
+            rows += set_attendance(request.user, unknown, serializer.validated_data["attended"])
+            found = {row.lecture_id for row in rows}
+        return Response({
+            "attendances": AttendanceSerializer(rows, many=True).data,
+            #lectures that don't exist or belong to someone else
+            "missing": [lecture_id for lecture_id in dict.fromkeys(lecture_ids) if lecture_id not in found],
+        }, status=200)
 
 class RegisterView(generics.CreateAPIView):
     """
@@ -224,6 +587,67 @@ class RegisterView(generics.CreateAPIView):
 
 
 
+class EventStream(View):
+    """
+    GET endpoint streaming the user's change events as server-sent events
+
+    Needs an ASGI server. Browsers' EventSource can't set headers, so the access token
+    may also be passed as ?token=.
+    """
+
+    async def get(self, request):
+        user = await sync_to_async(self.authenticate)(request)
+        if user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."}, status=401)
+
+        response = StreamingHttpResponse(self.stream(user), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        #stop nginx style proxies from buffering the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    @staticmethod
+    def authenticate(request):
+        auth = JWTAuthentication()
+        try:
+            token = request.GET.get("token")
+            if token:
+                return auth.get_user(auth.get_validated_token(token))
+            result = auth.authenticate(request)
+            return result[0] if result else None
+        except (InvalidToken, AuthenticationFailed):
+            return None
+
+    async def stream(self, user):
+        heartbeat = getattr(settings, "EVENT_STREAM_HEARTBEAT", 15)
+        with get_broker().subscribe(user.pk) as subscription:
+            #the data version lets a reconnecting client tell whether it missed anything
+            version = await sync_to_async(get_user_version)(user.pk)
+            yield f"retry: 3000\nevent: ready\ndata: {json.dumps({'version': version})}\n\n"
+            while True:
+                event = await subscription.get(timeout=heartbeat)
+                #a comment line keeps idle connections from being closed by proxies
+                yield ": keepalive\n\n" if event is None else format_sse(event)
+
+
+class ServiceMetrics(APIView):
+    """
+    GET endpoint for the process's runtime counters, staff only
+
+    Reports the LLM client's metrics (requests, retries, errors, rejections, tokens, latency)
+    and its circuit breaker state, and the hit/miss counters of the response and summary caches.
+    Counters are per process and reset on restart.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, _request):
+        client = get_llm_client()
+        return Response({
+            "llm": dict(client.metrics.snapshot(), circuit=client.breaker.snapshot()),
+            "response_cache": response_cache_stats.snapshot(),
+            "summary_cache": get_summary_cache().stats(),
+        })
+
 class PingView(APIView):
     """
     ping check endpoint
@@ -0,0 +1,13 @@
+import { api } from "@/lib/api";
+import { AnalyticsResponse } from "@/types/api";
+
+//attendance trends, weekday pattern and streaks, same from/to/course filters as the lecture list
+export async function fetchAnalytics(params: {
+  period?: "week" | "month";
+  from?: string;
+  to?: string;
+  course?: string;
+}): Promise<AnalyticsResponse> {
+  const { data } = await api.get<AnalyticsResponse>("/analytics/", { params });
+  return data;
+}
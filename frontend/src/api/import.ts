@@ -11,3 +11,22 @@ export async function importTimetable(lectures: ImportedLecture[]) {
   const { data } = await api.post("/schedule/import/", lectures);
   return data; 
 }
+
+export type TimetableImportReport = {
+  created: number;
+  rows: number;
+  imported: number;
+  errors: { line: number; errors: unknown }[]; //rows that were skipped, by line in the file
+  errors_truncated: boolean;
+};
+
+//uploads an .ics or .csv timetable, invalid rows are skipped and listed in the report
+export async function importTimetableFile(file: File): Promise<TimetableImportReport> {
+  const form = new FormData();
+  form.append("file", file);
+  const { data } = await api.post("/schedule/import/", form, {
+    headers: { "Content-Type": "multipart/form-data" },
+    validateStatus: (status) => status === 201 || status === 400,
+  });
+  return data;
+}
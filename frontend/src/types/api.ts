@@ -13,14 +13,43 @@ export interface LectureAPI {
   note_filename?: string | null;
 }
 
+export interface CourseStatsAPI {
+  total: number;
+  past: number;
+  attended: number;
+  summarized: number;
+  missed: number;
+  upcoming: number;
+}
+
 export interface CourseDashboardAPI {
   id: string;
   name: string;
   color_hex: string;
   lectures: LectureAPI[];
   percentage: number;
+  stats: CourseStatsAPI;
 }
 
 export interface DashboardResponse {
   courses: CourseDashboardAPI[];
 }
+
+//columnar: index i of every array in trend (or weekdays) belongs to the same period (or day)
+export interface AnalyticsResponse {
+  period: "week" | "month";
+  trend: {
+    start: string[]; //ISO date the week/month starts on
+    total: number[];
+    attended: number[];
+    rate: number[];
+    cumulative_rate: number[];
+  };
+  weekdays: {
+    weekday: string[]; //"Mon".."Sun"
+    total: number[];
+    attended: number[];
+    rate: number[];
+  };
+  streaks: { current: number; longest: number };
+}